@@ -0,0 +1,465 @@
+"""End-to-end latency of every API endpoint against local fake backends.
+
+Milvus, the LLM agent and Duckling are replaced by the stand-ins in
+``benchmarks.fakes`` (latencies set with ``--latency``), and the jobs
+share, commesse register and PDFs are generated by
+``benchmarks.fixtures``, so runs are reproducible on any machine. Every
+URL in ``core/urls.py`` is first timed on its own through the Django test
+client, then a concurrent load generator replays a weighted mix of the
+read endpoints. Results (p50/p95/p99 per endpoint, throughput and the
+per-stage breakdown from ``services.tracing``) can be saved as a JSON
+baseline and compared against later runs; the run fails (exit 1) if any
+endpoint answers with a server error. Run from the ``docslm`` directory:
+
+    python -m benchmarks.bench_app --save-baseline benchmarks/baselines/app.json
+    python -m benchmarks.bench_app --baseline benchmarks/baselines/app.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import warnings
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import fakes, fixtures
+
+QUESTIONS = [
+    "Qual è la pressione di progetto del recipiente?",
+    "Che spessore minimo hanno le lamiere del fondo?",
+    "Quando è prevista la prova idraulica?",
+    "Quali normative sono citate nei disegni?",
+    "Che materiale è previsto per le flange?",
+    "Come deve essere eseguita la verniciatura esterna?",
+    "Quali controlli sono previsti sulle saldature?",
+    "A che pressione è tarata la valvola di sicurezza?",
+]
+
+# Relative weights of the endpoints replayed by the load generator; builds,
+# syncs and cancellations only run in the sequential pass.
+LOAD_MIX = {
+    'core:send_message': 4,
+    'core:stream_message': 4,
+    'core:list_job_files': 3,
+    'core:search_commesse': 3,
+    'core:preview_file': 3,
+    'core:rendition': 2,
+    'core:search_job_files': 2,
+    'core:check_path': 2,
+    'core:list_collections': 1,
+    'core:list_collection_files': 1,
+    'core:job_status': 1,
+    'core:greeting': 1,
+    'core:index': 1,
+    'core:metrics': 1,
+}
+SLOW_SCENARIOS = {'core:create_collection', 'core:sync_collection', 'core:cancel_job'}
+
+
+class Scenarios:
+    """One request builder per URL name, for the sync and async clients."""
+
+    def __init__(self, paths: dict, seed: int = 0):
+        self.paths = paths
+        self.commessa = paths['commesse'][0]
+        self.collection = 'bench'
+        self.job_id = None
+        self.rnd = random.Random(seed)
+        self.files = fixtures.job_files(paths['jobs'], self.commessa)
+        self.pdfs = [f for f in self.files if f.endswith('.pdf')]
+        self.notes = [f for f in self.files if f.endswith('.txt')]
+        self._builds = 0
+        self._lock = threading.Lock()
+
+    def _abs(self, rel_path: str) -> str:
+        return os.path.join(self.paths['jobs'], self.commessa, rel_path)
+
+    def _build_name(self) -> str:
+        with self._lock:
+            self._builds += 1
+            return f'bench_build_{self._builds}'
+
+    def request(self, name: str) -> tuple:
+        """(method, url, json body or None) for one call of ``name``."""
+        from django.urls import reverse
+        rnd = self.rnd
+        c = self.commessa
+        if name == 'core:index':
+            return 'get', reverse(name), None
+        if name == 'core:greeting':
+            return 'get', reverse(name), None
+        if name == 'core:login':
+            return 'post', reverse(name), {'username': 'test'}
+        if name == 'core:send_message' or name == 'core:stream_message':
+            return 'post', reverse(name), {'message': rnd.choice(QUESTIONS)}
+        if name == 'core:search_commesse':
+            return 'get', f"{reverse(name)}?q={rnd.choice(['24', '1234', '23-0', 'C2', '7'])}", None
+        if name == 'core:list_collections':
+            return 'get', f"{reverse(name)}?commessa={c}", None
+        if name == 'core:list_job_files':
+            sub = rnd.choice(fixtures.SUBDIRS)
+            return 'get', f"{reverse(name)}?commessa={c}&subpath={sub}&page_size=200&sort=mtime&order=desc", None
+        if name == 'core:search_job_files':
+            return 'get', f"{reverse(name)}?commessa={c}&glob={rnd.choice(['*.pdf', 'nota_00*', 'DWG-*-001*'])}", None
+        if name == 'core:list_collection_files':
+            return 'get', f"{reverse(name)}?commessa={c}&collection={self.collection}", None
+        if name == 'core:create_collection':
+            return 'post', reverse(name), {'commessa': c, 'collection_name': self._build_name(),
+                                           'files': rnd.sample(self.files, 3)}
+        if name == 'core:sync_collection':
+            return 'post', reverse(name), {'commessa': c, 'collection_name': self.collection}
+        if name == 'core:job_status':
+            return 'get', f"{reverse(name, args=[self.job_id])}?files=0", None
+        if name == 'core:cancel_job':
+            return 'post', reverse(name, args=[self.job_id]), None
+        if name == 'core:initialize_agent':
+            return 'post', reverse(name), {'commessa': c, 'collection_name': self.collection, 'mode': 'veloce'}
+        if name == 'core:check_path':
+            if rnd.random() < 0.5:
+                return 'post', reverse(name), {'path': self._abs(rnd.choice(self.notes))}
+            return 'post', reverse(name), {'path': self._abs(rnd.choice(self.pdfs)), 'page_start': 1, 'page_end': 1}
+        if name == 'core:preview_file':
+            pdf = self._abs(rnd.choice(self.pdfs))
+            return 'get', f"{reverse(name)}?path={pdf}&page_start=1&page_end=1", None
+        if name == 'core:rendition':
+            pdf = self._abs(rnd.choice(self.pdfs))
+            return 'get', f"{reverse(name)}?path={pdf}&size={rnd.choice(['thumb', 'medium'])}", None
+        if name == 'core:metrics':
+            return 'get', reverse(name), None
+        raise KeyError(name)
+
+    def names(self) -> list:
+        from core import urls
+        return [f'{urls.app_name}:{p.name}' for p in urls.urlpatterns]
+
+
+def _send(client, method: str, url: str, body):
+    if body is None:
+        response = getattr(client, method)(url)
+    else:
+        response = getattr(client, method)(url, json.dumps(body), content_type='application/json')
+    if response.streaming:
+        b''.join(response)
+    return response
+
+
+async def _asend(client, method: str, url: str, body):
+    if body is None:
+        response = await getattr(client, method)(url)
+    else:
+        response = await getattr(client, method)(url, json.dumps(body), content_type='application/json')
+    if response.streaming and response.is_async:
+        async for _ in response.streaming_content:
+            pass
+    elif response.streaming:
+        # file previews stream from a blocking iterator
+        await asyncio.to_thread(b''.join, response.streaming_content)
+    return response
+
+
+def _timed(client, scenarios: Scenarios, name: str) -> tuple:
+    method, url, body = scenarios.request(name)
+    started = time.perf_counter()
+    response = _send(client, method, url, body)
+    return time.perf_counter() - started, response.status_code
+
+
+def _session(client, scenarios: Scenarios):
+    """Log in and activate the benchmark collection's agent."""
+    for name in ('core:login', 'core:initialize_agent'):
+        method, url, body = scenarios.request(name)
+        response = _send(client, method, url, body)
+        assert response.status_code == 200, (name, response.content[:300])
+
+
+def _percentile(samples: list, q: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def summarize(latencies: list, statuses: list, elapsed: float | None = None) -> dict:
+    latencies = sorted(latencies)
+    result = {
+        'requests': len(latencies),
+        'errors': sum(1 for s in statuses if s >= 500),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 2),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+    }
+    if elapsed:
+        result['throughput_rps'] = round(len(latencies) / elapsed, 2)
+    return result
+
+
+def _print_table(title: str, rows: dict):
+    print(f"\n{title}")
+    print(f"{'endpoint':<30} {'n':>6} {'err':>4} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'req/s':>8}")
+    for name, r in rows.items():
+        rps = f"{r['throughput_rps']:8.1f}" if 'throughput_rps' in r else f"{'':>8}"
+        print(f"{name:<30} {r['requests']:>6} {r['errors']:>4} {r['p50_ms']:>10.2f} "
+              f"{r['p95_ms']:>10.2f} {r['p99_ms']:>10.2f} {rps}")
+
+
+def wait_for_job(client, scenarios: Scenarios, job_id: str, timeout: float = 300) -> dict:
+    from django.urls import reverse
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = json.loads(client.get(f"{reverse('core:job_status', args=[job_id])}?files=0").content)
+        if job.get('status') in ('completed', 'failed', 'cancelled'):
+            return job
+        time.sleep(0.1)
+    raise TimeoutError(f"job {job_id} did not finish in {timeout}s")
+
+
+def setup_collection(scenarios: Scenarios, files: int) -> dict:
+    """Build the collection the chat endpoints query; returns the job."""
+    from django.test import Client
+    from django.urls import reverse
+    client = Client()
+    body = {'commessa': scenarios.commessa, 'collection_name': scenarios.collection,
+            'files': scenarios.files[:files]}
+    started = time.perf_counter()
+    response = _send(client, 'post', reverse('core:create_collection'), body)
+    assert response.status_code == 202, response.content[:300]
+    job = wait_for_job(client, scenarios, json.loads(response.content)['job_id'])
+    assert job['status'] == 'completed', job
+    scenarios.job_id = job['job_id']
+    print(f"Setup: built collection {scenarios.collection!r} from {files} files "
+          f"in {time.perf_counter() - started:.1f}s")
+    return job
+
+
+def run_sequential(scenarios: Scenarios, repeat: int) -> dict:
+    """Each URL on its own, ``repeat`` times (builds: at most 3)."""
+    from django.test import Client
+    client = Client()
+    _session(client, scenarios)
+    results = {}
+    for name in scenarios.names():
+        count = min(repeat, 3) if name in SLOW_SCENARIOS else repeat
+        latencies, statuses = [], []
+        for _ in range(count):
+            seconds, status = _timed(client, scenarios, name)
+            latencies.append(seconds)
+            statuses.append(status)
+        results[name] = summarize(latencies, statuses)
+    _print_table(f"Sequential ({repeat} calls per endpoint)", results)
+    return results
+
+
+def _mix(scenarios: Scenarios, requests: int, seed: int) -> list:
+    rnd = random.Random(seed)
+    names = [n for n in LOAD_MIX if LOAD_MIX[n] > 0]
+    return rnd.choices(names, weights=[LOAD_MIX[n] for n in names], k=requests)
+
+
+def _load_results(samples: list, elapsed: float, concurrency: int, mode: str) -> dict:
+    by_name = {}
+    for name, seconds, status in samples:
+        by_name.setdefault(name, ([], []))
+        by_name[name][0].append(seconds)
+        by_name[name][1].append(status)
+    scenarios = {name: summarize(l, s, elapsed) for name, (l, s) in sorted(by_name.items())}
+    overall = summarize([s[1] for s in samples], [s[2] for s in samples], elapsed)
+    _print_table(f"Load ({mode}, {concurrency} concurrent clients, {elapsed:.1f}s)",
+                 {**scenarios, 'overall': overall})
+    return {'mode': mode, 'concurrency': concurrency, 'overall': overall, 'scenarios': scenarios}
+
+
+def run_load_threads(scenarios: Scenarios, requests: int, concurrency: int, seed: int) -> dict:
+    """``concurrency`` threads, each with its own session (as WSGI threads)."""
+    from django.test import Client
+    plan = _mix(scenarios, requests, seed)
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, 'client'):
+            local.client = Client()
+            _session(local.client, scenarios)
+        return local.client
+
+    def one(name):
+        seconds, status = _timed(client(), scenarios, name)
+        return name, seconds, status
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # sessions are set up before the clock starts
+        list(pool.map(lambda _: client(), range(concurrency * 4)))
+        started = time.perf_counter()
+        samples = list(pool.map(one, plan))
+    return _load_results(samples, time.perf_counter() - started, concurrency, 'threads')
+
+
+def run_load_async(scenarios: Scenarios, requests: int, concurrency: int, seed: int) -> dict:
+    """One event loop with ``concurrency`` requests in flight (as one ASGI worker)."""
+    from django.test import AsyncClient
+    plan = _mix(scenarios, requests, seed)
+
+    async def main():
+        clients = asyncio.Queue()
+        for _ in range(concurrency):
+            client = AsyncClient()
+            for name in ('core:login', 'core:initialize_agent'):
+                method, url, body = scenarios.request(name)
+                response = await _asend(client, method, url, body)
+                assert response.status_code == 200, (name, response.content[:300])
+            clients.put_nowait(client)
+
+        async def one(name):
+            client = await clients.get()
+            try:
+                method, url, body = scenarios.request(name)
+                t0 = time.perf_counter()
+                response = await _asend(client, method, url, body)
+                return name, time.perf_counter() - t0, response.status_code
+            finally:
+                clients.put_nowait(client)
+
+        started = time.perf_counter()
+        samples = await asyncio.gather(*(one(name) for name in plan))
+        return samples, time.perf_counter() - started
+
+    samples, elapsed = asyncio.run(main())
+    return _load_results(samples, elapsed, concurrency, 'async')
+
+
+def stage_breakdown() -> dict:
+    """Mean time per span recorded during the run (services.tracing)."""
+    from services.tracing import get_metrics
+    stages = {}
+    for (stage,), series in sorted(get_metrics().stages.snapshot().items()):
+        count = sum(series[:-1])
+        stages[stage] = {'count': count, 'mean_ms': round(series[-1] / count * 1000, 3) if count else 0.0}
+    print("\nStages (mean per span)")
+    for stage, s in stages.items():
+        print(f"{stage:<30} {s['count']:>8} {s['mean_ms']:>12.3f} ms")
+    return stages
+
+
+def compare(results: dict, baseline: dict, tolerance: float, noise_ms: float) -> list:
+    """Endpoints whose p95 regressed by more than ``tolerance`` (and more
+    than ``noise_ms``) against the baseline."""
+    regressions = []
+    rows = [('sequential', name, r, baseline.get('sequential', {}).get(name))
+            for name, r in results['sequential'].items()]
+    rows += [('load', name, r, baseline.get('load', {}).get('scenarios', {}).get(name))
+             for name, r in results['load']['scenarios'].items()]
+    rows.append(('load', 'overall', results['load']['overall'], baseline.get('load', {}).get('overall')))
+    print(f"\nAgainst baseline ({baseline.get('meta', {}).get('created', '?')}), p95 tolerance {tolerance:.0%}")
+    for phase, name, now, before in rows:
+        if not before:
+            continue
+        delta = now['p95_ms'] - before['p95_ms']
+        ratio = now['p95_ms'] / before['p95_ms'] if before['p95_ms'] else 1.0
+        flag = ''
+        if ratio > 1 + tolerance and delta > noise_ms:
+            flag = '  REGRESSION'
+            regressions.append(f'{phase}/{name}')
+        print(f"{phase:<10} {name:<30} p95 {before['p95_ms']:>10.2f} -> {now['p95_ms']:>10.2f} ms "
+              f"({ratio - 1:+.1%}){flag}")
+    return regressions
+
+
+def failures(results: dict) -> list:
+    """Endpoints that answered with a server error at least once."""
+    rows = [('sequential', name, r) for name, r in results['sequential'].items()]
+    rows += [('load', name, r) for name, r in results['load']['scenarios'].items()]
+    return [f"{phase}/{name} ({r['errors']}/{r['requests']})" for phase, name, r in rows if r['errors']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', default='', help="fake backend latencies in ms, e.g. llm=300,search=20 "
+                                                      f"(defaults: {fakes.Latencies()})")
+    parser.add_argument('--commesse', type=int, default=3)
+    parser.add_argument('--files-per-dir', type=int, default=40)
+    parser.add_argument('--register-rows', type=int, default=5000)
+    parser.add_argument('--collection-files', type=int, default=30, help="files in the chat collection")
+    parser.add_argument('--repeat', type=int, default=20, help="sequential calls per endpoint")
+    parser.add_argument('--requests', type=int, default=1000, help="requests replayed by the load generator")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--client', choices=('threads', 'async'), default='threads')
+    parser.add_argument('--pool', type=int, default=None, help="BLOCKING_POOL_SIZE override")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--save-baseline', help="write results as the baseline to this file")
+    parser.add_argument('--baseline', help="compare against this baseline; exit 1 on regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed p95 increase (0.2 = 20%%)")
+    parser.add_argument('--noise-ms', type=float, default=2.0, help="ignore p95 increases below this")
+    args = parser.parse_args()
+    latencies = fakes.Latencies.parse(args.latency)
+
+    with tempfile.TemporaryDirectory(prefix='docslm-bench-') as tmp:
+        started = time.perf_counter()
+        paths = fixtures.build(tmp, args.commesse, args.files_per_dir, args.register_rows)
+        print(f"Fixtures: {args.commesse} commesse x {len(fixtures.SUBDIRS)} folders x "
+              f"{args.files_per_dir} files, register {args.register_rows} rows "
+              f"({time.perf_counter() - started:.1f}s)")
+
+        # before services.config and Django read them
+        os.environ['DOCSLM_CONFIG'] = paths['config']
+        os.environ['DOCSLM_CACHE_DIR'] = paths['cache']
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'docslm.settings')
+        fakes.install(latencies)
+
+        import django
+        from django.conf import settings
+        settings.DEBUG = False
+        if args.pool:
+            settings.BLOCKING_POOL_SIZE = args.pool
+        django.setup()
+        # the async test client drains the (synchronous) file streams in a thread
+        warnings.filterwarnings('ignore', message='StreamingHttpResponse must consume')
+
+        scenarios = Scenarios(paths, args.seed)
+        missing = [n for n in scenarios.names() if n not in LOAD_MIX and n not in SLOW_SCENARIOS
+                   and n not in ('core:login', 'core:initialize_agent')]
+        if missing:
+            print(f"Warning: endpoints without a load weight: {', '.join(missing)}")
+
+        setup_collection(scenarios, args.collection_files)
+        results = {
+            'meta': {
+                'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'args': vars(args),
+                'latencies_ms': vars(latencies),
+            },
+            'sequential': run_sequential(scenarios, args.repeat),
+        }
+        run_load = run_load_async if args.client == 'async' else run_load_threads
+        results['load'] = run_load(scenarios, args.requests, args.concurrency, args.seed)
+        results['stages'] = stage_breakdown()
+
+    results['failures'] = failures(results)
+    if results['failures'] and args.save_baseline:
+        print("\nNot saving the baseline: endpoints failed")
+        args.save_baseline = None
+    for target in filter(None, (args.json, args.save_baseline)):
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+        with open(target, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {target}")
+
+    if results['failures']:
+        print(f"\n{len(results['failures'])} endpoint(s) returned server errors: {', '.join(results['failures'])}")
+        sys.exit(1)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.noise_ms)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nNo regressions.")
+
+
+if __name__ == '__main__':
+    main()
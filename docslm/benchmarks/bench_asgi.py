@@ -0,0 +1,147 @@
+"""Concurrent-chat throughput of /api/send-message/ under WSGI vs ASGI.
+
+The LLM and Milvus are replaced by a stub agent whose ``invoke`` sleeps
+for ``--latency`` ms, so the numbers measure how many chats one worker
+process can keep in flight, not model speed.
+
+Run from the ``docslm`` directory:
+
+    python -m benchmarks.bench_asgi --concurrency 64 --requests 512
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'docslm.settings')
+
+
+class StubAgent:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def invoke(self, query, user_id=None):
+        time.sleep(self.latency)
+        return {
+            'response': f'Risposta a: {query}',
+            'context': [{'metadata': {'name': 'spec.pdf', 'type': 'text', 'page_start': 1, 'page_end': 2}}],
+        }
+
+
+class StubRegistry:
+    def __init__(self, agent):
+        self.agent = agent
+
+    def get(self, session_key):
+        return self.agent
+
+
+def _session_cookie():
+    from importlib import import_module
+    from django.conf import settings
+    store = import_module(settings.SESSION_ENGINE).SessionStore()
+    store['username'] = 'bench'
+    store['active_agent'] = {'commessa': 'BENCH', 'collection': 'bench', 'mode': 'veloce'}
+    store.save()
+    return settings.SESSION_COOKIE_NAME, store.session_key
+
+
+def _summary(label: str, latencies: list, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    pick = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+    result = {
+        'mode': label,
+        'requests': len(latencies),
+        'throughput_rps': round(len(latencies) / elapsed, 2),
+        'p50_ms': round(statistics.median(latencies) * 1000, 1),
+        'p95_ms': round(pick(0.95) * 1000, 1),
+        'p99_ms': round(pick(0.99) * 1000, 1),
+    }
+    print(f"{label:<5} {result['throughput_rps']:8.2f} req/s   p50 {result['p50_ms']:8.1f} ms   "
+          f"p95 {result['p95_ms']:8.1f} ms   p99 {result['p99_ms']:8.1f} ms")
+    return result
+
+
+def run_wsgi(requests: int, threads: int, cookie) -> dict:
+    """WSGI worker with ``threads`` threads (as in gunicorn --threads)."""
+    from django.test import Client
+    body = json.dumps({'message': 'qual è la pressione di progetto?'})
+
+    def one(_):
+        client = Client()
+        client.cookies[cookie[0]] = cookie[1]
+        started = time.perf_counter()
+        response = client.post('/api/send-message/', body, content_type='application/json')
+        assert response.status_code == 200, response.content
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(one, range(requests)))
+    return _summary('wsgi', latencies, time.perf_counter() - started)
+
+
+def run_asgi(requests: int, concurrency: int, cookie) -> dict:
+    """One ASGI worker (single event loop) with ``concurrency`` chats in flight."""
+    from django.test import AsyncClient
+    body = json.dumps({'message': 'qual è la pressione di progetto?'})
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                client = AsyncClient()
+                client.cookies[cookie[0]] = cookie[1]
+                started = time.perf_counter()
+                response = await client.post('/api/send-message/', body, content_type='application/json')
+                assert response.status_code == 200, response.content
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(one() for _ in range(requests)))
+        return latencies, time.perf_counter() - started
+
+    latencies, elapsed = asyncio.run(main())
+    return _summary('asgi', latencies, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=256)
+    parser.add_argument('--concurrency', type=int, default=64, help="chats in flight (ASGI)")
+    parser.add_argument('--wsgi-threads', type=int, default=8, help="threads per WSGI worker")
+    parser.add_argument('--latency', type=float, default=200, help="stub LLM latency in ms")
+    parser.add_argument('--pool', type=int, default=None, help="BLOCKING_POOL_SIZE override")
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    import django
+    from django.conf import settings
+    # cookie sessions: no database needed for the benchmark
+    settings.SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+    if args.pool:
+        settings.BLOCKING_POOL_SIZE = args.pool
+    django.setup()
+
+    from core.utilities import agents
+    registry = StubRegistry(StubAgent(args.latency / 1000))
+    agents.get_agent_registry = lambda: registry
+
+    cookie = _session_cookie()
+    print(f"{args.requests} chats, stub latency {args.latency:.0f} ms, "
+          f"WSGI threads {args.wsgi_threads}, ASGI concurrency {args.concurrency}")
+    results = [
+        run_wsgi(args.requests, args.wsgi_threads, cookie),
+        run_asgi(args.requests, args.concurrency, cookie),
+    ]
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Benchmark commesse search: legacy per-request scan vs. CommesseIndex.
+
+Run from the ``docslm`` directory:
+
+    python -m benchmarks.bench_commesse --rows 50000
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+from core.utilities.commesse import COLUMNS, END_DATE_COLUMN, CommesseIndex, read_register, normalize_code
+
+QUERIES = ['24', '1234', '23-0', 'C2', '99999', '7']
+
+
+def make_register(path: str, rows: int, seed: int = 0):
+    """Write a synthetic register with the same headers as the real one."""
+    import pandas as pd
+    rnd = random.Random(seed)
+    base = datetime(2015, 1, 1)
+    data = {
+        COLUMNS['code']: [f"{rnd.randint(15, 26)}-{i:05d} C{rnd.randint(1, 9)}" for i in range(rows)],
+        COLUMNS['typeof']: [rnd.choice(['Fornitura', 'Service', 'Ricambi']) for _ in range(rows)],
+        COLUMNS['start_date']: [(base + timedelta(days=rnd.randint(0, 3650))).strftime("%d/%m/%Y") for _ in range(rows)],
+        COLUMNS['company']: [f"Azienda {rnd.randint(1, 500)}" for _ in range(rows)],
+        COLUMNS['customer']: [f"Cliente {rnd.randint(1, 2000)}" for _ in range(rows)],
+        COLUMNS['goal']: ["Scambiatore di calore" for _ in range(rows)],
+        COLUMNS['order_number']: [f"ORD-{rnd.randint(1, 99999)}" for _ in range(rows)],
+        COLUMNS['project_manager']: [rnd.choice(['Rossi', 'Bianchi', 'Verdi', None]) for _ in range(rows)],
+        END_DATE_COLUMN: [base + timedelta(days=rnd.randint(0, 4500)) if rnd.random() > 0.1 else None for _ in range(rows)],
+        COLUMNS['site']: [rnd.choice(['Stabilimento 1', 'Stabilimento 2']) for _ in range(rows)],
+        COLUMNS['output']: [None for _ in range(rows)],
+    }
+    pd.DataFrame(data).to_excel(path, index=False)
+
+
+def legacy_search(excel_path: str, query: str) -> int:
+    """The pre-index code path: read the workbook and iterrows() every call."""
+    df = read_register(excel_path)
+    needle = normalize_code(query)
+    return sum(1 for _, row in df.iterrows() if needle in normalize_code(row.get("Commessa", "")))
+
+
+def _timeit(fn, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def _report(label: str, samples: list):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"{label:<28} median {statistics.median(samples):9.3f} ms   p95 {p95:9.3f} ms   n={len(samples)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--legacy-repeat', type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'commesse.xlsx')
+        t0 = time.perf_counter()
+        make_register(path, args.rows)
+        print(f"Synthetic register: {args.rows} rows, {os.path.getsize(path) / 1e6:.1f} MB "
+              f"(written in {time.perf_counter() - t0:.1f} s)")
+
+        index = CommesseIndex()
+        _report('index build (cold)', _timeit(lambda: (setattr(index, '_signature', None), index.refresh(path)), 1))
+        _report('refresh (unchanged file)', _timeit(lambda: index.refresh(path), args.repeat))
+
+        for q in QUERIES:
+            hits = len(index.search(q))
+            _report(f'substring {q!r} ({hits} hits)', _timeit(lambda: index.search(q), args.repeat))
+            hits = len(index.search_prefix(q))
+            _report(f'prefix {q!r} ({hits} hits)', _timeit(lambda: index.search_prefix(q), args.repeat))
+
+        if args.legacy_repeat:
+            _report(f'legacy scan {QUERIES[0]!r}', _timeit(lambda: legacy_search(path, QUERIES[0]), args.legacy_repeat))
+
+
+if __name__ == '__main__':
+    main()
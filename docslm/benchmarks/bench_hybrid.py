@@ -0,0 +1,164 @@
+"""Recall@k and latency of dense vs. BM25 vs. hybrid (RRF) retrieval.
+
+The fixture corpus mimics commessa documents: many chunks share the same
+technical vocabulary and differ mainly by exact tokens (drawing codes,
+part numbers, standards), and every query asks about one such token.
+
+By default the dense side is a stand-in (hashed bag-of-words cosine), so
+the run needs no network; pass ``--openai-model text-embedding-3-large``
+to embed with the real model instead. Run from the ``docslm`` directory:
+
+    python -m benchmarks.bench_hybrid --docs 2000 --queries 200 --k 4
+"""
+import os
+import json
+import math
+import time
+import random
+import argparse
+import tempfile
+import statistics
+import zlib
+from collections import Counter
+
+from services.sparse import SparseIndex, doc_key, rrf_fuse, tokenize
+
+TOPICS = [
+    "pressione di progetto del recipiente e temperatura di esercizio del mantello",
+    "spessore minimo delle lamiere del fondo e sovrametallo di corrosione",
+    "prova idraulica del fascio tubiero e tenuta delle guarnizioni",
+    "materiale delle flange e bulloneria per servizio ad alta temperatura",
+    "saldature longitudinali controllate con radiografia al cento per cento",
+    "verniciatura esterna e preparazione delle superfici prima della spedizione",
+    "supporti a sella e carichi di vento e sisma sul basamento",
+    "valvola di sicurezza tarata alla pressione massima ammissibile",
+]
+STANDARDS = ["EN 13445-3", "ASME VIII div. 1", "PED 2014/68/UE", "EN 10028-2", "EN 1092-1", "ISO 15614-1"]
+QUESTIONS = [
+    "Cosa prevede il documento {code}?",
+    "Quali requisiti riporta {code} per il recipiente?",
+    "Dove viene citato {code}?",
+]
+
+
+def make_corpus(docs: int, seed: int = 0) -> list:
+    rnd = random.Random(seed)
+    corpus = []
+    for i in range(docs):
+        code = f"DWG-{i:04d}-{rnd.choice('ABCD')}"
+        part = f"PN {rnd.randint(10000, 99999)}"
+        text = (f"Disegno {code} rev.{rnd.randint(0, 5)}: {rnd.choice(TOPICS)}. "
+                f"Riferimento normativo {rnd.choice(STANDARDS)}, componente {part}. "
+                f"{rnd.choice(TOPICS).capitalize()}.")
+        corpus.append({
+            "page_content": text,
+            "metadata": {"namespace": f"doc{i:04d}", "name": f"doc{i:04d}.pdf", "code": code, "part": part},
+        })
+    return corpus
+
+
+def make_queries(corpus: list, count: int, seed: int = 1) -> list:
+    rnd = random.Random(seed)
+    queries = []
+    for doc in rnd.sample(corpus, min(count, len(corpus))):
+        code = doc["metadata"]["code"] if rnd.random() < 0.7 else doc["metadata"]["part"]
+        queries.append({"query": rnd.choice(QUESTIONS).format(code=code), "relevant": doc_key(doc)})
+    return queries
+
+
+class HashedDense:
+    """Stand-in dense retriever: cosine over hashed bag-of-words vectors."""
+
+    def __init__(self, corpus: list, dims: int = 256):
+        self.dims = dims
+        self.corpus = corpus
+        self.vectors = [self.embed(d["page_content"]) for d in corpus]
+
+    def embed(self, text: str) -> dict:
+        counts = Counter(zlib.crc32(t.encode()) % self.dims for t in tokenize(text))
+        norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+        return {i: v / norm for i, v in counts.items()}
+
+    def search(self, query: str, k: int) -> list:
+        q = self.embed(query)
+        scored = [(sum(w * vec.get(i, 0.0) for i, w in q.items()), n) for n, vec in enumerate(self.vectors)]
+        scored.sort(reverse=True)
+        return [self.corpus[n] for _, n in scored[:k]]
+
+
+class OpenAIDense(HashedDense):
+    def __init__(self, corpus: list, model: str):
+        from langchain_openai import OpenAIEmbeddings
+        self.client = OpenAIEmbeddings(model=model)
+        self.corpus = corpus
+        self.vectors = [self._unit(v) for v in self.client.embed_documents([d["page_content"] for d in corpus])]
+
+    @staticmethod
+    def _unit(vector) -> dict:
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return {i: x / norm for i, x in enumerate(vector)}
+
+    def embed(self, text: str) -> dict:
+        return self._unit(self.client.embed_query(text))
+
+
+def evaluate(label: str, retrieve, queries: list, k: int) -> dict:
+    hits, latencies = 0, []
+    for q in queries:
+        started = time.perf_counter()
+        results = retrieve(q["query"])[:k]
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += any(doc_key(d) == q["relevant"] for d in results)
+    latencies.sort()
+    result = {
+        "retriever": label,
+        f"recall@{k}": round(hits / len(queries), 4),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+    }
+    print(f"{label:<8} recall@{k} {result[f'recall@{k}']:.3f}   "
+          f"p50 {result['p50_ms']:8.3f} ms   p95 {result['p95_ms']:8.3f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--sparse-k", type=int, default=8)
+    parser.add_argument("--openai-model", help="embed with this OpenAI model instead of the stand-in")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.docs)
+    queries = make_queries(corpus, args.queries)
+    dense = OpenAIDense(corpus, args.openai_model) if args.openai_model else HashedDense(corpus)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SparseIndex(os.path.join(tmp, "bench.bm25.sqlite3"))
+        started = time.perf_counter()
+        for start in range(0, len(corpus), 256):
+            index.add(corpus[start:start + 256])
+        print(f"{len(corpus)} chunks, BM25 index built in {time.perf_counter() - started:.2f}s; "
+              f"{len(queries)} queries, k={args.k}")
+
+        def sparse(query):
+            return [doc for _, doc in index.search(query, args.k)]
+
+        def hybrid(query):
+            hits = [doc for _, doc in index.search(query, args.sparse_k)]
+            return rrf_fuse([dense.search(query, args.k), hits], limit=args.k)
+
+        results = [
+            evaluate("dense", lambda q: dense.search(q, args.k), queries, args.k),
+            evaluate("bm25", sparse, queries, args.k),
+            evaluate("hybrid", hybrid, queries, args.k),
+        ]
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""Local stand-ins for Milvus, the GraphRAG LLM agent and Duckling.
+
+Each backend sleeps for a configurable latency instead of doing network
+or model work, so a benchmark measures the app's own overhead (views,
+caches, pools, serialization) under realistic waits. ``install`` makes
+``graphrag.store.Store``, ``graphrag.agent.GraphRAG`` and
+``duckling.convert.DucklingGeneric`` resolve to the fakes and points the
+process-wide Milvus pool at ``FakeMilvus``; call it before Django and the
+``services`` modules are imported.
+"""
+import os
+import sys
+import math
+import time
+import types
+import zlib
+import threading
+from dataclasses import dataclass, fields
+
+from services.sparse import tokenize
+
+
+@dataclass
+class Latencies:
+    """Simulated latencies, in milliseconds."""
+
+    search: float = 40.0  # vector search, per query
+    embed: float = 15.0  # embedding request, per call
+    llm: float = 800.0  # answer generation, per question
+    token: float = 5.0  # between streamed answer pieces
+    convert: float = 150.0  # Duckling conversion, per file
+    insert: float = 20.0  # store.add, per batch
+    milvus: float = 2.0  # any other Milvus RPC (describe, flush, load...)
+
+    @classmethod
+    def parse(cls, spec: str) -> "Latencies":
+        """``"llm=300,search=20"`` -> Latencies with those fields changed."""
+        latencies = cls()
+        names = {f.name for f in fields(cls)}
+        for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+            name, _, value = item.partition("=")
+            if name not in names:
+                raise ValueError(f"unknown latency {name!r} (expected one of {', '.join(sorted(names))})")
+            setattr(latencies, name, float(value))
+        return latencies
+
+
+LATENCIES = Latencies()
+
+
+def _sleep(ms: float):
+    if ms > 0:
+        time.sleep(ms / 1000)
+
+
+def _document(text: str, metadata: dict):
+    try:
+        from langchain_core.documents import Document
+    except ImportError:
+        return types.SimpleNamespace(page_content=text, metadata=metadata)
+    return Document(page_content=text, metadata=metadata)
+
+
+# -- Milvus ----------------------------------------------------------------------
+
+class FakeCluster:
+    """In-memory databases -> collections shared by FakeMilvus and FakeStore."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.databases = {"default": {}}
+
+    def collection(self, db_name: str, name: str, create: bool = False):
+        with self.lock:
+            collections = self.databases.setdefault(db_name, {})
+            if name not in collections:
+                if not create:
+                    raise LookupError(f"collection not found[database={db_name}][collection={name}]")
+                collections[name] = FakeCollectionData()
+            return collections[name]
+
+
+class FakeCollectionData:
+    def __init__(self):
+        self.docs = []
+        self.properties = {}
+        self.indexes = {"vector_index": ("vector", {"index_type": "HNSW", "metric_type": "COSINE"})}
+        self.loaded = False
+
+
+class FakeIndex:
+    def __init__(self, name: str, field: str, params: dict):
+        self.index_name = name
+        self.field_name = field
+        self.params = params
+
+
+class FakeCollection:
+    def __init__(self, data: FakeCollectionData):
+        self.data = data
+
+    @property
+    def indexes(self) -> list:
+        return [FakeIndex(name, field, params) for name, (field, params) in list(self.data.indexes.items())]
+
+    def describe(self) -> dict:
+        _sleep(LATENCIES.milvus)
+        return {"properties": dict(self.data.properties)}
+
+    def set_properties(self, properties: dict):
+        _sleep(LATENCIES.milvus)
+        self.data.properties.update(properties)
+
+    def flush(self):
+        _sleep(LATENCIES.milvus)
+
+    def load(self):
+        _sleep(LATENCIES.milvus * 10)
+        self.data.loaded = True
+
+    def release(self):
+        _sleep(LATENCIES.milvus)
+        self.data.loaded = False
+
+    def delete(self, expr: str):
+        _sleep(LATENCIES.milvus)
+        # the app's delete expressions are comparisons of metadata fields
+        # joined by and/or, which are valid Python as well
+        self.data.docs = [d for d in self.data.docs
+                          if not eval(expr, {}, {"namespace": None, "path": None, **d.metadata})]
+
+    def drop_index(self, index_name: str):
+        _sleep(LATENCIES.milvus)
+        self.data.indexes.pop(index_name, None)
+
+    def create_index(self, field: str, params: dict, index_name: str):
+        # index build time grows with the collection
+        _sleep(LATENCIES.milvus * 10 + len(self.data.docs) * 0.01)
+        self.data.indexes[index_name] = (field, params)
+
+
+class FakeMilvus:
+    """Drop-in for ``services.connections.MilvusConnections``."""
+
+    def __init__(self, uri: str, cluster: FakeCluster):
+        self.uri = uri
+        self.cluster = cluster
+
+    def call(self, label: str, db_name: str, fn, *args, **kwargs):
+        _sleep(LATENCIES.milvus)
+        if label == "load_state":
+            loaded = self.cluster.collection(db_name, args[0]).loaded
+            return types.SimpleNamespace(name="Loaded" if loaded else "NotLoad")
+        if label == "segment_info":
+            docs = len(self.cluster.collection(db_name, args[0]).docs)
+            return [types.SimpleNamespace(mem_size=docs * 12 * 1024)]
+        raise NotImplementedError(f"FakeMilvus does not emulate {label}")
+
+    def collection(self, db_name: str, name: str) -> FakeCollection:
+        _sleep(LATENCIES.milvus)
+        return FakeCollection(self.cluster.collection(db_name, name))
+
+    def list_collections(self, db_name: str) -> list:
+        _sleep(LATENCIES.milvus)
+        with self.cluster.lock:
+            if db_name not in self.cluster.databases:
+                raise LookupError(f"database not found[database={db_name}]")
+            return sorted(self.cluster.databases[db_name])
+
+    def list_databases(self) -> list:
+        _sleep(LATENCIES.milvus)
+        with self.cluster.lock:
+            return sorted(self.cluster.databases)
+
+    def ensure_database(self, db_name: str):
+        with self.cluster.lock:
+            self.cluster.databases.setdefault(db_name, {})
+
+    def drop(self, db_name: str):
+        pass
+
+    def close(self):
+        pass
+
+    def stats(self) -> dict:
+        with self.cluster.lock:
+            return {
+                "databases": len(self.cluster.databases),
+                "collections": sum(len(c) for c in self.cluster.databases.values()),
+            }
+
+
+CLUSTER = FakeCluster()
+
+
+# -- graphrag ----------------------------------------------------------------------
+
+class FakeEmbeddings:
+    """Hashed bag-of-words vectors, so similar texts get similar vectors."""
+
+    def __init__(self, model: str = "fake", dims: int = 256):
+        self.model = model
+        self.dims = dims
+
+    def _vector(self, text: str) -> list:
+        vector = [0.0] * self.dims
+        for token in tokenize(text):
+            vector[zlib.crc32(token.encode()) % self.dims] += 1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def embed_query(self, text: str) -> list:
+        _sleep(LATENCIES.embed)
+        return self._vector(text)
+
+    def embed_documents(self, texts: list) -> list:
+        _sleep(LATENCIES.embed)
+        return [self._vector(text) for text in texts]
+
+
+class FakeStore:
+    """Stand-in for ``graphrag.store.Store`` backed by ``CLUSTER``."""
+
+    def __init__(self, uri=None, database="default", collection="default", k=4, embedding_model=None):
+        self.uri = uri
+        self.database = database
+        self.collection = collection
+        self.k = k
+        self.embeddings = FakeEmbeddings(embedding_model or "fake")
+
+    def add(self, docs: list):
+        self.embeddings.embed_documents([d.page_content for d in docs])
+        _sleep(LATENCIES.insert)
+        data = CLUSTER.collection(self.database, self.collection, create=True)
+        with CLUSTER.lock:
+            data.docs.extend(docs)
+
+    def search(self, query: str, k: int | None = None) -> list:
+        _sleep(LATENCIES.search)
+        try:
+            docs = list(CLUSTER.collection(self.database, self.collection).docs)
+        except LookupError:
+            return []
+        terms = set(tokenize(query))
+        scored = sorted(docs, key=lambda d: -len(terms & set(tokenize(d.page_content))))
+        return scored[:k or self.k]
+
+
+class FakeGraphRAG:
+    """Stand-in for ``graphrag.agent.GraphRAG``: retrieves from the store,
+    then waits ``LATENCIES.llm`` as the answer generation."""
+
+    def __init__(self, store, llm=None, rerank=True, draw_thinking_level=None, draw_model=None):
+        self.store = store
+        self.llm = llm
+
+    def _answer(self, query: str, context: list) -> str:
+        names = ", ".join(sorted({d.metadata.get("name", "?") for d in context})) or "nessun documento"
+        return f"Risposta simulata ({self.llm}) a: {query}. Fonti: {names}."
+
+    def run(self, query: str, user_id=None) -> dict:
+        context = self.store.search(query)
+        _sleep(LATENCIES.llm)
+        return {"response": self._answer(query, context), "context": context}
+
+    def stream(self, query: str, user_id=None):
+        context = self.store.search(query)
+        yield {"context": context}
+        text = self._answer(query, context)
+        # the first piece arrives after most of the generation latency
+        _sleep(LATENCIES.llm * 0.8)
+        pieces = [text[i:i + 16] for i in range(0, len(text), 16)]
+        for piece in pieces:
+            _sleep(LATENCIES.token)
+            yield {"token": piece}
+        yield {"response": text}
+
+
+# -- duckling ----------------------------------------------------------------------
+
+class FakeDucklingGeneric:
+    """Stand-in for ``duckling.convert.DucklingGeneric``: a few chunks per
+    file, derived from its name and size."""
+
+    CHUNKS_PER_FILE = 8
+
+    def convert(self, path: str, namespace: str | None = None) -> list:
+        _sleep(LATENCIES.convert)
+        name = os.path.basename(path)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        return [
+            _document(
+                f"{name} sezione {i + 1}: pressione di progetto, spessore lamiere, "
+                f"prova idraulica, documento {namespace} ({size} byte).",
+                {"namespace": namespace, "name": name, "path": path, "type": "text",
+                 "page_start": i + 1, "page_end": i + 1},
+            )
+            for i in range(self.CHUNKS_PER_FILE)
+        ]
+
+
+def _module(name: str, **attrs) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    return module
+
+
+def install(latencies: Latencies | None = None, uri: str = "http://fake-milvus:19530"):
+    """Route graphrag, duckling and the Milvus pool to the fakes."""
+    global LATENCIES
+    if latencies is not None:
+        LATENCIES = latencies
+    graphrag = _module("graphrag")
+    graphrag.store = _module("graphrag.store", Store=FakeStore)
+    graphrag.agent = _module("graphrag.agent", GraphRAG=FakeGraphRAG)
+    duckling = _module("duckling")
+    duckling.convert = _module("duckling.convert", DucklingGeneric=FakeDucklingGeneric)
+
+    from services import connections
+    from services.tracing import register_stats
+    connections._MILVUS = FakeMilvus(uri, CLUSTER)
+    register_stats("milvus", connections._MILVUS.stats)
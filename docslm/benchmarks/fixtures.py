@@ -0,0 +1,119 @@
+"""Synthetic data for the benchmarks: a jobs share with commessa trees,
+the commesse register workbook, PDF fixtures and a config.yaml wiring
+them together.
+"""
+import os
+import random
+
+import yaml
+
+from .bench_commesse import make_register
+
+SUBDIRS = ["01_Offerta", "02_Ordine", "03_Disegni", "04_Calcoli", "05_Corrispondenza", "06_Qualita"]
+TEXT_BODY = "Verbale di riunione: pressione di progetto, spessori, prova idraulica e spedizione.\n"
+
+
+def make_pdf(path: str, pages: int):
+    """A PDF with ``pages`` blank A4 pages (enough for slicing and previews)."""
+    try:
+        from pypdf import PdfWriter
+    except ImportError:
+        from PyPDF2 import PdfWriter  # type: ignore
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=595, height=842)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def make_jobs_tree(root: str, commesse: int, files_per_dir: int, seed: int = 0) -> list:
+    """Create ``commesse`` commessa folders under ``root``; returns their names.
+
+    Every folder holds the usual sub-folders with a mix of PDFs (1-20
+    pages, a few shared copies so the tree stays small on disk), text
+    notes and opaque binaries.
+    """
+    rnd = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    templates = os.path.join(root, ".templates")
+    os.makedirs(templates, exist_ok=True)
+    pdf_templates = []
+    for pages in (1, 4, 20):
+        path = os.path.join(templates, f"{pages}p.pdf")
+        make_pdf(path, pages)
+        with open(path, "rb") as f:
+            pdf_templates.append(f.read())
+
+    names = []
+    for c in range(commesse):
+        name = f"BENCH-{c + 1:03d}"
+        names.append(name)
+        for sub in SUBDIRS:
+            directory = os.path.join(root, name, sub)
+            os.makedirs(directory, exist_ok=True)
+            for i in range(files_per_dir):
+                kind = rnd.random()
+                if kind < 0.5:
+                    path = os.path.join(directory, f"DWG-{c:03d}-{i:04d}.pdf")
+                    data = rnd.choice(pdf_templates)
+                elif kind < 0.8:
+                    path = os.path.join(directory, f"nota_{i:04d}.txt")
+                    data = (TEXT_BODY * rnd.randint(1, 40)).encode("utf-8")
+                else:
+                    path = os.path.join(directory, f"allegato_{i:04d}.bin")
+                    data = os.urandom(rnd.randint(1, 64) * 1024)
+                with open(path, "wb") as f:
+                    f.write(data)
+    return names
+
+
+def job_files(root: str, commessa: str, limit: int | None = None) -> list:
+    """Relative paths of the PDFs and notes of a commessa, as the UI sends them."""
+    base = os.path.join(root, commessa)
+    found = []
+    for directory, _, files in os.walk(base):
+        for name in sorted(files):
+            if name.endswith((".pdf", ".txt")):
+                found.append(os.path.relpath(os.path.join(directory, name), base).replace("\\", "/"))
+    found.sort()
+    return found[:limit] if limit else found
+
+
+def write_config(path: str, register: str, jobs: str, checkpoints: str, uri: str):
+    """config.yaml for the fake backends: in-process queues and caches, no Redis."""
+    config = {
+        "path": register,
+        "jobs": jobs,
+        "uri": uri,
+        "k": 4,
+        "embedding_model": "fake-embedding",
+        "checkpoints": checkpoints,
+        # conversions stay in this process, where the fake Duckling is installed
+        "ingest_workers": 1,
+        "ingest_batch_size": 64,
+        "bulk_load": True,
+        "job_workers": 2,
+        "agent_cache_size": 256,
+        "answer_cache_enabled": True,
+        "embedding_cache": True,
+        "hybrid_search": True,
+        "listing_crawler": False,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+
+
+def build(base: str, commesse: int = 3, files_per_dir: int = 40, register_rows: int = 5000,
+          uri: str = "http://fake-milvus:19530") -> dict:
+    """Create every fixture under ``base``; returns their paths."""
+    paths = {
+        "jobs": os.path.join(base, "JOBS"),
+        "register": os.path.join(base, "commesse.xlsx"),
+        "checkpoints": os.path.join(base, "ingest"),
+        "cache": os.path.join(base, "cache"),
+        "config": os.path.join(base, "config.yaml"),
+    }
+    paths["commesse"] = make_jobs_tree(paths["jobs"], commesse, files_per_dir)
+    make_register(paths["register"], register_rows)
+    write_config(paths["config"], paths["register"], paths["jobs"], paths["checkpoints"], uri)
+    return paths
@@ -1,6 +1,28 @@
 from django.apps import AppConfig
+from django.core.exceptions import ImproperlyConfigured
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from services.config import ConfigError, get_config
+
+        # Fail fast on a missing or invalid config.yaml instead of on the
+        # first request that needs it.
+        try:
+            config = get_config()
+        except ConfigError as exc:
+            raise ImproperlyConfigured(str(exc)) from exc
+
+        # Open the shared Milvus connection pool once per process; aliases
+        # connect lazily, so this does not require Milvus to be up.
+        if not config.uri:
+            return
+        try:
+            from services.connections import init_milvus
+        except ImportError as exc:
+            print(f"Milvus connection pool not initialized: {exc}")
+            return
+        init_milvus(config.uri, timeout=config.milvus_timeout)
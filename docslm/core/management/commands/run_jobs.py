@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Run background collection-build workers against the Redis job queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help="Worker threads (default: job_workers from config.yaml)")
+
+    def handle(self, *args, **options):
+        from services.config import get_config
+        from services.jobs import JobQueue, RedisJobBackend
+
+        config = get_config()
+        redis_url = config.redis_url
+        if not redis_url:
+            raise CommandError("redis_url is not configured; without Redis the web process runs jobs itself")
+
+        workers = options['workers'] or config.job_workers
+        job_queue = JobQueue(RedisJobBackend(redis_url), workers=workers)
+        job_queue.start()
+        self.stdout.write(f"Job workers started ({workers}) on {redis_url}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            job_queue.stop()
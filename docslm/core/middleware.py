@@ -0,0 +1,114 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+from services.tracing import breakdown, end_trace, get_metrics, start_trace
+
+
+class RequestMetricsMiddleware:
+    """Times every request per endpoint and collects the spans recorded
+    while serving it.
+
+    The per-stage breakdown is returned in a ``Server-Timing`` header (so
+    it shows in the browser's network panel) and printed for requests
+    slower than ``SLOW_REQUEST_SECONDS``. Streaming responses are timed
+    until their last event.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timer = _RequestTimer(request)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            timer.end_trace()
+            timer.finish(500)
+            raise
+        return timer.attach(response)
+
+    async def __acall__(self, request):
+        timer = _RequestTimer(request)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            timer.end_trace()
+            timer.finish(500)
+            raise
+        return timer.attach(response)
+
+
+def _endpoint(request) -> str:
+    try:
+        return resolve(request.path_info).view_name
+    except Resolver404:
+        return 'unmatched'
+
+
+class _RequestTimer:
+    def __init__(self, request):
+        self.method = request.method
+        self.path = request.path
+        self.endpoint = _endpoint(request)
+        self.started = time.perf_counter()
+        # contexts copied while the view runs (worker threads) share the list
+        self.spans, self._token = start_trace()
+        self.done = False
+        get_metrics().request_started(self.endpoint)
+
+    def attach(self, response):
+        self.end_trace()
+        if not response.streaming:
+            response['Server-Timing'] = self.server_timing()
+            self.finish(response.status_code)
+            return response
+        if response.is_async:
+            response.streaming_content = self._astream(response.streaming_content, response.status_code)
+        else:
+            response.streaming_content = self._stream(response.streaming_content, response.status_code)
+        return response
+
+    def end_trace(self):
+        if self._token is not None:
+            end_trace(self._token)
+            self._token = None
+
+    def _stream(self, content, status: int):
+        try:
+            yield from content
+        finally:
+            self.finish(status)
+
+    async def _astream(self, content, status: int):
+        try:
+            async for chunk in content:
+                yield chunk
+        finally:
+            self.finish(status)
+
+    def server_timing(self) -> str:
+        parts = [f'{name.replace(".", "-")};dur={seconds * 1000:.1f}'
+                 for name, seconds in breakdown(self.spans).items()]
+        parts.append(f'total;dur={(time.perf_counter() - self.started) * 1000:.1f}')
+        return ', '.join(parts)
+
+    def finish(self, status: int):
+        if self.done:
+            return
+        self.done = True
+        seconds = time.perf_counter() - self.started
+        get_metrics().request_finished(self.method, self.endpoint, status, seconds)
+        if seconds >= getattr(settings, 'SLOW_REQUEST_SECONDS', 5):
+            stages = ', '.join(f'{name} {s:.2f}s' for name, s in breakdown(self.spans).items())
+            print(f"Slow request {self.method} {self.path} ({status}) {seconds:.2f}s: {stages or 'no spans'}")
@@ -783,6 +783,7 @@ async function createCollection(commessaCode, collectionName) {
                     <div style="text-align:center;">
                         <div style="font-size:16px;font-weight:600;color:var(--text-color);margin-bottom:8px;">Creazione in corso...</div>
                         <div style="font-size:13px;color:var(--text-light);">Processing documenti e creazione collection</div>
+                        <div class="create-collection-progress" style="font-size:12px;color:var(--text-light);margin-top:6px;"></div>
                     </div>
                 </div>
                 <style>
@@ -808,8 +809,20 @@ async function createCollection(commessaCode, collectionName) {
         });
         
         console.log('Response received:', response.status);
-        const data = await response.json();
+        let data = await response.json();
         console.log('Response data:', data);
+
+        if (data.success && data.job_id) {
+            data = await waitForJob(data.job_id, (job) => {
+                const progressEl = body && body.querySelector('.create-collection-progress');
+                if (!progressEl) return;
+                let text = `File elaborati: ${job.done}/${job.total}`;
+                if (job.eta_seconds !== null && job.eta_seconds !== undefined) {
+                    text += ` - tempo stimato: ${Math.ceil(job.eta_seconds)}s`;
+                }
+                progressEl.textContent = text;
+            });
+        }
         
         if (data.success) {
             // Show success message
@@ -856,6 +869,25 @@ async function createCollection(commessaCode, collectionName) {
     }
 }
 
+// Poll a background job until it reaches a final state
+async function waitForJob(jobId, onProgress, intervalMs = 2000) {
+    while (true) {
+        const resp = await fetch(`/api/jobs/${encodeURIComponent(jobId)}/?files=0`);
+        const job = await resp.json();
+        if (job.error && !job.status) {
+            return { success: false, error: job.error };
+        }
+        if (onProgress) onProgress(job);
+        if (job.status === 'completed') {
+            return { success: true, job };
+        }
+        if (job.status === 'failed' || job.status === 'cancelled') {
+            return { success: false, error: job.error || `Job ${job.status}` };
+        }
+        await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+}
+
 function showJobDetails(job) {
     const modal = document.getElementById('jobModal');
     const title = document.getElementById('modalJobTitle');
@@ -928,13 +960,53 @@ function autoResizeTextarea(textarea) {
 }
 
 // --- Job files browser in modal ---
-async function loadJobFiles(commessa, subpath = '') {
+const JOB_FILES_PAGE_SIZE = 500;
+
+function jobFilesUrl(commessa, subpath, page = 1, query = '') {
+    const params = new URLSearchParams({ commessa, subpath, page, page_size: JOB_FILES_PAGE_SIZE });
+    if (query) params.set('q', query);
+    return `/api/list-job-files/?${params.toString()}`;
+}
+
+// Recursive search over the commessa's file index, shaped like a listing page
+async function fetchJobFileSearch(commessa, glob, page = 1) {
+    const params = new URLSearchParams({ commessa, glob, page, page_size: JOB_FILES_PAGE_SIZE });
+    const resp = await fetch(`/api/search-job-files/?${params.toString()}`);
+    const data = await resp.json();
+    if (data.error) throw new Error(data.error);
+    return {
+        commessa,
+        subpath: '',
+        search: glob,
+        query: glob,
+        entries: data.results.map(r => ({ name: r.path, is_dir: false, size: r.size, mtime: r.mtime })),
+        total: data.total,
+        page: data.page,
+        page_size: data.page_size,
+        has_more: data.has_more,
+    };
+}
+
+async function searchJobFiles(commessa, query) {
     const body = document.querySelector('.create-collection-body');
     if (!body) return;
-    console.log('loadJobFiles called', { commessa, subpath });
+    body.innerHTML = `<div style="padding:12px;color:var(--text-light)">Ricerca in corso...</div>`;
+    const glob = /[*?\[]/.test(query) ? query : `*${query}*`;
+    try {
+        renderJobFileBrowser(await fetchJobFileSearch(commessa, glob));
+    } catch (err) {
+        console.error('searchJobFiles error', err);
+        body.innerHTML = `<div style="padding:12px;color:red">Errore: ${err.message}</div>`;
+    }
+}
+
+async function loadJobFiles(commessa, subpath = '', query = '') {
+    const body = document.querySelector('.create-collection-body');
+    if (!body) return;
+    console.log('loadJobFiles called', { commessa, subpath, query });
     body.innerHTML = `<div style="padding:12px;color:var(--text-light)">Caricamento file...</div>`;
     try {
-        const url = `/api/list-job-files/?commessa=${encodeURIComponent(commessa)}&subpath=${encodeURIComponent(subpath)}`;
+        const url = jobFilesUrl(commessa, subpath, 1, query);
         console.log('fetch url', url);
         const resp = await fetch(url);
         const data = await resp.json();
@@ -943,6 +1015,7 @@ async function loadJobFiles(commessa, subpath = '') {
             body.innerHTML = `<div style="padding:12px;color:red">Errore: ${data.error}</div>`;
             return;
         }
+        data.query = query;
         renderJobFileBrowser(data);
     } catch (err) {
         console.error('loadJobFiles error', err);
@@ -1009,6 +1082,63 @@ function renderJobFileBrowser(data) {
 
     body.appendChild(bc);
 
+    // Name filter (substring or glob, applied server-side)
+    const filter = document.createElement('input');
+    filter.type = 'search';
+    filter.className = 'jobfiles-filter';
+    filter.placeholder = 'Filtra per nome (es. *.pdf)';
+    filter.value = data.query || '';
+    filter.style.cssText = 'flex:1;min-width:0;box-sizing:border-box;margin-bottom:12px;padding:8px 12px;border:1px solid var(--border-color);border-radius:6px;background:var(--secondary-color);color:var(--text-color);font-size:13px;';
+    filter.addEventListener('keydown', (e) => {
+        if (e.key === 'Enter') {
+            e.preventDefault();
+            loadJobFiles(data.commessa, subpath, filter.value.trim());
+        }
+    });
+
+    const filterRow = document.createElement('div');
+    filterRow.style.cssText = 'display:flex;gap:8px;align-items:flex-start;';
+    filterRow.appendChild(filter);
+    const searchAll = document.createElement('button');
+    searchAll.type = 'button';
+    searchAll.className = 'jobfiles-search-all';
+    searchAll.textContent = 'Cerca in tutta la commessa';
+    searchAll.style.cssText = 'white-space:nowrap;padding:8px 12px;border:1px solid var(--border-color);border-radius:6px;background:var(--secondary-color);color:var(--accent-color);cursor:pointer;font-size:13px;';
+    searchAll.addEventListener('click', () => {
+        const q = filter.value.trim();
+        if (q) searchJobFiles(data.commessa, q);
+    });
+    filterRow.appendChild(searchAll);
+    body.appendChild(filterRow);
+
+    // Search results can be selected in one go
+    if (data.search !== undefined && data.total) {
+        const selectAll = document.createElement('button');
+        selectAll.type = 'button';
+        selectAll.className = 'jobfiles-select-all';
+        selectAll.textContent = `Seleziona tutti i risultati (${data.total})`;
+        selectAll.style.cssText = 'margin-bottom:12px;padding:8px 12px;border:1px solid var(--accent-color);border-radius:6px;background:transparent;color:var(--accent-color);cursor:pointer;font-size:13px;';
+        selectAll.addEventListener('click', async () => {
+            selectAll.disabled = true;
+            try {
+                let page = 1, more = true;
+                while (more) {
+                    const res = await fetchJobFileSearch(data.commessa, data.search, page);
+                    res.entries.forEach(e => { if (!modalSelectedFiles.includes(e.name)) modalSelectedFiles.push(e.name); });
+                    more = res.has_more;
+                    page += 1;
+                }
+                body.querySelectorAll('.jobfile-file input[type=checkbox]').forEach(cb => { cb.checked = true; });
+                renderSelectedFilesCounter();
+            } catch (err) {
+                console.error('select all search results error', err);
+            } finally {
+                selectAll.disabled = false;
+            }
+        });
+        body.appendChild(selectAll);
+    }
+
     if (!data.entries || data.entries.length === 0) {
         const empty = document.createElement('div');
         empty.style.cssText = 'display:flex;align-items:center;justify-content:center;padding:40px 12px;color:var(--text-light);font-size:14px;';
@@ -1019,6 +1149,13 @@ function renderJobFileBrowser(data) {
 
     const listWrap = document.createElement('div');
     listWrap.style.cssText = 'display:flex;flex-direction:column;gap:8px;';
+    body.appendChild(listWrap);
+    appendJobFileRows(listWrap, data);
+    renderSelectedFilesCounter();
+}
+
+function appendJobFileRows(listWrap, data) {
+    const subpath = data.subpath || '';
 
     // Folders first
     data.entries.filter(e => e.is_dir).forEach(entry => {
@@ -1078,6 +1215,7 @@ function renderJobFileBrowser(data) {
         checkbox.style.cssText = 'width:18px;height:18px;cursor:pointer;accent-color:var(--accent-color);';
         const relPath = subpath ? (subpath + '/' + entry.name) : entry.name;
         checkbox.dataset.path = relPath;
+        checkbox.checked = modalSelectedFiles.includes(relPath);
         checkbox.addEventListener('change', (e) => {
             const p = e.target.dataset.path;
             if (e.target.checked) {
@@ -1093,8 +1231,36 @@ function renderJobFileBrowser(data) {
         listWrap.appendChild(row);
     });
 
-    body.appendChild(listWrap);
-    renderSelectedFilesCounter();
+    // Next page, appended in place
+    if (data.has_more) {
+        const more = document.createElement('button');
+        more.type = 'button';
+        more.className = 'jobfiles-more';
+        more.textContent = `Carica altri (${data.total - data.page * data.page_size} rimanenti)`;
+        more.style.cssText = 'padding:8px 12px;border:1px dashed var(--border-color);border-radius:6px;background:transparent;color:var(--accent-color);cursor:pointer;font-size:13px;';
+        more.addEventListener('click', async () => {
+            more.disabled = true;
+            more.textContent = 'Caricamento...';
+            try {
+                let next;
+                if (data.search !== undefined) {
+                    next = await fetchJobFileSearch(data.commessa, data.search, data.page + 1);
+                } else {
+                    const resp = await fetch(jobFilesUrl(data.commessa, subpath, data.page + 1, data.query));
+                    next = await resp.json();
+                    if (next.error) throw new Error(next.error);
+                    next.query = data.query;
+                }
+                more.remove();
+                appendJobFileRows(listWrap, next);
+            } catch (err) {
+                console.error('load more job files error', err);
+                more.disabled = false;
+                more.textContent = 'Errore, riprova';
+            }
+        });
+        listWrap.appendChild(more);
+    }
 }
 
 function openModelDropdown() {
@@ -1484,6 +1650,120 @@ function appendLoader() {
     return row;
 }
 
+function renderContextButtons(assistantRow, buttons) {
+    try {
+        const bubbleEl = assistantRow.querySelector('.chat-bubble');
+        if (!bubbleEl || !buttons.length) return;
+        const controls = document.createElement('div');
+        controls.className = 'assistant-controls';
+        controls.style.cssText = 'margin-top:4px;display:flex;gap:8px;flex-wrap:wrap;align-items:center;';
+
+        // Label placed before the buttons
+        const labelEl = document.createElement('div');
+        labelEl.className = 'assistant-sources-label';
+        labelEl.textContent = 'Fonti:';
+        controls.appendChild(labelEl);
+
+        buttons.forEach((btnDef) => {
+            const btn = document.createElement('button');
+            btn.className = 'sources-btn';
+            btn.type = 'button';
+            btn.textContent = btnDef.label || btnDef.name || 'Fonte';
+            btn.title = (btnDef.name ? btnDef.name + ' - ' : '') + (btnDef.type || '');
+            btn.dataset.index = btnDef.index;
+            btn.addEventListener('click', (e) => {
+                e.stopPropagation();
+                openSourceModal(btnDef);
+            });
+            controls.appendChild(btn);
+        });
+
+        // Append controls inside the bubble so they sit at bottom-left
+        bubbleEl.appendChild(controls);
+    } catch (err) {
+        console.error('Error rendering context buttons:', err);
+    }
+}
+
+// Parse a text/event-stream body, calling onEvent(name, data) per event
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buffer.indexOf('\n\n')) !== -1) {
+            const raw = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+            let name = 'message';
+            const dataLines = [];
+            raw.split('\n').forEach((line) => {
+                if (line.startsWith('event:')) name = line.slice(6).trim();
+                else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+            });
+            if (dataLines.length) onEvent(name, JSON.parse(dataLines.join('\n')));
+        }
+    }
+}
+
+// Stream an answer: citations are shown as soon as retrieval is done,
+// then the answer grows token by token. Resolves like /api/send-message/.
+async function streamChat(message, mode, loaderRow) {
+    const response = await fetch('/api/stream-message/', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': getCookie('csrftoken')
+        },
+        body: JSON.stringify({ message: message, mode: mode })
+    });
+    const contentType = response.headers.get('Content-Type') || '';
+    if (!contentType.startsWith('text/event-stream')) {
+        return await response.json();
+    }
+
+    let row = null;
+    let text = '';
+    let result = { success: false, error: 'Risposta interrotta' };
+    const ensureRow = () => {
+        if (row) return row;
+        if (loaderRow) {
+            if (loaderRow._timer) clearInterval(loaderRow._timer);
+            loaderRow.remove();
+        }
+        row = appendMessage('assistant', '');
+        const bubbleEl = row && row.querySelector('.chat-bubble');
+        if (bubbleEl) {
+            const answerEl = document.createElement('div');
+            answerEl.className = 'assistant-answer';
+            bubbleEl.appendChild(answerEl);
+        }
+        return row;
+    };
+
+    await readEventStream(response, (event, data) => {
+        if (event === 'context') {
+            if (data.context_buttons && data.context_buttons.length) {
+                renderContextButtons(ensureRow(), data.context_buttons);
+            }
+        } else if (event === 'token') {
+            text += data.text || '';
+            const answerEl = ensureRow().querySelector('.assistant-answer');
+            if (answerEl) answerEl.innerHTML = renderMarkdown(text);
+        } else if (event === 'done') {
+            result = Object.assign({}, data, { row: row, streamed: !!row });
+        } else if (event === 'error') {
+            if (row) row.remove();
+            row = null;
+            result = { success: false, error: data.error };
+        }
+    });
+    return result;
+}
+
 async function sendMessage() {
     if (!activeCollection) {
         showAgentInactive();
@@ -1507,15 +1787,7 @@ async function sendMessage() {
     const loaderRow = appendLoader();
 
     try {
-        const response = await fetch('/api/send-message/', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'X-CSRFToken': getCookie('csrftoken')
-            },
-            body: JSON.stringify({ message: message, mode: mode })
-        });
-        const data = await response.json();
+        const data = await streamChat(message, mode, loaderRow);
             if (data.success) {
             // input already cleared earlier
             if (loaderRow) {
@@ -1523,43 +1795,18 @@ async function sendMessage() {
                 loaderRow.remove();
             }
             // Append assistant response and capture the row element
-            const assistantRow = appendMessage('assistant', data.response || '');
+            let assistantRow = data.row || null;
+            if (assistantRow) {
+                const answerEl = assistantRow.querySelector('.assistant-answer');
+                if (answerEl) answerEl.innerHTML = renderMarkdown(data.response || '');
+            } else {
+                assistantRow = appendMessage('assistant', data.response || '');
+            }
 
             // If backend returned context_buttons, render them inside the assistant bubble
-            if (Array.isArray(data.context_buttons) && assistantRow) {
-                try {
-                    const bubbleEl = assistantRow.querySelector('.chat-bubble');
-                    if (bubbleEl) {
-                        const controls = document.createElement('div');
-                            controls.className = 'assistant-controls';
-                            controls.style.cssText = 'margin-top:4px;display:flex;gap:8px;flex-wrap:wrap;align-items:center;';
-
-                            // Label placed before the buttons
-                            const labelEl = document.createElement('div');
-                            labelEl.className = 'assistant-sources-label';
-                            labelEl.textContent = 'Fonti:';
-                            controls.appendChild(labelEl);
-
-                            data.context_buttons.forEach((btnDef) => {
-                                const btn = document.createElement('button');
-                                btn.className = 'sources-btn';
-                                btn.type = 'button';
-                                btn.textContent = btnDef.label || btnDef.name || 'Fonte';
-                                btn.title = (btnDef.name ? btnDef.name + ' - ' : '') + (btnDef.type || '');
-                                btn.dataset.index = btnDef.index;
-                                btn.addEventListener('click', (e) => {
-                                    e.stopPropagation();
-                                    openSourceModal(btnDef);
-                                });
-                                controls.appendChild(btn);
-                            });
-
-                            // Append controls inside the bubble so they sit at bottom-left
-                            bubbleEl.appendChild(controls);
-                    }
-                } catch (err) {
-                    console.error('Error rendering context buttons:', err);
-                }
+            // (already done while streaming, when the row came from the stream)
+            if (Array.isArray(data.context_buttons) && assistantRow && !data.streamed) {
+                renderContextButtons(assistantRow, data.context_buttons);
             }
 
             // after assistant response, ensure the user's question is the first visible
@@ -1678,7 +1925,8 @@ function openSourceModal(btnDef) {
             body: JSON.stringify({ path: pathVal, page_start: ps !== undefined ? ps : null, page_end: pe !== undefined ? pe : null })
         }).then(r => r.json()).then(res => {
             loading.remove();
-            if (res && (res.preview !== undefined || res.pdf_data_uri || res.data_uri || res.listing)) {
+            const isPdf = res && res.mimetype === 'application/pdf';
+            if (res && (res.preview !== undefined || res.url || res.listing)) {
                 // If server returned a text preview, show it
                 if (res.preview !== undefined && res.preview !== null) {
                     const pre = document.createElement('pre');
@@ -1690,10 +1938,10 @@ function openSourceModal(btnDef) {
                     content.appendChild(pre);
                 }
 
-                // If server returned a PDF data URI, embed it visually
-                else if (res.pdf_data_uri) {
+                // If server returned a PDF preview URL, embed it visually
+                else if (res.url && isPdf) {
                     const iframe = document.createElement('iframe');
-                    iframe.src = res.pdf_data_uri;
+                    iframe.src = res.url;
                     iframe.style.width = '100%';
                     iframe.style.height = '100%';
                     iframe.style.border = 'none';
@@ -1701,10 +1949,10 @@ function openSourceModal(btnDef) {
                     content.appendChild(iframe);
                 }
 
-                // If server returned an image data URI, show it
-                else if (res.data_uri) {
+                // If server returned an image preview URL, show it
+                else if (res.url) {
                     const img = document.createElement('img');
-                    img.src = res.data_uri;
+                    img.src = res.url;
                     img.style.maxWidth = '100%';
                     img.style.maxHeight = '60vh';
                     img.alt = 'Anteprima immagine';
@@ -7,12 +7,20 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('api/greeting/', views.get_greeting, name='greeting'),
     path('api/send-message/', views.send_message, name='send_message'),
+    path('api/stream-message/', views.stream_message, name='stream_message'),
     path('api/login/', views.user_login, name='login'),
     path('api/search-commesse/', views.search_commesse, name='search_commesse'),
     path('api/list-collections/', views.list_collections, name='list_collections'),
     path('api/list-job-files/', views.list_job_files, name='list_job_files'),
+    path('api/search-job-files/', views.search_job_files, name='search_job_files'),
     path('api/list-collection-files/', views.list_collection_files, name='list_collection_files'),
     path('api/create-collection/', views.create_collection, name='create_collection'),
+    path('api/sync-collection/', views.sync_collection, name='sync_collection'),
+    path('api/jobs/<str:job_id>/', views.job_status, name='job_status'),
+    path('api/jobs/<str:job_id>/cancel/', views.cancel_job, name='cancel_job'),
     path('api/initialize-agent/', views.initialize_agent, name='initialize_agent'),
     path('api/check-path/', views.check_path, name='check_path'),
+    path('api/preview/', views.preview_file, name='preview_file'),
+    path('api/rendition/', views.rendition, name='rendition'),
+    path('api/metrics/', views.metrics, name='metrics'),
 ]
@@ -1,10 +1,96 @@
-import os
 import json
-from django.conf import settings
-from django.http import JsonResponse
+import time
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 
-# In-memory agent store (per session). TODO: replace with Redis.
-AGENT_INSTANCES = {}
+from services.config import get_config
+from services.tracing import get_metrics, register_stats, span
+from .aio import blocking_executor, run_blocking
+from .prefetch import get_preview_cache
+
+_AGENT_REGISTRY = None
+_AGENT_REGISTRY_LOCK = threading.Lock()
+
+
+def _build_agent(spec: dict):
+    # local import to avoid heavy imports at module load
+    from services.agent import Agent
+    from services.answers import get_answer_cache
+    from services.resources import get_store_pool
+
+    config = get_config()
+    # sessions on the same collection share one Store / embedding model
+    db_name = f"comm_{spec['commessa']}"
+    _ensure_loaded(spec)
+    store = get_store_pool().acquire(
+        config.uri,
+        db_name,
+        spec['collection'],
+        config.embedding_model,
+        config.k,
+    )
+    try:
+        return Agent(
+            store=store,
+            mode=spec['mode'],
+            rerank=True,
+            answer_cache=get_answer_cache(),
+            cache_scope=(db_name, spec['collection'], spec['mode']),
+        )
+    except Exception:
+        get_store_pool().release(store)
+        raise
+
+
+def _ensure_loaded(spec: dict):
+    """Load the agent's collection in Milvus if it was released while idle."""
+    from services.loads import get_load_manager
+    with span('collection.ensure_loaded'):
+        get_load_manager().ensure_loaded(f"comm_{spec['commessa']}", spec['collection'])
+
+
+@contextmanager
+def _in_use(spec: dict):
+    """Load the agent's collection and keep every worker from releasing it
+    while a query runs."""
+    from services.loads import get_load_manager
+    with get_load_manager().in_use(f"comm_{spec['commessa']}", spec['collection']):
+        yield
+
+
+def _invoke(agent, spec: dict, message: str, user_id):
+    with _in_use(spec):
+        return agent.invoke(message, user_id=user_id)
+
+
+def _release_agent(agent):
+    from services.resources import get_store_pool
+    store = getattr(agent, 'store', None)
+    if store is not None:
+        get_store_pool().release(store)
+
+
+def get_agent_registry():
+    """Process-wide session -> agent registry (specs in Redis or in-process)."""
+    global _AGENT_REGISTRY
+    if _AGENT_REGISTRY is None:
+        with _AGENT_REGISTRY_LOCK:
+            if _AGENT_REGISTRY is None:
+                from services.sessions import AgentRegistry, make_kv
+                config = get_config()
+                _AGENT_REGISTRY = AgentRegistry(
+                    make_kv(config.redis_url),
+                    _build_agent,
+                    max_live=config.get('agent_cache_size', 32),
+                    idle_timeout=config.get('agent_idle_timeout', 1800),
+                    on_release=_release_agent,
+                )
+                register_stats('agent_registry', _AGENT_REGISTRY.stats)
+    return _AGENT_REGISTRY
 
 
 def _idx_to_letters(i: int) -> str:
@@ -16,59 +102,80 @@ def _idx_to_letters(i: int) -> str:
     return result
 
 
-def send_message(request):
+def _response_text(response) -> str:
+    return response.get('response', '') if isinstance(response, dict) else str(response)
+
+
+def _context_buttons(context) -> list:
+    context_buttons = []
+    if not context or not isinstance(context, (list, tuple)):
+        return context_buttons
+    try:
+        for idx, doc in enumerate(context):
+            meta = {}
+            if isinstance(doc, dict):
+                meta = doc.get('metadata', {}) if isinstance(doc.get('metadata', {}), dict) else {}
+            else:
+                meta = getattr(doc, 'metadata', {}) or {}
+
+            doc_type = meta.get('type') or meta.get('doc_type') or (meta.get('mimetype') or '').split('/')[0] or 'text'
+            name = meta.get('name') or meta.get('source') or meta.get('filename') or 'unknown'
+            page_start = meta.get('page_start')
+            page_end = meta.get('page_end')
+            label = _idx_to_letters(idx)
+
+            context_buttons.append({
+                'label': label,
+                'name': name,
+                'type': doc_type,
+                'page_start': page_start,
+                'page_end': page_end,
+                'index': idx,
+                'metadata': meta
+            })
+    except Exception as e:
+        print(f"Error building context buttons: {e}")
+        context_buttons = []
+    return context_buttons
+
+
+def _prefetch_previews(context_buttons: list):
+    if not context_buttons:
+        return
+    try:
+        get_preview_cache().prefetch(context_buttons, limit=get_config().k)
+    except Exception as e:
+        print(f"Error scheduling preview prefetch: {e}")
+
+
+async def send_message(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
 
     try:
         data = json.loads(request.body)
         message = data.get('message', '')
-        username = request.session.get('username')
+        username = await request.session.aget('username')
 
-        active_agent = request.session.get('active_agent')
+        active_agent = await request.session.aget('active_agent')
         if not active_agent:
             return JsonResponse({'error': 'Nessun agent attivo. Seleziona un notebook prima di inviare un messaggio.'}, status=400)
 
         session_key = request.session.session_key
-        agent = AGENT_INSTANCES.get(session_key)
+        registry = get_agent_registry()
+        agent = await run_blocking(registry.get, session_key) if session_key else None
         if not agent:
             return JsonResponse({'error': 'Agent non trovato in memoria. Riseleziona il notebook.'}, status=400)
 
-        final_state = agent.invoke(message, user_id=username)
+        final_state = await run_blocking(_invoke, agent, active_agent, message, username)
         context = final_state.get("context", [])
         response = final_state.get("response", "")
 
-        response_text = response.get('response', '') if isinstance(response, dict) else str(response)
+        response_text = _response_text(response)
         has_context = bool(context) and isinstance(context, (list, tuple)) and len(context) > 0
-
-        context_buttons = []
-        if has_context:
-            try:
-                for idx, doc in enumerate(context):
-                    meta = {}
-                    if isinstance(doc, dict):
-                        meta = doc.get('metadata', {}) if isinstance(doc.get('metadata', {}), dict) else {}
-                    else:
-                        meta = getattr(doc, 'metadata', {}) or {}
-
-                    doc_type = meta.get('type') or meta.get('doc_type') or (meta.get('mimetype') or '').split('/')[0] or 'text'
-                    name = meta.get('name') or meta.get('source') or meta.get('filename') or 'unknown'
-                    page_start = meta.get('page_start')
-                    page_end = meta.get('page_end')
-                    label = _idx_to_letters(idx)
-
-                    context_buttons.append({
-                        'label': label,
-                        'name': name,
-                        'type': doc_type,
-                        'page_start': page_start,
-                        'page_end': page_end,
-                        'index': idx,
-                        'metadata': meta
-                    })
-            except Exception as e:
-                print(f"Error building context buttons: {e}")
-                context_buttons = []
+        with span('chat.context_buttons'):
+            context_buttons = _context_buttons(context) if has_context else []
+            _prefetch_previews(context_buttons)
 
         return JsonResponse({
             'success': True,
@@ -84,6 +191,136 @@ def send_message(request):
         return JsonResponse({'error': f"Errore durante l'invocazione dell'agent: {str(e)}"}, status=500)
 
 
+def _sse(event: str, payload) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+
+class _EventStream:
+    """Turns the agent's stream items into SSE frames, remembering the
+    citation buttons for the final event."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token = True
+        self.buttons = []
+
+    def frame(self, item):
+        kind, value = item
+        if kind == 'context':
+            self.buttons = _context_buttons(value)
+            # warm citation previews while the answer is generated
+            _prefetch_previews(self.buttons)
+            return _sse('context', {'has_context': bool(self.buttons), 'context_buttons': self.buttons})
+        if kind == 'token':
+            if self.first_token:
+                self.first_token = False
+                get_metrics().stage('chat.first_token', time.perf_counter() - self.started)
+            return _sse('token', {'text': value})
+        if kind == 'final':
+            return _sse('done', {
+                'success': True,
+                'response': _response_text(value.get('response', '')),
+                'has_context': bool(self.buttons),
+                'context_buttons': self.buttons,
+            })
+        if kind == 'error':
+            return _sse('error', {'error': f"Errore durante l'invocazione dell'agent: {value}"})
+        return None
+
+
+def _agent_items(agent, spec: dict, message: str, user_id):
+    """The agent's stream items, then ('error', exc) if it fails (blocking)."""
+    try:
+        with _in_use(spec):
+            yield from agent.stream(message, user_id=user_id)
+    except Exception as exc:
+        import traceback
+        traceback.print_exc()
+        yield ('error', exc)
+
+
+async def stream_message(request):
+    """POST JSON: { message }. Server-Sent Events: `context` (citation
+    buttons, as soon as retrieval is done), `token` (answer deltas), then
+    `done` (full answer + buttons) or `error`.
+
+    Events are flushed as they are produced under both entry points: the
+    ASGI app gets an async stream, the WSGI app (docslm.wsgi) a blocking
+    generator that its server thread iterates.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    message = data.get('message', '')
+    username = await request.session.aget('username')
+    active_agent = await request.session.aget('active_agent')
+    if not active_agent:
+        return JsonResponse({'error': 'Nessun agent attivo. Seleziona un notebook prima di inviare un messaggio.'}, status=400)
+
+    session_key = request.session.session_key
+    registry = get_agent_registry()
+    agent = await run_blocking(registry.get, session_key) if session_key else None
+    if not agent:
+        return JsonResponse({'error': 'Agent non trovato in memoria. Riseleziona il notebook.'}, status=400)
+
+    # the agent joins this request's trace; the events are produced after
+    # the middleware has returned the response
+    context = contextvars.copy_context()
+
+    async def events():
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        done = object()
+
+        def produce():
+            # runs in a worker thread: the agent and its clients are blocking
+            try:
+                for item in _agent_items(agent, active_agent, message, username):
+                    loop.call_soon_threadsafe(queue.put_nowait, item)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        producer = loop.run_in_executor(blocking_executor(), context.run, produce)
+        stream = _EventStream()
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                frame = stream.frame(item)
+                if frame:
+                    yield frame
+        finally:
+            await producer
+
+    def blocking_events():
+        # a WSGI server would otherwise drain (and buffer) the async stream
+        items = _agent_items(agent, active_agent, message, username)
+        stream = _EventStream()
+        try:
+            while True:
+                try:
+                    item = context.run(next, items)
+                except StopIteration:
+                    break
+                frame = stream.frame(item)
+                if frame:
+                    yield frame
+        finally:
+            # client gone: leave the agent's stream (and the collection reference)
+            context.run(items.close)
+
+    body = events() if isinstance(request, ASGIRequest) else blocking_events()
+    response = StreamingHttpResponse(body, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 def initialize_agent(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
@@ -97,37 +334,16 @@ def initialize_agent(request):
         if not commessa or not collection_name:
             return JsonResponse({'error': 'Commessa and collection name are required'}, status=400)
 
-        # local import to avoid heavy imports at module load
-        import sys
-        sys.path.append(os.path.join(settings.BASE_DIR, 'docslm'))
-        from services.agent import Agent
-        from graphrag.store import Store
-        import yaml
-
-        config_path = os.path.join(settings.BASE_DIR, 'config.yaml')
-        if not os.path.exists(config_path):
-            return JsonResponse({'error': 'Configuration file not found'}, status=500)
-
-        with open(config_path, "r", encoding="utf-8") as f:
-            config = yaml.safe_load(f)
-
-        db_name = f"comm_{commessa}"
-        store = Store(
-            uri=config.get('uri'),
-            database=db_name,
-            collection=collection_name,
-            k=config.get('k', 4),
-            embedding_model=config.get('embedding_model')
-        )
-
-        agent = Agent(store=store, mode=mode, rerank=True)
-
         session_key = request.session.session_key
         if not session_key:
             request.session.create()
             session_key = request.session.session_key
 
-        AGENT_INSTANCES[session_key] = agent
+        agent = get_agent_registry().activate(session_key, {
+            'commessa': commessa,
+            'collection': collection_name,
+            'mode': mode,
+        })
 
         request.session['active_agent'] = {
             'commessa': commessa,
@@ -0,0 +1,32 @@
+import asyncio
+import functools
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def blocking_executor() -> ThreadPoolExecutor:
+    """Bounded pool for blocking work (pymilvus, pandas, LLM clients, SMB I/O)
+    started from async views, so they never block the event loop and never
+    spawn an unbounded number of threads."""
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'BLOCKING_POOL_SIZE', 32),
+                    thread_name_prefix='docslm-io',
+                )
+    return _EXECUTOR
+
+
+async def run_blocking(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # run in a copy of the caller's context, so spans join the request's trace
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(blocking_executor(), functools.partial(context.run, fn, *args, **kwargs))
@@ -1,9 +1,10 @@
 import os
-import csv
 from django.conf import settings
 from django.shortcuts import render
 from django.http import JsonResponse
 
+from .users import USER_DIRECTORY
+
 def index(request):
     """Render the main page."""
     return render(request, 'index.html')
@@ -17,7 +18,7 @@ def get_greeting(request):
 
 
 def user_login(request):
-    """Login using CSV file for simplicity."""
+    """Login against users.csv (indexed in memory, reloaded when it changes)."""
     if request.method == 'POST':
         import json
         data = json.loads(request.body)
@@ -26,18 +27,16 @@ def user_login(request):
         csv_path = os.path.join(settings.BASE_DIR, 'users.csv')
         
         try:
-            with open(csv_path, mode='r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row['username'].lower() == username:
-                        request.session['username'] = username
-                        return JsonResponse({
-                            'success': True,
-                            'name': row['display_name'],
-                            'role': row['role'],
-                            'initial': row['display_name'][0].upper()
-                        })
-                
+            row = USER_DIRECTORY.get(csv_path, username) if username else None
+            if row is not None:
+                request.session['username'] = username
+                return JsonResponse({
+                    'success': True,
+                    'name': row['display_name'],
+                    'role': row['role'],
+                    'initial': row['display_name'][0].upper()
+                })
+
             return JsonResponse({
                 'success': False,
                 'error': 'Utente non trovato'
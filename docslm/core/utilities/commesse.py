@@ -0,0 +1,181 @@
+import os
+import math
+import bisect
+import threading
+from datetime import datetime
+
+# Register column -> result key. The register is edited by hand, so the
+# header text (including the embedded newline) must match exactly.
+COLUMNS = {
+    'code': "Commessa",
+    'typeof': "Tipo \nComm.",
+    'start_date': "Data Apertura Commessa",
+    'company': "Ragione Sociale Acquisizione contratto",
+    'customer': "Cliente",
+    'goal': "Scopo della fornitura",
+    'order_number': "N° ordine",
+    'project_manager': "PM",
+    'site': "Stabilimento",
+    'output': "Resa",
+}
+END_DATE_COLUMN = "Consegna"
+
+# Separator placed between codes in the joined haystack; it can never appear
+# in a normalized query, so a match never spans two codes.
+_SEP = '\x00'
+
+
+def normalize_code(val) -> str:
+    return str(val).replace(" ", "").lower()
+
+
+def normalize_value(val):
+    if val is None:
+        return "Non specificato"
+    if isinstance(val, float) and math.isnan(val):
+        return "Non specificato"
+    if isinstance(val, str) and val.strip().lower() in ["", "nan"]:
+        return "Non specificato"
+    return str(val)
+
+
+def _parse_date(val):
+    """End date of one register cell as a datetime, or None if unparseable."""
+    if val is None or (isinstance(val, float) and math.isnan(val)):
+        return None
+    import pandas as pd
+    try:
+        date = pd.to_datetime(val)
+    except Exception:
+        return None
+    return None if pd.isna(date) else date.to_pydatetime()
+
+
+def read_register(excel_path: str):
+    """Read the commesse register into a DataFrame with proper headers."""
+    import pandas as pd
+    df = pd.read_excel(excel_path, header=0, skiprows=0)
+
+    # handle Excel files where headers are in first data row
+    if 'Unnamed: 0' in df.columns:
+        headers = df.iloc[0].to_dict()
+        df = df.iloc[1:].reset_index(drop=True)
+        column_mapping = {}
+        for col, header in headers.items():
+            if pd.notna(header) and str(header).strip():
+                column_mapping[col] = str(header).strip()
+        df = df.rename(columns=column_mapping)
+    return df
+
+
+class CommesseIndex:
+    """In-process index over the commesse register.
+
+    The register is parsed once and rebuilt only when the Excel file's
+    mtime or size changes. Normalized job codes are kept both joined into a
+    single haystack string (substring search runs as repeated ``str.find``)
+    and in a sorted list (prefix search runs as a ``bisect`` range).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signature = None
+        # (rows, end_dates, offsets, haystack, sorted_codes), swapped as a unit
+        self._state = ([], [], [], '', [])
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def refresh(self, excel_path: str) -> bool:
+        """Rebuild the index if the register changed. Returns True on rebuild."""
+        st = os.stat(excel_path)
+        signature = (os.path.abspath(excel_path), st.st_mtime_ns, st.st_size)
+        if signature == self._signature:
+            return False
+        with self._lock:
+            if signature == self._signature:
+                return False
+            self._build(read_register(excel_path))
+            self._signature = signature
+        return True
+
+    def _build(self, df):
+        # parsed per cell, as the original search did: a column-wide parse
+        # infers one format and drops rows written in another
+        if END_DATE_COLUMN in df.columns:
+            end_dates = [_parse_date(val) for val in df[END_DATE_COLUMN].tolist()]
+        else:
+            end_dates = [None] * len(df)
+
+        columns = {key: (df[col].tolist() if col in df.columns else [None] * len(df))
+                   for key, col in COLUMNS.items()}
+
+        rows = []
+        ends = []
+        codes = []
+        for i in range(len(df)):
+            end = end_dates[i]
+            row = {key: normalize_value(values[i]) for key, values in columns.items()}
+            row['end_date'] = end.strftime("%d/%m/%Y") if end else "Non Definito"
+            rows.append(row)
+            ends.append(end)
+            codes.append(normalize_code(columns['code'][i]))
+
+        offsets = []
+        pos = 0
+        for code in codes:
+            offsets.append(pos)
+            pos += len(code) + 1
+
+        # Publish the new state in one assignment so concurrent readers never
+        # see a half-built index.
+        self._state = (
+            rows, ends, offsets, _SEP.join(codes) + _SEP,
+            sorted((code, i) for i, code in enumerate(codes)),
+        )
+
+    @staticmethod
+    def _result(state, i: int, now: datetime) -> dict:
+        row = dict(state[0][i])
+        end = state[1][i]
+        if end is None:
+            row['status'] = "Non Definito"
+        else:
+            row['status'] = "Conclusa" if end < now else "In Corso"
+        return row
+
+    def search(self, query: str, limit: int | None = None) -> list:
+        """Return result dicts whose job code contains ``query``, in register order."""
+        needle = normalize_code(query)
+        if not needle:
+            return []
+        state = self._state
+        offsets, haystack = state[2], state[3]
+        hits = []
+        start = haystack.find(needle)
+        while start != -1:
+            i = bisect.bisect_right(offsets, start) - 1
+            hits.append(i)
+            if limit is not None and len(hits) >= limit:
+                break
+            # skip the rest of this code: one hit per row
+            start = haystack.find(needle, offsets[i + 1] if i + 1 < len(offsets) else len(haystack))
+        now = datetime.now()
+        return [self._result(state, i, now) for i in hits]
+
+    def search_prefix(self, query: str, limit: int | None = None) -> list:
+        """Return result dicts whose job code starts with ``query``, sorted by code."""
+        needle = normalize_code(query)
+        if not needle:
+            return []
+        state = self._state
+        codes = state[4]
+        lo = bisect.bisect_left(codes, (needle,))
+        hi = bisect.bisect_left(codes, (needle + '\uffff',))
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        now = datetime.now()
+        return [self._result(state, i, now) for _, i in codes[lo:hi]]
+
+
+COMMESSE_INDEX = CommesseIndex()
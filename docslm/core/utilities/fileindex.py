@@ -0,0 +1,220 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+from services.config import get_config
+from services.tracing import register_stats
+from .listing import TreeCrawler, get_directory_cache, get_tree_crawler
+
+SORT_COLUMNS = {'path': 'dir, name', 'name': 'name', 'size': 'size', 'mtime': 'mtime'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    commessa TEXT NOT NULL,
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    PRIMARY KEY (commessa, dir, name)
+);
+CREATE INDEX IF NOT EXISTS files_ext ON files (commessa, ext);
+CREATE TABLE IF NOT EXISTS dirs (
+    commessa TEXT NOT NULL,
+    dir TEXT NOT NULL,
+    signature TEXT NOT NULL,
+    PRIMARY KEY (commessa, dir)
+);
+CREATE TABLE IF NOT EXISTS trees (
+    commessa TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    indexed_at REAL NOT NULL
+);
+"""
+
+
+def _signature(entries: list) -> str:
+    digest = hashlib.sha1()
+    for e in entries:
+        digest.update(f"{e['name']}\x00{e['is_dir']}\x00{e['size']}\x00{e['mtime']}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class FileIndex:
+    """SQLite index of file metadata for each commessa tree.
+
+    It is fed directory by directory from ``TreeCrawler`` walks: a
+    directory's rows are rewritten only when its listing signature changed,
+    and directories that disappeared are dropped at the end of a walk, so
+    keeping the index current costs little more than the walk itself.
+    """
+
+    def __init__(self, path: str, max_age: float = 300):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+        self._refreshing = set()
+        self.updated_dirs = 0
+
+    # -- maintenance (TreeCrawler listener) ----------------------------------
+
+    def on_directory(self, commessa: str, root: str, rel_dir, entries):
+        if rel_dir is None:
+            self._finish_walk(commessa, root, entries)
+            return
+        signature = _signature(entries)
+        with self._lock:
+            row = self._db.execute(
+                'SELECT signature FROM dirs WHERE commessa = ? AND dir = ?', (commessa, rel_dir)
+            ).fetchone()
+            if row and row[0] == signature:
+                return
+            self._db.execute('DELETE FROM files WHERE commessa = ? AND dir = ?', (commessa, rel_dir))
+            self._db.executemany(
+                'INSERT INTO files (commessa, dir, name, ext, size, mtime) VALUES (?, ?, ?, ?, ?, ?)',
+                [(commessa, rel_dir, e['name'], os.path.splitext(e['name'])[1].lstrip('.').lower(),
+                  e['size'], e['mtime']) for e in entries if not e['is_dir']],
+            )
+            self._db.execute(
+                'INSERT OR REPLACE INTO dirs (commessa, dir, signature) VALUES (?, ?, ?)',
+                (commessa, rel_dir, signature),
+            )
+            self._db.commit()
+            self.updated_dirs += 1
+
+    def _finish_walk(self, commessa: str, root: str, seen: set):
+        with self._lock:
+            known = {r[0] for r in self._db.execute('SELECT dir FROM dirs WHERE commessa = ?', (commessa,))}
+            gone = [(commessa, d) for d in known - set(seen)]
+            self._db.executemany('DELETE FROM files WHERE commessa = ? AND dir = ?', gone)
+            self._db.executemany('DELETE FROM dirs WHERE commessa = ? AND dir = ?', gone)
+            self._db.execute(
+                'INSERT OR REPLACE INTO trees (commessa, root, indexed_at) VALUES (?, ?, ?)',
+                (commessa, root, time.time()),
+            )
+            self._db.commit()
+
+    def indexed_at(self, commessa: str):
+        with self._lock:
+            row = self._db.execute('SELECT indexed_at FROM trees WHERE commessa = ?', (commessa,)).fetchone()
+        return row[0] if row else None
+
+    def ensure(self, commessa: str, root: str) -> bool:
+        """Index the tree in the background on first use, and refresh it once
+        it is older than ``max_age`` (unless the crawler keeps it). Returns
+        False while the first walk is still running: searches then see the
+        directories indexed so far."""
+        crawler = get_tree_crawler()
+        if crawler is not None:
+            if self.on_directory not in crawler.listeners:
+                crawler.listeners.append(self.on_directory)
+            crawler.track(commessa, root)
+        indexed_at = self.indexed_at(commessa)
+        if crawler is None and (indexed_at is None or time.time() - indexed_at > self.max_age):
+            with self._lock:
+                if commessa not in self._refreshing:
+                    self._refreshing.add(commessa)
+                    threading.Thread(target=self._refresh, args=(commessa, root), daemon=True).start()
+        return indexed_at is not None
+
+    def _refresh(self, commessa: str, root: str):
+        try:
+            self._walker().walk(commessa, root)
+        except Exception as exc:
+            print(f"File index refresh of {commessa} failed: {exc}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(commessa)
+
+    def _walker(self) -> TreeCrawler:
+        walker = TreeCrawler(get_directory_cache())
+        walker.listeners.append(self.on_directory)
+        return walker
+
+    # -- queries ---------------------------------------------------------------
+
+    def search(
+            self,
+            commessa: str,
+            glob: str = '',
+            extensions: list | None = None,
+            min_size: int | None = None,
+            max_size: int | None = None,
+            modified_after: float | None = None,
+            modified_before: float | None = None,
+            subpath: str = '',
+            sort: str = 'path',
+            descending: bool = False,
+            page: int = 1,
+            page_size: int = 200,
+            ):
+        """(total, rows) of files matching every given filter; ``glob`` is
+        case-insensitive and matched against the name, or against the
+        relative path when it contains a '/'."""
+        where = ['commessa = ?']
+        params = [commessa]
+        if glob:
+            target = "(CASE dir WHEN '' THEN name ELSE dir || '/' || name END)" if '/' in glob else 'name'
+            where.append(f'lower({target}) GLOB ?')
+            params.append(glob.lower())
+        if extensions:
+            where.append(f"ext IN ({','.join('?' * len(extensions))})")
+            params += [e.lower().lstrip('.') for e in extensions]
+        for clause, value in (('size >= ?', min_size), ('size <= ?', max_size),
+                              ('mtime >= ?', modified_after), ('mtime <= ?', modified_before)):
+            if value is not None:
+                where.append(clause)
+                params.append(value)
+        if subpath:
+            where.append("(dir = ? OR dir LIKE ? ESCAPE '\\')")
+            escaped = subpath.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params += [subpath, escaped + '/%']
+        sql_where = ' AND '.join(where)
+        order = SORT_COLUMNS.get(sort, SORT_COLUMNS['path'])
+        if descending:
+            order = ', '.join(f'{col} DESC' for col in order.split(', '))
+        page = max(page, 1)
+        with self._lock:
+            total = self._db.execute(f'SELECT COUNT(*) FROM files WHERE {sql_where}', params).fetchone()[0]
+            rows = self._db.execute(
+                f'SELECT dir, name, size, mtime FROM files WHERE {sql_where} ORDER BY {order} LIMIT ? OFFSET ?',
+                params + [page_size, (page - 1) * page_size],
+            ).fetchall()
+        return total, [
+            {'path': f'{d}/{name}' if d else name, 'name': name, 'size': size, 'mtime': mtime}
+            for d, name, size, mtime in rows
+        ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'trees': self._db.execute('SELECT COUNT(*) FROM trees').fetchone()[0],
+                'files': self._db.execute('SELECT COUNT(*) FROM files').fetchone()[0],
+                'updated_dirs': self.updated_dirs,
+            }
+
+
+_FILE_INDEX = None
+_FILE_INDEX_LOCK = threading.Lock()
+
+
+def get_file_index() -> FileIndex:
+    global _FILE_INDEX
+    if _FILE_INDEX is None:
+        from django.conf import settings
+        with _FILE_INDEX_LOCK:
+            if _FILE_INDEX is None:
+                config = get_config()
+                _FILE_INDEX = FileIndex(
+                    os.path.join(settings.DOCSLM_CACHE_DIR, 'files.sqlite3'),
+                    max_age=config.get('listing_crawl_interval', 300),
+                )
+                register_stats('file_index', _FILE_INDEX.stats)
+    return _FILE_INDEX
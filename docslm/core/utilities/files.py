@@ -1,33 +1,31 @@
 import os
-import io
 import json
-import base64
 import mimetypes
-from django.conf import settings
+from datetime import datetime
 from django.http import JsonResponse
 
-MAX_PREVIEW_BYTES = 10 * 1024 * 1024  # 10 MB
+from services.config import get_config
+from .aio import run_blocking
+from .fileindex import get_file_index
+from .listing import filter_entries, get_directory_cache, get_tree_crawler, paginate
+from .pagecache import get_page_cache
+from .prefetch import get_preview_cache
+from .preview import parse_page_range, preview_url
+from .renditions import SIZE_CLASSES, renderable, renditions_available, rendition_url
 
+MAX_PREVIEW_BYTES = 10 * 1024 * 1024  # 10 MB, inline text previews only
+MAX_PAGE_SIZE = 1000  # entries per page of list_job_files
 
-def check_path(request):
+
+def _check_path(request):
     """POST JSON: { "path": "C:/..." , optional page_start,page_end for PDF }
-    Returns existence, listing for dirs, previews for files (images/pdf/text).
+    Returns existence, listing for dirs, preview URL and metadata for
+    images/pdf (served by preview_file, with thumbnail/rendition URLs for
+    bounded-size previews), inline text for other files.
     """
     if request.method != 'POST':
         return JsonResponse({'error': 'Metodo non consentito'}, status=405)
 
-    # Lazy import for PDF libs
-    PdfReader = None
-    PdfWriter = None
-    try:
-        from PyPDF2 import PdfReader, PdfWriter  # type: ignore
-    except Exception:
-        try:
-            from pypdf import PdfReader, PdfWriter  # type: ignore
-        except Exception:
-            PdfReader = None
-            PdfWriter = None
-
     try:
         data = json.loads(request.body)
         path = (data.get('path') or '').strip()
@@ -54,88 +52,72 @@ def check_path(request):
         # File handling
         resp['is_file'] = True
         try:
-            resp['size'] = os.path.getsize(path)
+            st = os.stat(path)
+            resp['size'] = st.st_size
+            resp['mtime'] = st.st_mtime
         except Exception:
+            st = None
             resp['size'] = None
 
-        if resp.get('size') and resp['size'] > MAX_PREVIEW_BYTES:
-            resp['error'] = 'File troppo grande per anteprima'
-            return JsonResponse(resp)
-
         mimetypes.init()
         mime, _ = mimetypes.guess_type(path)
         resp['mimetype'] = mime
 
-        # Images
+        # Images: streamed by the preview endpoint, downscaled by the rendition one
         if mime and mime.startswith('image/'):
-            try:
-                with open(path, 'rb') as fh:
-                    b = fh.read()
-                resp['data_uri'] = f"data:{mime};base64," + base64.b64encode(b).decode('ascii')
-                return JsonResponse(resp)
-            except Exception as e:
-                resp.update({'error': str(e)})
-                return JsonResponse(resp, status=500)
+            resp['url'] = preview_url(path)
+            if renditions_available() and renderable(path):
+                resp['thumbnail_url'] = rendition_url(path)
+                resp['rendition_url'] = rendition_url(path, 'large')
+            return JsonResponse(resp)
 
-        # PDF handling (full or extracted pages)
+        # PDF handling (full or extracted pages), streamed by the preview endpoint
         if (mime and mime == 'application/pdf') or path.lower().endswith('.pdf'):
-            page_start = data.get('page_start')
-            page_end = data.get('page_end')
-            # try extract pages if requested and library available
-            if page_start is not None and page_end is not None and PdfReader and PdfWriter:
-                try:
-                    ps = int(page_start)
-                    pe = int(page_end)
-                    if ps < 1:
-                        ps = 1
-                    if pe < ps:
-                        pe = ps
-                    reader = PdfReader(path)
-                    num_pages = len(reader.pages)
-                    ps = min(ps, num_pages)
-                    pe = min(pe, num_pages)
-                    writer = PdfWriter()
-                    for p in range(ps - 1, pe):
-                        try:
-                            writer.add_page(reader.pages[p])
-                        except Exception:
-                            pass
-                    out = io.BytesIO()
-                    writer.write(out)
-                    out_bytes = out.getvalue()
-                    if len(out_bytes) > MAX_PREVIEW_BYTES:
-                        resp['error'] = 'Anteprima estratta troppo grande'
-                        return JsonResponse(resp)
-                    resp['pdf_data_uri'] = "data:application/pdf;base64," + base64.b64encode(out_bytes).decode('ascii')
-                    resp['extracted_pages'] = {'page_start': ps, 'page_end': pe}
-                    return JsonResponse(resp)
-                except Exception as e:
-                    resp.update({'error': 'Impossibile estrarre pagine: ' + str(e)})
-                    return JsonResponse(resp, status=500)
-            # default: return full PDF
+            resp['mimetype'] = 'application/pdf'
             try:
-                with open(path, 'rb') as fh:
-                    b = fh.read()
-                resp['pdf_data_uri'] = "data:application/pdf;base64," + base64.b64encode(b).decode('ascii')
-                return JsonResponse(resp)
-            except Exception as e:
-                resp.update({'error': str(e)})
-                return JsonResponse(resp, status=500)
+                pages = parse_page_range(data.get('page_start'), data.get('page_end'))
+            except (TypeError, ValueError):
+                pages = None
+            if pages and st is not None:
+                try:
+                    num_pages = get_page_cache().page_count(path, st)
+                    pages = (min(pages[0], num_pages), min(pages[1], num_pages))
+                except Exception:
+                    # no PDF library or unreadable file: the slice endpoint clamps
+                    pass
+            if pages:
+                resp['extracted_pages'] = {'page_start': pages[0], 'page_end': pages[1]}
+                resp['url'] = preview_url(path, *pages)
+            else:
+                resp['url'] = preview_url(path)
+            if renditions_available():
+                resp['thumbnail_url'] = rendition_url(path, page=pages[0] if pages else None)
+            return JsonResponse(resp)
 
-        # Other files: try text decode
+        if resp.get('size') and resp['size'] > MAX_PREVIEW_BYTES:
+            resp['error'] = 'File troppo grande per anteprima'
+            return JsonResponse(resp)
+
+        # Other files: try text decode (prefetched bodies are served from memory)
         try:
-            with open(path, 'r', encoding='utf-8') as fh:
-                content = fh.read()
-        except UnicodeDecodeError:
-            try:
-                with open(path, 'r', encoding='latin-1') as fh:
-                    content = fh.read()
-            except Exception as e:
-                resp.update({'error': f'Impossibile decodificare il file: {e}'})
-                return JsonResponse(resp, status=500)
+            cache = get_preview_cache()
+            cached = cache.get(path, st) if st is not None else None
+            if cached is None and st is not None:
+                cached = cache.load(path, st)
+                if cached is not None:
+                    cache.put(path, st, None, *cached)
+            if cached is not None:
+                raw = cached[0]
+            else:
+                with open(path, 'rb') as fh:
+                    raw = fh.read()
         except Exception as e:
             resp.update({'error': str(e)})
             return JsonResponse(resp, status=500)
+        try:
+            content = raw.decode('utf-8')
+        except UnicodeDecodeError:
+            content = raw.decode('latin-1')
 
         resp['preview'] = content
         return JsonResponse(resp)
@@ -144,26 +126,33 @@ def check_path(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
-def list_job_files(request):
-    """GET params: commessa (required), subpath (optional)."""
+async def check_path(request):
+    return await run_blocking(_check_path, request)
+
+
+def _list_job_files(request):
+    """GET params: commessa (required), subpath, q (name filter, substring
+    or glob), sort (name|mtime|size), order (asc|desc), page, page_size
+    (optional; without it every entry is returned), thumbnails (1 to add a
+    thumbnail_url to images and PDFs), thumbnail_size (default thumb)."""
     commessa = request.GET.get('commessa', '').strip()
     subpath = request.GET.get('subpath', '').strip()
     if not commessa:
         return JsonResponse({'error': 'Commessa richiesta'}, status=400)
+    try:
+        page = int(request.GET.get('page') or 1)
+        page_size = min(int(request.GET.get('page_size') or 0), MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'Parametri di paginazione non validi'}, status=400)
 
     try:
-        import yaml
-        config_path = os.path.join(settings.BASE_DIR, 'config.yaml')
-        if not os.path.exists(config_path):
-            return JsonResponse({'error': 'Configuration file not found'}, status=500)
-        with open(config_path, 'r', encoding='utf-8') as f:
-            cfg = yaml.safe_load(f)
-        jobs_base = cfg.get('jobs')
+        jobs_base = get_config().jobs
         if not jobs_base:
             return JsonResponse({'error': 'Jobs path not configured'}, status=500)
 
         target_base = os.path.abspath(jobs_base)
-        target = os.path.join(target_base, commessa)
+        commessa_root = os.path.join(target_base, commessa)
+        target = commessa_root
         if subpath:
             safe_sub = os.path.normpath(subpath).lstrip(os.sep).lstrip('/')
             target = os.path.join(target, safe_sub)
@@ -171,24 +160,32 @@ def list_job_files(request):
 
         if not target.startswith(target_base):
             return JsonResponse({'error': 'Invalid path'}, status=400)
-        if not os.path.exists(target):
+        if not os.path.isdir(target):
             return JsonResponse({'error': 'Path not found', 'path': target}, status=404)
 
-        entries = []
-        for name in sorted(os.listdir(target)):
-            full = os.path.join(target, name)
-            try:
-                stat = os.stat(full)
-                entries.append({
-                    'name': name,
-                    'is_dir': os.path.isdir(full),
-                    'size': stat.st_size,
-                    'mtime': stat.st_mtime
-                })
-            except Exception:
-                continue
-
-        rel_target = os.path.relpath(target, os.path.join(target_base, commessa)).replace('\\', '/')
+        crawler = get_tree_crawler()
+        if crawler is not None:
+            crawler.track(commessa, commessa_root)
+
+        entries = filter_entries(
+            get_directory_cache().entries(target),
+            query=request.GET.get('q', ''),
+            sort=request.GET.get('sort', 'name'),
+            descending=request.GET.get('order', 'asc') == 'desc',
+        )
+        total = len(entries)
+        entries, page, page_size = paginate(entries, page, page_size)
+        if request.GET.get('thumbnails') in ('1', 'true') and renditions_available():
+            size = request.GET.get('thumbnail_size', 'thumb')
+            size = size if size in SIZE_CLASSES else 'thumb'
+            # copies: the entries are shared with the directory cache
+            entries = [
+                dict(e, thumbnail_url=rendition_url(os.path.join(target, e['name']), size))
+                if not e['is_dir'] and renderable(e['name']) else e
+                for e in entries
+            ]
+
+        rel_target = os.path.relpath(target, commessa_root).replace('\\', '/')
         if rel_target == '.':
             rel_target = ''
 
@@ -196,29 +193,111 @@ def list_job_files(request):
             'base_jobs': target_base,
             'commessa': commessa,
             'subpath': rel_target,
-            'entries': entries
+            'entries': entries,
+            'total': total,
+            'page': page,
+            'page_size': page_size,
+            'has_more': page * page_size < total,
+        })
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+async def list_job_files(request):
+    return await run_blocking(_list_job_files, request)
+
+
+def _parse_time(value: str):
+    """Epoch seconds or ISO date/datetime; None if empty."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def _search_job_files(request):
+    """GET params: commessa (required), glob (on the name, or on the relative
+    path if it contains '/'), ext (comma separated), min_size, max_size
+    (bytes), modified_after, modified_before (epoch or ISO date), subpath,
+    sort (path|name|size|mtime), order, page, page_size.
+    Served from the commessa's file index, built in the background on first
+    use ('indexing' is true, and the results partial, until it completes).
+    """
+    commessa = request.GET.get('commessa', '').strip()
+    if not commessa:
+        return JsonResponse({'error': 'Commessa richiesta'}, status=400)
+    try:
+        extensions = [e.strip() for e in request.GET.get('ext', '').split(',') if e.strip()]
+        min_size = int(request.GET['min_size']) if request.GET.get('min_size') else None
+        max_size = int(request.GET['max_size']) if request.GET.get('max_size') else None
+        modified_after = _parse_time(request.GET.get('modified_after', '').strip())
+        modified_before = _parse_time(request.GET.get('modified_before', '').strip())
+        page = int(request.GET.get('page') or 1)
+        page_size = min(int(request.GET.get('page_size') or 200), MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'Parametri di ricerca non validi'}, status=400)
+
+    try:
+        jobs_base = get_config().jobs
+        if not jobs_base:
+            return JsonResponse({'error': 'Jobs path not configured'}, status=500)
+        target_base = os.path.abspath(jobs_base)
+        root = os.path.abspath(os.path.join(target_base, commessa))
+        if not root.startswith(target_base):
+            return JsonResponse({'error': 'Invalid path'}, status=400)
+        if not os.path.isdir(root):
+            return JsonResponse({'error': 'Path not found', 'path': root}, status=404)
+
+        subpath = os.path.normpath(request.GET.get('subpath', '').strip() or '.').replace('\\', '/')
+        subpath = '' if subpath == '.' else subpath.strip('/')
+
+        index = get_file_index()
+        complete = index.ensure(commessa, root)
+        total, results = index.search(
+            commessa,
+            glob=request.GET.get('glob', '').strip(),
+            extensions=extensions,
+            min_size=min_size,
+            max_size=max_size,
+            modified_after=modified_after,
+            modified_before=modified_before,
+            subpath=subpath,
+            sort=request.GET.get('sort', 'path'),
+            descending=request.GET.get('order', 'asc') == 'desc',
+            page=page,
+            page_size=page_size,
+        )
+        return JsonResponse({
+            'commessa': commessa,
+            'results': results,
+            'total': total,
+            'page': max(page, 1),
+            'page_size': page_size,
+            'has_more': max(page, 1) * page_size < total,
+            'indexed_at': index.indexed_at(commessa),
+            # first index of this tree still being built: results are partial
+            'indexing': not complete,
         })
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
-def list_collections(request):
+async def search_job_files(request):
+    return await run_blocking(_search_job_files, request)
+
+
+def _list_collections(request):
     """List collections for a selected commessa using services.store.ManageDB"""
     commessa = request.GET.get('commessa', '').strip()
     if not commessa:
         return JsonResponse({'collections': []})
 
     try:
-        import sys
-        import yaml
-        sys.path.append(os.path.join(settings.BASE_DIR, 'docslm'))
-        from services.store import ManageDB
+        from services.store import get_manage_db
 
-        config_path = os.path.join(settings.BASE_DIR, 'config.yaml')
-        if not os.path.exists(config_path):
-            return JsonResponse({'error': 'Configuration file not found'}, status=500)
-
-        db_manager = ManageDB(config_path)
+        db_manager = get_manage_db(get_config().source)
         try:
             collections = db_manager.list_collections(commessa)
         except Exception as e:
@@ -239,8 +318,14 @@ def list_collections(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+async def list_collections(request):
+    return await run_blocking(_list_collections, request)
+
+
 def create_collection(request):
-    """POST JSON: { commessa, collection_name, files?: [relative paths] }"""
+    """POST JSON: { commessa, collection_name, files?: [relative paths] }
+    Enqueues the build and returns its job id (poll /api/jobs/<id>/).
+    """
     if request.method != 'POST':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
 
@@ -256,39 +341,71 @@ def create_collection(request):
         if not collection_name:
             return JsonResponse({'error': 'Collection name is invalid'}, status=400)
 
-        import sys
-        import yaml
-        sys.path.append(os.path.join(settings.BASE_DIR, 'docslm'))
-        from services.store import ManageDB
-
-        config_path = os.path.join(settings.BASE_DIR, 'config.yaml')
-        if not os.path.exists(config_path):
-            return JsonResponse({'error': 'Configuration file not found'}, status=500)
+        from services.jobs import get_job_queue
 
+        config = get_config()
         selected_files = data.get('files', []) if isinstance(data, dict) else []
         full_paths = []
         if selected_files:
-            with open(config_path, "r", encoding="utf-8") as f:
-                config = yaml.safe_load(f)
             jobs_base = config.get('jobs', '')
             for rel_path in selected_files:
                 full_paths.append(os.path.join(jobs_base, commessa, rel_path))
 
-        db_manager = ManageDB(config_path)
-        db_manager.create_collection(commessa, collection_name, files=full_paths)
+        job = get_job_queue(config).submit_create_collection(config.source, commessa, collection_name, full_paths)
 
         return JsonResponse({
             'success': True,
-            'message': f'Collection {collection_name} created successfully',
+            'message': f'Collection {collection_name} queued',
+            'job_id': job['id'],
+            'status': job['status'],
             'commessa': commessa,
             'collection_name': collection_name,
             'selected_files': full_paths
-        })
+        }, status=202)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+def sync_collection(request):
+    """POST JSON: { commessa, collection_name, files?: [relative paths] }
+    Incrementally re-indexes a collection (only new/changed files are
+    converted, removed ones are deleted). Without files, the current
+    selection is re-checked. Returns a job id like create_collection.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        commessa = data.get('commessa', '').strip()
+        collection_name = data.get('collection_name', '').strip()
+        if not commessa or not collection_name:
+            return JsonResponse({'error': 'Commessa and collection name are required'}, status=400)
+
+        from services.jobs import get_job_queue
+
+        config = get_config()
+        selected_files = data.get('files') if isinstance(data, dict) else None
+        full_paths = None
+        if selected_files is not None:
+            jobs_base = config.get('jobs', '')
+            full_paths = [os.path.join(jobs_base, commessa, rel_path) for rel_path in selected_files]
+
+        job = get_job_queue(config).submit_sync_collection(config.source, commessa, collection_name, full_paths)
+
+        return JsonResponse({
+            'success': True,
+            'message': f'Sync of collection {collection_name} queued',
+            'job_id': job['id'],
+            'status': job['status'],
+            'commessa': commessa,
+            'collection_name': collection_name
+        }, status=202)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
-def list_collection_files(request):
+def _list_collection_files(request):
     """List files metadata stored on a collection (uses pymilvus custom properties)."""
     commessa = request.GET.get('commessa', '').strip()
     collection_name = request.GET.get('collection', '').strip()
@@ -296,27 +413,14 @@ def list_collection_files(request):
         return JsonResponse({'error': 'Commessa and collection name are required'}, status=400)
 
     try:
-        import yaml
-        from pymilvus import Collection, connections
-        config_path = os.path.join(settings.BASE_DIR, 'config.yaml')
-        if not os.path.exists(config_path):
-            return JsonResponse({'error': 'Configuration file not found'}, status=500)
-
-        with open(config_path, "r", encoding="utf-8") as f:
-            config = yaml.safe_load(f)
-        uri = config.get('uri')
+        from services.connections import get_milvus
+
+        uri = get_config().uri
         if not uri:
             return JsonResponse({'error': 'URI not configured'}, status=500)
 
-        host = uri.split("://")[1].split(":")[0]
-        port = int(uri.split(":")[-1])
-        connections.connect(host=host, port=port)
-
         db_name = f"comm_{commessa}"
-        from pymilvus import db
-        db.using_database(db_name)
-
-        collection_obj = Collection(collection_name)
+        collection_obj = get_milvus(uri).collection(db_name, collection_name)
         collection_info = collection_obj.describe()
         custom_properties = collection_info.get("properties", {})
 
@@ -333,4 +437,8 @@ def list_collection_files(request):
             'collection': collection_name
         })
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+async def list_collection_files(request):
+    return await run_blocking(_list_collection_files, request)
\ No newline at end of file
@@ -0,0 +1,64 @@
+from django.http import JsonResponse
+
+from services.config import get_config
+
+
+def _job_queue():
+    from services.jobs import get_job_queue
+    return get_job_queue(get_config())
+
+
+def _serialize(job_queue, job: dict, include_files: bool = True) -> dict:
+    out = {
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'commessa': job['payload']['commessa'],
+        'collection_name': job['payload']['collection'],
+        'total': job['total'],
+        'done': job['done'],
+        'chunks': job['chunks'],
+        'progress': round(job['done'] / job['total'], 4) if job['total'] else (1.0 if job['status'] == 'completed' else 0.0),
+        'eta_seconds': job_queue.eta(job),
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'error': job['error'],
+        'skipped': job.get('skipped'),
+        'plan': job.get('plan'),
+        'stats': job['stats'],
+    }
+    if include_files:
+        out['files'] = [{'path': path, 'status': state} for path, state in job['files'].items()]
+    return out
+
+
+def job_status(request, job_id):
+    """GET: status, per-file progress and ETA of a background job.
+    ?files=0 omits the per-file list.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    try:
+        job_queue = _job_queue()
+        job = job_queue.get(job_id)
+        if job is None:
+            return JsonResponse({'error': 'Job non trovato'}, status=404)
+        return JsonResponse(_serialize(job_queue, job, request.GET.get('files') != '0'))
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+def cancel_job(request, job_id):
+    """POST: request cancellation. Running builds stop after the current file
+    and keep their checkpoint, so re-submitting the same collection resumes."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    try:
+        job_queue = _job_queue()
+        job = job_queue.cancel(job_id)
+        if job is None:
+            return JsonResponse({'error': 'Job non trovato'}, status=404)
+        return JsonResponse({'success': True, 'job_id': job_id, 'status': job['status'], 'cancel_requested': True})
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
@@ -0,0 +1,232 @@
+import os
+import time
+import fnmatch
+import threading
+from collections import OrderedDict
+
+from services.config import get_config
+from services.tracing import register_stats
+
+SORT_KEYS = {
+    'name': lambda e: e['name'].casefold(),
+    'mtime': lambda e: e['mtime'] or 0,
+    'size': lambda e: e['size'] or 0,
+}
+
+
+def scan_directory(path: str) -> list:
+    """Entries of ``path`` via os.scandir: on Windows/SMB the type, size and
+    mtime come with the directory read itself, on POSIX is_dir() uses
+    d_type, so there is at most one stat per entry."""
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir()
+                st = entry.stat()
+                # also from the directory read: no extra round trip
+                is_link = entry.is_symlink() or entry.is_junction()
+            except OSError:
+                continue
+            entries.append({
+                'name': entry.name,
+                'is_dir': is_dir,
+                'is_link': is_link,
+                'size': st.st_size,
+                'mtime': st.st_mtime,
+            })
+    entries.sort(key=lambda e: e['name'].casefold())
+    return entries
+
+
+def filter_entries(entries: list, query: str = '', sort: str = 'name', descending: bool = False) -> list:
+    """Folders first, then files, each sorted by ``sort``; ``query`` is a
+    case-insensitive substring, or a glob if it contains * ? or [."""
+    query = (query or '').casefold()
+    if query:
+        if any(c in query for c in '*?['):
+            entries = [e for e in entries if fnmatch.fnmatchcase(e['name'].casefold(), query)]
+        else:
+            entries = [e for e in entries if query in e['name'].casefold()]
+    key = SORT_KEYS.get(sort, SORT_KEYS['name'])
+    dirs = sorted((e for e in entries if e['is_dir']), key=key, reverse=descending)
+    files = sorted((e for e in entries if not e['is_dir']), key=key, reverse=descending)
+    return dirs + files
+
+
+def paginate(items: list, page: int = 1, page_size: int | None = None):
+    """(page items, page, page_size); no page_size means everything."""
+    if not page_size:
+        return items, 1, len(items)
+    page = max(page, 1)
+    start = (page - 1) * page_size
+    return items[start:start + page_size], page, page_size
+
+
+class DirectoryCache:
+    """Per-directory listings validated by the directory's mtime.
+
+    Adding, removing or renaming an entry changes the directory mtime, so a
+    cached listing is reused after a single stat of the directory. Changes
+    to an existing file's size or mtime do not touch the directory, so
+    listings are also rescanned once they are older than ``max_age``.
+    """
+
+    def __init__(self, max_dirs: int = 10000, max_age: float = 60):
+        self.max_dirs = max_dirs
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._dirs = OrderedDict()  # abspath -> (mtime_ns, scanned_at, entries)
+        self.hits = 0
+        self.misses = 0
+
+    def entries(self, path: str) -> list:
+        path = os.path.abspath(path)
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._dirs.get(path)
+            if cached and cached[0] == mtime and time.monotonic() - cached[1] < self.max_age:
+                self._dirs.move_to_end(path)
+                self.hits += 1
+                return cached[2]
+            self.misses += 1
+        entries = scan_directory(path)
+        with self._lock:
+            self._dirs[path] = (mtime, time.monotonic(), entries)
+            self._dirs.move_to_end(path)
+            while len(self._dirs) > self.max_dirs:
+                self._dirs.popitem(last=False)
+        return entries
+
+    def forget(self, path: str):
+        with self._lock:
+            self._dirs.pop(os.path.abspath(path), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'directories': len(self._dirs),
+                'max_dirs': self.max_dirs,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class TreeCrawler:
+    """Background walker keeping the full tree of each tracked commessa in
+    the directory cache.
+
+    Commesse are tracked when they are first browsed. Every ``interval``
+    seconds each tracked tree is walked through ``cache``, so unchanged
+    directories cost one stat and browsing any folder is served from
+    memory. Symlinked and junction folders are not descended into.
+    ``listeners`` are called as ``fn(commessa, root, rel_dir,
+    entries)`` for every directory visited, and ``fn(commessa, root,
+    None, dirs)`` with the set of all directories once a walk completes.
+    """
+
+    def __init__(self, cache: DirectoryCache, interval: float = 300):
+        self.cache = cache
+        self.interval = interval
+        self.listeners = []
+        self._tracked = {}  # commessa -> root
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.walks = 0
+        self.last_walk_seconds = {}
+
+    def track(self, commessa: str, root: str):
+        with self._lock:
+            is_new = commessa not in self._tracked
+            self._tracked[commessa] = root
+        if is_new:
+            self._wakeup.set()
+        self.start()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='docslm-crawler', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                tracked = list(self._tracked.items())
+            for commessa, root in tracked:
+                try:
+                    self.walk(commessa, root)
+                except Exception as exc:
+                    print(f"Crawl of {commessa} failed: {exc}")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def walk(self, commessa: str, root: str) -> set:
+        started = time.perf_counter()
+        seen = set()
+        stack = ['']
+        while stack:
+            rel = stack.pop()
+            try:
+                entries = self.cache.entries(os.path.join(root, rel) if rel else root)
+            except OSError:
+                continue
+            seen.add(rel)
+            for listener in self.listeners:
+                listener(commessa, root, rel, entries)
+            for entry in entries:
+                # linked folders are listed but not followed: a link back up
+                # the tree would make the walk endless
+                if entry['is_dir'] and not entry.get('is_link'):
+                    stack.append(f"{rel}/{entry['name']}" if rel else entry['name'])
+        for listener in self.listeners:
+            listener(commessa, root, None, seen)
+        with self._lock:
+            self.walks += 1
+            self.last_walk_seconds[commessa] = round(time.perf_counter() - started, 3)
+        return seen
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'tracked': sorted(self._tracked),
+                'walks': self.walks,
+                'last_walk_seconds': dict(self.last_walk_seconds),
+            }
+
+
+_DIRECTORY_CACHE = None
+_CRAWLER = None
+_LISTING_LOCK = threading.Lock()
+
+
+def get_directory_cache() -> DirectoryCache:
+    global _DIRECTORY_CACHE
+    if _DIRECTORY_CACHE is None:
+        with _LISTING_LOCK:
+            if _DIRECTORY_CACHE is None:
+                config = get_config()
+                _DIRECTORY_CACHE = DirectoryCache(
+                    max_dirs=config.get('listing_cache_dirs', 10000),
+                    max_age=config.get('listing_cache_max_age', 60),
+                )
+                register_stats('directory_cache', _DIRECTORY_CACHE.stats)
+    return _DIRECTORY_CACHE
+
+
+def get_tree_crawler():
+    """Shared crawler, or None unless ``listing_crawler`` is enabled."""
+    global _CRAWLER
+    config = get_config()
+    if not config.get('listing_crawler', False):
+        return None
+    if _CRAWLER is None:
+        cache = get_directory_cache()
+        with _LISTING_LOCK:
+            if _CRAWLER is None:
+                _CRAWLER = TreeCrawler(cache, interval=config.get('listing_crawl_interval', 300))
+                register_stats('tree_crawler', _CRAWLER.stats)
+    return _CRAWLER
@@ -0,0 +1,12 @@
+from django.http import HttpResponse, JsonResponse
+
+from services.tracing import render_prometheus
+
+
+def metrics(request):
+    """GET: Prometheus text exposition of request latencies per endpoint,
+    per-stage timings, in-flight requests and the stats() of every cache
+    and pool created in this process."""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
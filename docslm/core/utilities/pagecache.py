@@ -0,0 +1,199 @@
+import os
+import io
+import hashlib
+import threading
+from collections import OrderedDict
+
+from services.tracing import register_stats
+
+
+def _pdf_classes():
+    try:
+        from PyPDF2 import PdfReader, PdfWriter  # type: ignore
+    except Exception:
+        from pypdf import PdfReader, PdfWriter  # type: ignore
+    return PdfReader, PdfWriter
+
+
+class PageSliceCache:
+    """Disk-backed LRU of extracted PDF page ranges.
+
+    Slices are stored as ``<sha1>.pdf`` under ``directory``; the key covers
+    the source path, its mtime/size and the page range, so an edited PDF
+    never serves a stale slice. Recency is tracked in memory (seeded from
+    file mtimes on first use) and the oldest slices are removed once the
+    total exceeds ``max_bytes``.
+
+    Parsed readers are kept in a small in-process LRU keyed by
+    (path, mtime), so several citations into the same document only parse
+    it once. A reader holds the whole file in memory, so the LRU is bounded
+    by ``max_reader_bytes`` of source files as well as by count; larger
+    documents are parsed for each slice and not kept.
+    """
+
+    def __init__(self, directory, max_bytes: int, max_readers: int = 8,
+                 max_reader_bytes: int = 128 * 1024 * 1024):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.max_readers = max_readers
+        self.max_reader_bytes = max_reader_bytes
+        self._lock = threading.Lock()
+        self._entries = None  # OrderedDict name -> size, oldest first
+        self._total = 0
+        self._readers = OrderedDict()  # (path, mtime_ns) -> (reader, lock, file size)
+        self._reader_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(path: str, st, ps: int, pe: int) -> str:
+        raw = f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}|{ps}|{pe}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest() + '.pdf'
+
+    def _load_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.pdf') and entry.is_file():
+                    st = entry.stat()
+                    found.append((st.st_mtime, entry.name, st.st_size))
+        found.sort()
+        self._entries = OrderedDict((name, size) for _, name, size in found)
+        self._total = sum(size for _, _, size in found)
+
+    def get(self, path: str, st, ps: int, pe: int):
+        """Return the cached slice file path, or None."""
+        name = self.key(path, st, ps, pe)
+        full = os.path.join(self.directory, name)
+        with self._lock:
+            if self._entries is None:
+                self._load_index()
+            if name not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(name)
+            self.hits += 1
+        try:
+            os.utime(full)
+        except FileNotFoundError:
+            # evicted by another worker sharing the directory
+            with self._lock:
+                self._total -= self._entries.pop(name, 0)
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return full
+
+    def put(self, path: str, st, ps: int, pe: int, data: bytes) -> str:
+        name = self.key(path, st, ps, pe)
+        full = os.path.join(self.directory, name)
+        with self._lock:
+            if self._entries is None:
+                self._load_index()
+        tmp = f"{full}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp, full)
+        with self._lock:
+            self._total -= self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self._total += len(data)
+            self._evict()
+        return full
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def _reader(self, path: str, st):
+        """(reader, lock) for ``path``, from the reader LRU when it fits."""
+        PdfReader, _ = _pdf_classes()
+        key = (os.path.abspath(path), st.st_mtime_ns)
+        with self._lock:
+            cached = self._readers.get(key)
+            if cached is not None:
+                self._readers.move_to_end(key)
+                return cached[:2]
+        entry = (PdfReader(path), threading.Lock(), st.st_size)
+        if st.st_size > self.max_reader_bytes:
+            return entry[:2]
+        with self._lock:
+            if key in self._readers:
+                entry = self._readers[key]
+            else:
+                self._readers[key] = entry
+                self._reader_bytes += entry[2]
+            self._readers.move_to_end(key)
+            while len(self._readers) > 1 and (len(self._readers) > self.max_readers
+                                              or self._reader_bytes > self.max_reader_bytes):
+                self._reader_bytes -= self._readers.popitem(last=False)[1][2]
+        return entry[:2]
+
+    def page_count(self, path: str, st) -> int:
+        reader, reader_lock = self._reader(path, st)
+        with reader_lock:
+            return len(reader.pages)
+
+    def extract(self, path: str, st, ps: int, pe: int):
+        """Return (pdf_bytes, ps, pe) for pages ps..pe, clamped to the document."""
+        _, PdfWriter = _pdf_classes()
+        reader, reader_lock = self._reader(path, st)
+        # PdfReader shares one file stream, so page access is serialized
+        with reader_lock:
+            num_pages = len(reader.pages)
+            ps = min(ps, num_pages)
+            pe = min(pe, num_pages)
+            writer = PdfWriter()
+            for p in range(ps - 1, pe):
+                try:
+                    writer.add_page(reader.pages[p])
+                except Exception:
+                    pass
+            out = io.BytesIO()
+            writer.write(out)
+        return out.getvalue(), ps, pe
+
+    def slice_path(self, path: str, st, ps: int, pe: int) -> str:
+        """Cached slice file for pages ps..pe of ``path``, extracting on a miss."""
+        cached = self.get(path, st, ps, pe)
+        if cached:
+            return cached
+        data, _, _ = self.extract(path, st, ps, pe)
+        return self.put(path, st, ps, pe, data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries or ()),
+                'bytes': self._total,
+                'max_bytes': self.max_bytes,
+                'readers': len(self._readers),
+                'reader_bytes': self._reader_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+_PAGE_CACHE = None
+_PAGE_CACHE_LOCK = threading.Lock()
+
+
+def get_page_cache() -> PageSliceCache:
+    global _PAGE_CACHE
+    if _PAGE_CACHE is None:
+        from django.conf import settings
+        with _PAGE_CACHE_LOCK:
+            if _PAGE_CACHE is None:
+                _PAGE_CACHE = PageSliceCache(
+                    os.path.join(settings.DOCSLM_CACHE_DIR, 'pages'),
+                    settings.PAGE_CACHE_MAX_BYTES,
+                    max_reader_bytes=settings.PAGE_CACHE_READER_BYTES,
+                )
+                register_stats('page_cache', _PAGE_CACHE.stats)
+    return _PAGE_CACHE
@@ -0,0 +1,173 @@
+import os
+import time
+import mimetypes
+import threading
+from collections import OrderedDict
+
+from services.tracing import register_stats
+from .aio import blocking_executor
+from .pagecache import get_page_cache
+
+
+def is_pdf(path: str, mime: str | None = None) -> bool:
+    return mime == 'application/pdf' or path.lower().endswith('.pdf')
+
+
+class PreviewCache:
+    """Short-lived in-memory LRU of preview bodies, bounded by total bytes.
+
+    Entries are keyed by (path, mtime_ns, size, page range), so a changed
+    file is never served stale. Entries filled by ``prefetch`` count as
+    *warm*, entries filled on demand by the preview endpoint as *cold*;
+    hits are counted separately for each.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float = 300, max_file_bytes: int | None = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_file_bytes = max_file_bytes or max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (data, content_type, warm, expires)
+        self._pending = set()
+        self._total = 0
+        self.warm_hits = 0
+        self.cold_hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(path: str, st, pages=None) -> tuple:
+        return (os.path.abspath(path), st.st_mtime_ns, st.st_size, tuple(pages) if pages else None)
+
+    def get(self, path: str, st, pages=None):
+        """(data, content_type) for the entry, or None."""
+        key = self.key(path, st, pages)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[3] < time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if entry[2]:
+                self.warm_hits += 1
+            else:
+                self.cold_hits += 1
+            return entry[0], entry[1]
+
+    def put(self, path: str, st, pages, data: bytes, content_type: str, warm: bool = False):
+        if len(data) > self.max_file_bytes or len(data) > self.max_bytes:
+            return
+        key = self.key(path, st, pages)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (data, content_type, warm, time.monotonic() + self.ttl)
+            self._total += len(data)
+            while self._total > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        data = self._entries.pop(key)[0]
+        self._total -= len(data)
+
+    def load(self, path: str, st, pages=None):
+        """Read the preview body from disk: (data, content_type), or None if
+        the file is too large to keep in memory."""
+        mime, _ = mimetypes.guess_type(path)
+        if is_pdf(path, mime):
+            mime = 'application/pdf'
+            if pages:
+                with open(get_page_cache().slice_path(path, st, *pages), 'rb') as fh:
+                    return fh.read(), mime
+        if st.st_size > self.max_file_bytes:
+            return None
+        with open(path, 'rb') as fh:
+            return fh.read(), mime or 'application/octet-stream'
+
+    def _warm(self, path: str, pages, warm: bool = True):
+        try:
+            st = os.stat(path)
+            key = self.key(path, st, pages)
+            with self._lock:
+                if key in self._entries:
+                    return
+            loaded = self.load(path, st, pages)
+            if loaded is not None:
+                self.put(path, st, pages, *loaded, warm=warm)
+                if warm:
+                    with self._lock:
+                        self.prefetched += 1
+        except Exception as exc:
+            print(f"Preview prefetch failed for {path}: {exc}")
+        finally:
+            with self._lock:
+                self._pending.discard((path, pages))
+
+    def prefetch(self, context_buttons: list, limit: int | None = None):
+        """Warm the cache for the sources cited in ``context_buttons``
+        (top ``limit``) in the background; returns immediately."""
+        for button in context_buttons[:limit]:
+            meta = button.get('metadata') or {}
+            path = meta.get('path') or meta.get('source')
+            if not path or path == 'N/A':
+                continue
+            try:
+                ps, pe = int(button.get('page_start')), int(button.get('page_end'))
+                pages = (max(ps, 1), max(pe, ps, 1))
+            except (TypeError, ValueError):
+                pages = None
+            if not is_pdf(path):
+                # page ranges only select content for PDFs
+                pages = None
+            self._schedule(path, pages, warm=True)
+
+    def fill(self, path: str, pages=None):
+        """Load an entry in the background after a cold request was served
+        from disk; returns immediately."""
+        self._schedule(path, pages, warm=False)
+
+    def _schedule(self, path: str, pages, warm: bool):
+        with self._lock:
+            if (path, pages) in self._pending:
+                return
+            self._pending.add((path, pages))
+        blocking_executor().submit(self._warm, path, pages, warm)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.warm_hits + self.cold_hits
+            lookups = hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total,
+                'max_bytes': self.max_bytes,
+                'warm_hits': self.warm_hits,
+                'cold_hits': self.cold_hits,
+                'misses': self.misses,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+                'prefetched': self.prefetched,
+                'evictions': self.evictions,
+            }
+
+
+_PREVIEW_CACHE = None
+_PREVIEW_CACHE_LOCK = threading.Lock()
+
+
+def get_preview_cache() -> PreviewCache:
+    global _PREVIEW_CACHE
+    if _PREVIEW_CACHE is None:
+        from django.conf import settings
+        with _PREVIEW_CACHE_LOCK:
+            if _PREVIEW_CACHE is None:
+                _PREVIEW_CACHE = PreviewCache(
+                    settings.PREVIEW_CACHE_MAX_BYTES,
+                    ttl=settings.PREVIEW_CACHE_TTL,
+                    max_file_bytes=settings.PREVIEW_PREFETCH_MAX_FILE_BYTES,
+                )
+                register_stats('preview_cache', _PREVIEW_CACHE.stats)
+    return _PREVIEW_CACHE
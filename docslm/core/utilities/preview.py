@@ -0,0 +1,224 @@
+import os
+import io
+import re
+import mimetypes
+from urllib.parse import urlencode
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.http import http_date, parse_http_date_safe
+
+from .pagecache import get_page_cache
+from .prefetch import get_preview_cache
+
+STREAM_CHUNK_BYTES = 256 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def preview_url(path: str, page_start=None, page_end=None) -> str:
+    """URL of the streaming preview endpoint for ``path`` (optionally a PDF page range)."""
+    params = {'path': path}
+    if page_start is not None and page_end is not None:
+        params['page_start'] = page_start
+        params['page_end'] = page_end
+    return reverse('core:preview_file') + '?' + urlencode(params)
+
+
+def file_etag(st, suffix: str = '') -> str:
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}{suffix}"'
+
+
+def parse_page_range(page_start, page_end):
+    """Normalize a requested 1-based page range; None if not requested."""
+    if page_start is None or page_end is None:
+        return None
+    ps = max(int(page_start), 1)
+    pe = max(int(page_end), ps)
+    return ps, pe
+
+
+def _not_modified(request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(',')]
+        return '*' in tags or etag in tags or f'W/{etag}' in tags
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and int(mtime) <= if_modified_since
+
+
+def _byte_range(request, etag: str, mtime: float, size: int):
+    """Parse a single ``Range: bytes=`` header.
+
+    Returns None to serve the whole body, (start, end) inclusive for a
+    satisfiable range, or False if the range cannot be satisfied.
+    """
+    header = request.headers.get('Range')
+    if not header or size == 0:
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range:
+        if if_range.startswith('"') or if_range.startswith('W/'):
+            if if_range != etag:
+                return None
+        elif parse_http_date_safe(if_range) != int(mtime):
+            return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        # multi-range and other units: fall back to the whole body
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start = max(size - int(last), 0)
+        end = size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _iter_range(fh, start: int, length: int):
+    try:
+        fh.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fh.read(min(STREAM_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        fh.close()
+
+
+def _tee(chunks, size: int, on_body):
+    """Pass ``chunks`` through, then hand the whole body to ``on_body``
+    if it was streamed to the end."""
+    seen = []
+    received = 0
+    for chunk in chunks:
+        seen.append(chunk)
+        received += len(chunk)
+        yield chunk
+    if received == size:
+        on_body(b''.join(seen))
+
+
+def ranged_response(request, fh, size: int, content_type: str, etag: str, mtime: float,
+                    filename: str | None = None, on_body=None):
+    """Stream ``fh`` honouring conditional GETs and single byte ranges.
+
+    ``fh`` is any seekable binary file object; it is closed once the body
+    has been consumed (or immediately for bodiless responses). When the
+    whole body is sent, ``on_body(data)`` receives it afterwards (to fill
+    a cache without reading the file twice).
+    """
+    if _not_modified(request, etag, mtime):
+        fh.close()
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(mtime)
+        return response
+
+    byte_range = _byte_range(request, etag, mtime, size)
+    if byte_range is False:
+        fh.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    start, end = byte_range if byte_range else (0, size - 1)
+    length = max(end - start + 1, 0)
+    body = _iter_range(fh, start, length)
+    if on_body is not None and not byte_range:
+        body = _tee(body, length, on_body)
+    response = StreamingHttpResponse(body, content_type=content_type)
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(mtime)
+    response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    if filename:
+        response['Content-Disposition'] = f'inline; filename="{filename}"'
+    return response
+
+
+def _filler(cache, path: str, st, pages, mime: str):
+    def fill(data: bytes):
+        cache.put(path, st, pages, data, mime)
+    return fill
+
+
+def preview_file(request):
+    """GET params: path (required), page_start/page_end (optional, PDF only).
+    Streams the file bytes with Range and ETag/Last-Modified support.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return JsonResponse({'error': 'Metodo non consentito'}, status=405)
+
+    path = request.GET.get('path', '').strip()
+    if not path:
+        return JsonResponse({'error': 'Path mancante'}, status=400)
+    if not os.path.isfile(path):
+        return JsonResponse({'error': 'File non trovato', 'path': path}, status=404)
+
+    try:
+        st = os.stat(path)
+        mime, _ = mimetypes.guess_type(path)
+        filename = os.path.basename(path).replace('"', '')
+
+        pages = None
+        if mime == 'application/pdf' or path.lower().endswith('.pdf'):
+            mime = 'application/pdf'
+            pages = parse_page_range(request.GET.get('page_start'), request.GET.get('page_end'))
+
+        cache = get_preview_cache()
+        # cold requests stream from disk; the memory cache is filled from
+        # the streamed body, or in the background for Range requests
+        ranged = bool(request.headers.get('Range'))
+        if pages:
+            etag = file_etag(st, f'-p{pages[0]}-{pages[1]}')
+            if _not_modified(request, etag, st.st_mtime):
+                return ranged_response(request, io.BytesIO(), 0, mime, etag, st.st_mtime)
+            cached = cache.get(path, st, pages)
+            if cached:
+                return ranged_response(request, io.BytesIO(cached[0]), len(cached[0]), mime,
+                                       etag, st.st_mtime, filename)
+            try:
+                sliced = get_page_cache().slice_path(path, st, *pages)
+            except ImportError:
+                # no PDF library available: serve the whole document
+                sliced = None
+            if sliced:
+                fh = open(sliced, 'rb')
+                size = os.fstat(fh.fileno()).st_size
+                if ranged:
+                    cache.fill(path, pages)
+                return ranged_response(request, fh, size, mime, etag, st.st_mtime, filename,
+                                       on_body=_filler(cache, path, st, pages, mime))
+
+        etag = file_etag(st)
+        mime = mime or 'application/octet-stream'
+        on_body = None
+        if not _not_modified(request, etag, st.st_mtime):
+            cached = cache.get(path, st)
+            if cached is not None:
+                return ranged_response(request, io.BytesIO(cached[0]), len(cached[0]), mime,
+                                       etag, st.st_mtime, filename)
+            if st.st_size <= cache.max_file_bytes:
+                if ranged:
+                    cache.fill(path)
+                else:
+                    on_body = _filler(cache, path, st, None, mime)
+        return ranged_response(request, open(path, 'rb'), st.st_size, mime, etag, st.st_mtime, filename,
+                               on_body=on_body)
+    except ValueError:
+        return JsonResponse({'error': 'Intervallo di pagine non valido'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
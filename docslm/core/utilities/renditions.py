@@ -0,0 +1,333 @@
+import os
+import io
+import hashlib
+import mimetypes
+import threading
+from collections import OrderedDict
+from urllib.parse import urlencode
+from django.http import JsonResponse
+from django.urls import reverse
+
+from services.tracing import register_stats, span
+from .aio import run_blocking
+from .pagecache import _pdf_classes
+from .preview import _not_modified, file_etag, ranged_response
+from .prefetch import is_pdf
+
+# longest side, in pixels, of each size class
+SIZE_CLASSES = {'thumb': 256, 'small': 512, 'medium': 1024, 'large': 2048}
+FORMATS = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+# image types Pillow decodes (and the browser may not, e.g. TIFF scans)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tif', '.tiff', '.webp')
+
+# PDFium is not thread-safe: every pypdfium2 call (open, render, close) in
+# this process goes through this lock
+_PDFIUM_LOCK = threading.Lock()
+
+
+def renderable(path: str) -> bool:
+    return is_pdf(path) or path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def rendition_url(path: str, size: str = 'thumb', page: int | None = None) -> str:
+    """URL of the rendition endpoint for ``path`` in size class ``size``."""
+    params = {'path': path, 'size': size}
+    if page is not None:
+        params['page'] = page
+    return reverse('core:rendition') + '?' + urlencode(params)
+
+
+def _image_module():
+    from PIL import Image
+    return Image
+
+
+def _open_pdf_page(path: str, page: int, target: int):
+    """First (or ``page``-th) page of a PDF as a PIL image about ``target`` px on its longest side.
+
+    Rendered with pdfium when installed; otherwise the largest image
+    embedded in the page is used, which for scanned drawings is the scan.
+    """
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        pdfium = None
+    if pdfium is not None:
+        with _PDFIUM_LOCK:
+            document = pdfium.PdfDocument(path)
+            try:
+                pdf_page = document[min(page, len(document)) - 1]
+                width, height = pdf_page.get_size()
+                scale = max(target / max(width, height, 1), 0.05)
+                bitmap = pdf_page.render(scale=scale)
+                # copy out of PDFium's buffer before the document is closed
+                image = bitmap.to_pil().copy()
+                pdf_page.close()
+                bitmap.close()
+                return image
+            finally:
+                document.close()
+    PdfReader, _ = _pdf_classes()
+    reader = PdfReader(path)
+    pdf_page = reader.pages[min(page, len(reader.pages)) - 1]
+    images = list(pdf_page.images)
+    if not images:
+        raise ValueError('Pagina senza immagini: anteprima non disponibile senza pypdfium2')
+    largest = max(images, key=lambda image: len(image.data))
+    return _image_module().open(io.BytesIO(largest.data))
+
+
+def render(path: str, size: str, fmt: str, page: int = 1, quality: int = 80) -> bytes:
+    """Encode a rendition of ``path`` no larger than the ``size`` class."""
+    Image = _image_module()
+    target = SIZE_CLASSES[size]
+    if is_pdf(path):
+        image = _open_pdf_page(path, page, target)
+    else:
+        image = Image.open(path)
+        # JPEG scans are decoded directly at a reduced scale
+        image.draft(image.mode, (target, target))
+    # bilevel and palette scans would only be resized with nearest-neighbour
+    if image.mode == 'P':
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('L' if image.mode in ('1', 'I', 'I;16', 'F') else 'RGB')
+    image.thumbnail((target, target), Image.LANCZOS, reducing_gap=3.0)
+    if image.mode in ('RGBA', 'LA'):
+        image = image.convert('RGBA')
+        if fmt == 'jpeg':
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.split()[-1])
+            image = background
+    elif fmt == 'webp' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    out = io.BytesIO()
+    if fmt == 'webp':
+        image.save(out, 'WEBP', quality=quality, method=4)
+    else:
+        image.save(out, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+class RenditionCache:
+    """Disk-backed LRU of downscaled previews.
+
+    Renditions are stored as ``<sha1>.<format>`` under ``directory``; the
+    key covers the source path, its mtime/size, the size class, the page
+    and the format, so an edited file never serves a stale thumbnail.
+    Recency is tracked in memory (seeded from file mtimes on first use)
+    and the oldest renditions are removed once the total exceeds
+    ``max_bytes``. Concurrent requests for the same rendition render it
+    once, and at most ``workers`` renders are admitted at the same time
+    (PDF pages are still rasterised one at a time, PDFium is not
+    thread-safe).
+    """
+
+    def __init__(self, directory, max_bytes: int, workers: int = 2, quality: int = 80):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self._lock = threading.Lock()
+        self._renders = threading.BoundedSemaphore(max(workers, 1))
+        self._inflight = {}  # name -> lock held while rendering
+        self._entries = None  # OrderedDict name -> size, oldest first
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        self.rendered = 0
+        self.failures = 0
+
+    @staticmethod
+    def key(path: str, st, size: str, page: int, fmt: str) -> str:
+        raw = f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}|{size}|{page}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest() + '.' + fmt
+
+    def _load_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(tuple(f'.{fmt}' for fmt in FORMATS)) and entry.is_file():
+                    st = entry.stat()
+                    found.append((st.st_mtime, entry.name, st.st_size))
+        found.sort()
+        self._entries = OrderedDict((name, size) for _, name, size in found)
+        self._total = sum(size for _, _, size in found)
+
+    def _lookup(self, name: str):
+        full = os.path.join(self.directory, name)
+        with self._lock:
+            if self._entries is None:
+                self._load_index()
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+        try:
+            os.utime(full)
+        except FileNotFoundError:
+            # evicted by another worker sharing the directory
+            with self._lock:
+                self._total -= self._entries.pop(name, 0)
+            return None
+        return full
+
+    def get(self, path: str, st, size: str, page: int, fmt: str) -> str:
+        """Cached rendition file for ``path``, rendering it on a miss."""
+        name = self.key(path, st, size, page, fmt)
+        full = self._lookup(name)
+        if full:
+            with self._lock:
+                self.hits += 1
+            return full
+        with self._lock:
+            self.misses += 1
+            inflight = self._inflight.setdefault(name, threading.Lock())
+        with inflight:
+            # rendered by a concurrent request while we waited
+            full = self._lookup(name)
+            if full:
+                return full
+            try:
+                with self._renders, span('rendition.render'):
+                    data = render(path, size, fmt, page, self.quality)
+                return self._put(name, data)
+            except Exception:
+                with self._lock:
+                    self.failures += 1
+                raise
+            finally:
+                with self._lock:
+                    self._inflight.pop(name, None)
+
+    def _put(self, name: str, data: bytes) -> str:
+        full = os.path.join(self.directory, name)
+        tmp = f"{full}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp, full)
+        with self._lock:
+            self.rendered += 1
+            self._total -= self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self._total += len(data)
+            self._evict()
+        return full
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries or ()),
+                'bytes': self._total,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'rendered': self.rendered,
+                'failures': self.failures,
+                'rendering': len(self._inflight),
+            }
+
+
+_RENDITION_CACHE = None
+_RENDITION_CACHE_LOCK = threading.Lock()
+_AVAILABLE = None
+
+
+def renditions_available() -> bool:
+    """True if Pillow is installed (thumbnail URLs are offered only then)."""
+    global _AVAILABLE
+    if _AVAILABLE is None:
+        try:
+            _image_module()
+            _AVAILABLE = True
+        except ImportError:
+            _AVAILABLE = False
+    return _AVAILABLE
+
+
+def get_rendition_cache() -> RenditionCache:
+    global _RENDITION_CACHE
+    if _RENDITION_CACHE is None:
+        from django.conf import settings
+        with _RENDITION_CACHE_LOCK:
+            if _RENDITION_CACHE is None:
+                Image = _image_module()
+                # scanned A0 drawings exceed Pillow's decompression-bomb guard
+                Image.MAX_IMAGE_PIXELS = settings.RENDITION_MAX_PIXELS
+                _RENDITION_CACHE = RenditionCache(
+                    os.path.join(settings.DOCSLM_CACHE_DIR, 'renditions'),
+                    settings.RENDITION_CACHE_MAX_BYTES,
+                    settings.RENDITION_WORKERS,
+                    settings.RENDITION_QUALITY,
+                )
+                register_stats('rendition_cache', _RENDITION_CACHE.stats)
+    return _RENDITION_CACHE
+
+
+def _negotiate(request) -> str:
+    requested = request.GET.get('format', '').strip().lower()
+    if requested in FORMATS:
+        return requested
+    if 'image/webp' in request.headers.get('Accept', ''):
+        return 'webp'
+    return 'jpeg'
+
+
+def _rendition(request):
+    """GET params: path (required), size (thumb|small|medium|large, default
+    thumb), page (PDF only, default 1), format (webp|jpeg; by default WebP
+    when the browser accepts it). Serves a bounded-size image of the file,
+    rendered once and then cached on disk.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return JsonResponse({'error': 'Metodo non consentito'}, status=405)
+
+    path = request.GET.get('path', '').strip()
+    if not path:
+        return JsonResponse({'error': 'Path mancante'}, status=400)
+    size = request.GET.get('size', 'thumb').strip() or 'thumb'
+    if size not in SIZE_CLASSES:
+        return JsonResponse({'error': 'Dimensione non valida', 'sizes': list(SIZE_CLASSES)}, status=400)
+    try:
+        page = max(int(request.GET.get('page') or 1), 1)
+    except ValueError:
+        return JsonResponse({'error': 'Pagina non valida'}, status=400)
+    if not os.path.isfile(path):
+        return JsonResponse({'error': 'File non trovato', 'path': path}, status=404)
+    if not renderable(path):
+        mime, _ = mimetypes.guess_type(path)
+        return JsonResponse({'error': 'Anteprima non disponibile per questo tipo di file',
+                             'mimetype': mime}, status=415)
+    if not renditions_available():
+        return JsonResponse({'error': 'Anteprime non disponibili (Pillow non installato)'}, status=501)
+
+    fmt = _negotiate(request)
+    if not is_pdf(path):
+        page = 1
+    try:
+        st = os.stat(path)
+        etag = file_etag(st, f'-{size}-p{page}-{fmt}')
+        content_type = FORMATS[fmt]
+        if _not_modified(request, etag, st.st_mtime):
+            response = ranged_response(request, io.BytesIO(), 0, content_type, etag, st.st_mtime)
+        else:
+            rendered = get_rendition_cache().get(path, st, size, page, fmt)
+            response = ranged_response(request, open(rendered, 'rb'), os.path.getsize(rendered),
+                                       content_type, etag, st.st_mtime)
+        # the body depends on the negotiated format
+        response['Vary'] = 'Accept'
+        return response
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+async def rendition(request):
+    return await run_blocking(_rendition, request)
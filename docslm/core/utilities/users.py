@@ -0,0 +1,49 @@
+import os
+import csv
+import threading
+
+
+class UserDirectory:
+    """In-process index of ``users.csv`` by (lower-cased) username.
+
+    The file is parsed once and re-read only when its mtime or size
+    changes, so a login costs one ``os.stat`` and a dict lookup.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signature = None
+        self._users = {}
+
+    def __len__(self):
+        return len(self._users)
+
+    def refresh(self, csv_path: str) -> bool:
+        """Reload the directory if the CSV changed. Returns True on reload.
+        Raises FileNotFoundError if the file does not exist."""
+        st = os.stat(csv_path)
+        signature = (os.path.abspath(csv_path), st.st_mtime_ns, st.st_size)
+        if signature == self._signature:
+            return False
+        with self._lock:
+            if signature == self._signature:
+                return False
+            users = {}
+            with open(csv_path, mode='r', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    username = (row.get('username') or '').strip().lower()
+                    if username:
+                        # first row wins, as with the old linear scan
+                        users.setdefault(username, row)
+            # swap in one assignment so concurrent logins never see a partial directory
+            self._users = users
+            self._signature = signature
+        return True
+
+    def get(self, csv_path: str, username: str):
+        """Row of ``username`` (display_name, role, ...) or None."""
+        self.refresh(csv_path)
+        return self._users.get(username.strip().lower())
+
+
+USER_DIRECTORY = UserDirectory()
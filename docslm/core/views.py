@@ -1,12 +1,18 @@
 from .utilities.auth import index, user_login, get_greeting
-from .utilities.agents import send_message, initialize_agent, AGENT_INSTANCES
+from .utilities.agents import send_message, stream_message, initialize_agent, get_agent_registry
 from .utilities.files import (
     check_path,
     list_job_files,
+    search_job_files,
     list_collection_files,
     list_collections,
     create_collection,
+    sync_collection,
 )
+from .utilities.jobs import job_status, cancel_job
+from .utilities.metrics import metrics
+from .utilities.preview import preview_file
+from .utilities.renditions import rendition
 from .utilities.search import search_commesse
 
 __all__ = [
@@ -14,12 +20,20 @@ __all__ = [
     "get_greeting",
     "user_login",
     "send_message",
+    "stream_message",
     "initialize_agent",
-    "AGENT_INSTANCES",
+    "get_agent_registry",
     "check_path",
     "list_job_files",
+    "search_job_files",
     "list_collection_files",
     "list_collections",
     "create_collection",
+    "sync_collection",
+    "job_status",
+    "cancel_job",
+    "metrics",
+    "preview_file",
+    "rendition",
     "search_commesse",
 ]
\ No newline at end of file
@@ -0,0 +1,13 @@
+"""
+ASGI config for docslm project.
+
+Run with an ASGI server, e.g. ``uvicorn docslm.asgi:application``.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'docslm.settings')
+
+application = get_asgi_application()
@@ -4,10 +4,16 @@ Django settings for docslm project.
 
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# The `services` package lives next to manage.py; make it importable once,
+# whatever the working directory of the WSGI/ASGI server is.
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = 'django-insecure-your-secret-key-here-change-in-production'
 
@@ -30,6 +36,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.RequestMetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'docslm.urls'
@@ -49,6 +56,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'docslm.wsgi.application'
+ASGI_APPLICATION = 'docslm.asgi.application'
+
+# Threads available to async views for blocking calls (Milvus, LLM, pandas, SMB)
+BLOCKING_POOL_SIZE = int(os.environ.get('DOCSLM_BLOCKING_POOL_SIZE', '32'))
 
 # Database
 DATABASES = {
@@ -58,6 +69,31 @@ DATABASES = {
     }
 }
 
+# Sessions are kept in a cache, so no request touches SQLite: Redis (the
+# config.yaml redis_url, or DOCSLM_REDIS_URL) when reachable, otherwise
+# the local-memory cache.
+def _session_cache():
+    from services.config import get_config
+    from services.sessions import session_cache
+
+    redis_url = os.environ.get('DOCSLM_REDIS_URL')
+    if redis_url is None:
+        try:
+            redis_url = get_config().redis_url
+        except Exception as exc:
+            print(f"Could not read redis_url from config.yaml ({exc})")
+    return session_cache(redis_url or None)
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'sessions': _session_cache(),
+}
+SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+SESSION_CACHE_ALIAS = 'sessions'
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -89,3 +125,22 @@ STATICFILES_DIRS = [
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Local on-disk caches (PDF page slices, ...)
+DOCSLM_CACHE_DIR = os.environ.get('DOCSLM_CACHE_DIR', os.path.join(BASE_DIR, '.cache'))
+PAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 512 MB
+PAGE_CACHE_READER_BYTES = 128 * 1024 * 1024  # parsed PDFs kept open, by file size
+
+# In-memory previews of cited sources, prefetched while answers are built
+PREVIEW_CACHE_MAX_BYTES = 128 * 1024 * 1024  # 128 MB
+PREVIEW_CACHE_TTL = 300  # seconds
+PREVIEW_PREFETCH_MAX_FILE_BYTES = 10 * 1024 * 1024  # larger files are not prefetched
+
+# Downscaled image / first-page PDF previews, rendered on demand into DOCSLM_CACHE_DIR
+RENDITION_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 256 MB
+RENDITION_WORKERS = 2  # renders admitted at once (PDFium rasterises one page at a time)
+RENDITION_QUALITY = 80  # WebP/JPEG quality
+RENDITION_MAX_PIXELS = 400_000_000  # A0 scans at 400 dpi, larger images are refused
+
+# Requests slower than this are logged with their per-stage breakdown
+SLOW_REQUEST_SECONDS = float(os.environ.get('DOCSLM_SLOW_REQUEST_SECONDS', '5'))
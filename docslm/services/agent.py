@@ -1,6 +1,21 @@
 from graphrag.agent import GraphRAG
 from graphrag.store import Store
 
+from .embeddings import EMBEDDING_ATTRIBUTES
+from .tracing import span
+
+# Size of the answer pieces replayed when GraphRAG cannot stream natively
+STREAM_PIECE_CHARS = 24
+
+
+def _query_embedder(store):
+    """``embed_query`` of the store's embedding client, if it exposes one."""
+    for name in EMBEDDING_ATTRIBUTES:
+        candidate = getattr(store, name, None)
+        if callable(getattr(candidate, "embed_query", None)):
+            return candidate.embed_query
+    return None
+
 
 class Agent:
     # Configurazioni predefinite per le modalità
@@ -27,6 +42,8 @@ class Agent:
             rerank: bool = True,
             draw_thinking_level: str = None,
             draw_model: str = "gemini-3-flash-preview",
+            answer_cache=None,
+            cache_scope: tuple | None = None,
             ):
         # Se viene specificata una modalità, usa le sue configurazioni
         if mode in self.MODES:
@@ -42,10 +59,21 @@ class Agent:
             if draw_thinking_level is None:
                 draw_thinking_level = "low"
         
+        self.store = store
         self.mode = mode
         self.model = model
         self.draw_thinking_level = draw_thinking_level
-        
+        # (database, collection, mode) answers are cached under, if any
+        self.answer_cache = answer_cache if cache_scope else None
+        self.cache_scope = cache_scope
+        self._embed = _query_embedder(store) if self.answer_cache is not None else None
+        # Only the first turn of a conversation is answered from (and stored
+        # in) the cache: later turns depend on GraphRAG's memory of the
+        # previous ones. A first question answered from the cache is replayed
+        # through GraphRAG before the next one, so its memory stays complete.
+        self._turns = {}  # user_id -> turns answered in this conversation
+        self._replay = {}  # user_id -> cached question GraphRAG has not seen yet
+
         self.agent = GraphRAG(
             store=store,
             llm=model,
@@ -55,4 +83,88 @@ class Agent:
         )
     
     def invoke(self, query: str, user_id: str | None = None) -> str:
-        return self.agent.run(query, user_id)
\ No newline at end of file
+        cached = self._cached(query, user_id)
+        if cached is not None:
+            return cached
+        self._catch_up(user_id)
+        with span("agent.run"):
+            state = self.agent.run(query, user_id)
+        self._remember(query, state, user_id)
+        return state
+
+    def _cached(self, query: str, user_id: str | None):
+        if self.answer_cache is None or self._turns.get(user_id, 0):
+            return None
+        try:
+            with span("answer_cache.lookup"):
+                state = self.answer_cache.lookup(self.cache_scope, query, embed=self._embed)
+        except Exception as exc:
+            print(f"Answer cache lookup failed: {exc}")
+            return None
+        if state is not None:
+            self._turns[user_id] = 1
+            self._replay[user_id] = query
+        return state
+
+    def _catch_up(self, user_id: str | None):
+        """Run a question answered from the cache through GraphRAG, so the
+        question that follows it is answered with it in memory."""
+        query = self._replay.pop(user_id, None)
+        if query is not None:
+            with span("agent.replay"):
+                self.agent.run(query, user_id)
+
+    def _remember(self, query: str, state, user_id: str | None):
+        first = not self._turns.get(user_id, 0)
+        self._turns[user_id] = self._turns.get(user_id, 0) + 1
+        if self.answer_cache is None or not first:
+            return
+        try:
+            with span("answer_cache.store"):
+                self.answer_cache.store(self.cache_scope, query, state, embed=self._embed)
+        except Exception as exc:
+            print(f"Answer cache store failed: {exc}")
+
+    def stream(self, query: str, user_id: str | None = None):
+        """Yield ("context", docs), then ("token", text) pieces, then ("final", state).
+
+        Uses GraphRAG.stream(query, user_id) when the installed graphrag
+        provides it (partial state dicts, with "context" once retrieval is
+        done and "token" for answer deltas); otherwise runs the whole graph
+        and replays the answer in small pieces. Cached answers are replayed
+        the same way (first turns only, see ``__init__``).
+        """
+        stream = getattr(self.agent, "stream", None)
+        state = self._cached(query, user_id)
+        if state is None:
+            self._catch_up(user_id)
+        if state is None and callable(stream):
+            state = {}
+            context_sent = False
+            with span("agent.run"):
+                for update in stream(query, user_id):
+                    if not isinstance(update, dict):
+                        yield "token", str(update)
+                        continue
+                    if not context_sent and "context" in update:
+                        context_sent = True
+                        yield "context", update["context"]
+                    if update.get("token"):
+                        yield "token", update["token"]
+                    state.update({k: v for k, v in update.items() if k != "token"})
+            if not context_sent:
+                yield "context", state.get("context", [])
+            self._remember(query, state, user_id)
+            yield "final", state
+            return
+
+        if state is None:
+            with span("agent.run"):
+                state = self.agent.run(query, user_id)
+            self._remember(query, state, user_id)
+        yield "context", state.get("context", [])
+        response = state.get("response", "")
+        text = response.get("response", "") if isinstance(response, dict) else str(response)
+        for start in range(0, len(text), STREAM_PIECE_CHARS):
+            yield "token", text[start:start + STREAM_PIECE_CHARS]
+        yield "final", state
\ No newline at end of file
@@ -0,0 +1,180 @@
+import re
+import math
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from .config import get_config
+from .sessions import make_kv
+from .tracing import register_stats
+
+GENERATION_PREFIX = "docslm:collection-gen:"
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Case-, spacing- and punctuation-insensitive form of a question."""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = _PUNCT_RE.sub(" ", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def _unit(vector) -> list:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def _serialize_doc(doc) -> dict:
+    if isinstance(doc, dict):
+        return {"page_content": doc.get("page_content", ""), "metadata": dict(doc.get("metadata") or {})}
+    return {
+        "page_content": getattr(doc, "page_content", ""),
+        "metadata": dict(getattr(doc, "metadata", {}) or {}),
+    }
+
+
+class AnswerCache:
+    """Answers keyed on (database, collection, mode, normalized question).
+
+    A lookup first tries the exact normalized text, then (when an embedding
+    function is available) the most similar cached question of the same
+    scope with cosine similarity >= ``threshold``. Every scope is tagged
+    with the collection's generation, kept in the shared KV store and bumped
+    by ``invalidate`` whenever the collection is (re-)ingested, so stale
+    answers are never served from any worker. Only context-free questions
+    (the first turn of a conversation) are looked up and stored; see
+    ``Agent``.
+    """
+
+    def __init__(self, kv, threshold: float = 0.95, max_entries: int = 256, ttl: float = 86400):
+        self.kv = kv
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # (database, collection, mode) -> (generation, OrderedDict[normalized] -> entry)
+        self._scopes = {}
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _generation(self, database: str, collection: str) -> str:
+        return self.kv.get(f"{GENERATION_PREFIX}{database}:{collection}") or "0"
+
+    def invalidate(self, database: str, collection: str):
+        key = f"{GENERATION_PREFIX}{database}:{collection}"
+        self.kv.set(key, str(time.time_ns()))
+        with self._lock:
+            for scope in [s for s in self._scopes if s[:2] == (database, collection)]:
+                del self._scopes[scope]
+            self.invalidations += 1
+
+    def _entries(self, scope: tuple) -> OrderedDict:
+        """Entries of ``scope`` for the current generation (lock held)."""
+        generation = self._generation(scope[0], scope[1])
+        current = self._scopes.get(scope)
+        if current is None or current[0] != generation:
+            current = (generation, OrderedDict())
+            self._scopes[scope] = current
+        return current[1]
+
+    def lookup(self, scope: tuple, query: str, embed=None):
+        normalized = normalize_query(query)
+        if not normalized:
+            return None
+        now = time.time()
+        with self._lock:
+            entries = self._entries(scope)
+            entry = entries.get(normalized)
+            if entry is not None and now - entry["at"] <= self.ttl:
+                entries.move_to_end(normalized)
+                self.exact_hits += 1
+                return entry["state"]
+            candidates = [(key, e) for key, e in entries.items()
+                          if e["vector"] is not None and now - e["at"] <= self.ttl]
+        if embed is not None and candidates:
+            vector = _unit(embed(query))
+            best_key, best_score = None, -1.0
+            for key, e in candidates:
+                score = sum(a * b for a, b in zip(vector, e["vector"]))
+                if score > best_score:
+                    best_key, best_score = key, score
+            if best_score >= self.threshold:
+                with self._lock:
+                    entry = self._entries(scope).get(best_key)
+                    if entry is not None:
+                        self.semantic_hits += 1
+                        return entry["state"]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def store(self, scope: tuple, query: str, state: dict, embed=None):
+        normalized = normalize_query(query)
+        if not normalized or not isinstance(state, dict):
+            return
+        response = state.get("response", "")
+        if not response:
+            return
+        entry = {
+            "state": {
+                "response": response,
+                "context": [_serialize_doc(doc) for doc in state.get("context", []) or []],
+                "cached": True,
+            },
+            "vector": _unit(embed(query)) if embed is not None else None,
+            "at": time.time(),
+        }
+        with self._lock:
+            entries = self._entries(scope)
+            entries[normalized] = entry
+            entries.move_to_end(normalized)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "scopes": len(self._scopes),
+                "entries": sum(len(entries) for _, entries in self._scopes.values()),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+_ANSWER_CACHE = None
+_ANSWER_CACHE_LOCK = threading.Lock()
+
+
+def get_answer_cache():
+    """Process-wide answer cache, or None when disabled in config.yaml."""
+    global _ANSWER_CACHE
+    config = get_config()
+    if not config.get("answer_cache_enabled", True):
+        return None
+    if _ANSWER_CACHE is None:
+        with _ANSWER_CACHE_LOCK:
+            if _ANSWER_CACHE is None:
+                _ANSWER_CACHE = AnswerCache(
+                    make_kv(config.redis_url),
+                    threshold=config.get("answer_cache_threshold", 0.95),
+                    max_entries=config.get("answer_cache_size", 256),
+                    ttl=config.get("answer_cache_ttl", 86400),
+                )
+                register_stats("answer_cache", _ANSWER_CACHE.stats)
+    return _ANSWER_CACHE
+
+
+def invalidate_collection(database: str, collection: str):
+    cache = get_answer_cache()
+    if cache is not None:
+        cache.invalidate(database, collection)
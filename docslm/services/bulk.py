@@ -0,0 +1,68 @@
+import os
+import json
+
+from .tracing import span
+
+
+class DeferredIndexes:
+    """Drop a collection's indexes for a bulk load and rebuild them after.
+
+    ``defer`` records each index (field, params, name) in ``state_path``
+    before dropping it, so a build killed mid-load can still ``restore``
+    the exact same indexes on the next run. Stage durations are collected
+    in ``timings``.
+    """
+
+    def __init__(self, milvus, db_name: str, collection: str, state_path: str):
+        self.milvus = milvus
+        self.db_name = db_name
+        self.collection = collection
+        self.state_path = state_path
+        self.timings = {}
+
+    @property
+    def pending(self) -> bool:
+        return os.path.exists(self.state_path)
+
+    def defer(self):
+        if self.pending:
+            return
+        with span("ingest.drop_index") as timed:
+            self._defer()
+        self._add_timing("drop_index", timed.seconds)
+
+    def _defer(self):
+        collection_obj = self.milvus.collection(self.db_name, self.collection)
+        specs = [
+            {"field": index.field_name, "params": dict(index.params), "name": index.index_name}
+            for index in collection_obj.indexes
+        ]
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(specs, f)
+        os.replace(tmp, self.state_path)
+        collection_obj.release()
+        for spec in specs:
+            collection_obj.drop_index(index_name=spec["name"])
+
+    def restore(self):
+        """Rebuild the recorded indexes that are missing (blocks until built)."""
+        if not self.pending:
+            return
+        with span("ingest.build_index") as timed:
+            self._restore()
+        self._add_timing("build_index", timed.seconds)
+
+    def _add_timing(self, stage: str, seconds: float):
+        self.timings[stage] = round(self.timings.get(stage, 0.0) + seconds, 3)
+
+    def _restore(self):
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            specs = json.load(f)
+        collection_obj = self.milvus.collection(self.db_name, self.collection)
+        existing = {index.index_name for index in collection_obj.indexes}
+        for spec in specs:
+            if spec["name"] not in existing:
+                collection_obj.create_index(spec["field"], spec["params"], index_name=spec["name"])
+        os.remove(self.state_path)
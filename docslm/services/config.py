@@ -0,0 +1,130 @@
+import os
+import time
+import threading
+from dataclasses import dataclass, field, fields
+from types import MappingProxyType
+
+import yaml
+
+DEFAULT_CONFIG_PATH = os.environ.get(
+    "DOCSLM_CONFIG",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.yaml"),
+)
+
+# How often (seconds) the file's mtime is checked for hot reload
+RELOAD_CHECK_INTERVAL = 1.0
+
+
+class ConfigError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class DocsConfig:
+    """Validated, immutable view of ``config.yaml``.
+
+    Known keys are typed attributes; ``get`` keeps dict-style access for
+    everything else (and for code written against the raw YAML mapping).
+    """
+
+    source: str
+    path: str | None = None
+    jobs: str | None = None
+    uri: str | None = None
+    k: int = 4
+    embedding_model: str | None = None
+    ingest_workers: int | None = None
+    ingest_batch_size: int = 256
+    redis_url: str | None = None
+    job_workers: int = 1
+    checkpoints: str | None = None
+    milvus_timeout: float | None = None
+    raw: MappingProxyType = field(default_factory=lambda: MappingProxyType({}), repr=False)
+
+    def get(self, key: str, default=None):
+        value = self.raw.get(key)
+        return default if value is None else value
+
+    @classmethod
+    def from_mapping(cls, data: dict, source: str) -> "DocsConfig":
+        if not isinstance(data, dict):
+            raise ConfigError(f"{source}: expected a mapping at top level")
+        known = {f.name for f in fields(cls)} - {"source", "raw"}
+        values = {key: data[key] for key in known if data.get(key) is not None}
+        config = cls(source=source, raw=MappingProxyType(dict(data)), **values)
+        config.validate()
+        return config
+
+    def validate(self):
+        errors = []
+        if self.uri is not None and (
+                not isinstance(self.uri, str) or "://" not in self.uri):
+            errors.append(f"uri must look like http://host:port, got {self.uri!r}")
+        for name in ("k", "ingest_batch_size", "job_workers"):
+            value = getattr(self, name)
+            if not isinstance(value, int) or value < 1:
+                errors.append(f"{name} must be a positive integer, got {value!r}")
+        if self.ingest_workers is not None and (
+                not isinstance(self.ingest_workers, int) or self.ingest_workers < 1):
+            errors.append(f"ingest_workers must be a positive integer, got {self.ingest_workers!r}")
+        for name in ("path", "jobs", "embedding_model", "redis_url", "checkpoints"):
+            value = getattr(self, name)
+            if value is not None and not isinstance(value, str):
+                errors.append(f"{name} must be a string, got {value!r}")
+        if errors:
+            raise ConfigError(f"{self.source}: " + "; ".join(errors))
+
+
+class ConfigLoader:
+    """Loads one config file and reloads it when its mtime changes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._config = None
+        self._mtime = None
+        self._checked = 0.0
+
+    def get(self) -> DocsConfig:
+        now = time.monotonic()
+        if self._config is not None and now - self._checked < RELOAD_CHECK_INTERVAL:
+            return self._config
+        with self._lock:
+            self._checked = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                if self._config is not None:
+                    # keep serving the last good config if the file vanishes
+                    return self._config
+                raise ConfigError(f"Configuration file not found: {self.path}")
+            if self._config is None or mtime != self._mtime:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        data = yaml.safe_load(f) or {}
+                    config = DocsConfig.from_mapping(data, self.path)
+                except (ConfigError, yaml.YAMLError) as exc:
+                    if self._config is None:
+                        raise ConfigError(str(exc)) from exc
+                    # a bad edit must not take the running app down
+                    print(f"Ignoring invalid configuration change: {exc}")
+                    self._mtime = mtime
+                    return self._config
+                if self._config is not None:
+                    print(f"Reloaded configuration from {self.path}")
+                self._config, self._mtime = config, mtime
+            return self._config
+
+
+_LOADERS = {}
+_LOADERS_LOCK = threading.Lock()
+
+
+def get_config(path: str | None = None) -> DocsConfig:
+    """Process-wide accessor for the (hot-reloaded) configuration."""
+    path = os.path.abspath(path or DEFAULT_CONFIG_PATH)
+    loader = _LOADERS.get(path)
+    if loader is None:
+        with _LOADERS_LOCK:
+            loader = _LOADERS.setdefault(path, ConfigLoader(path))
+    return loader.get()
@@ -0,0 +1,162 @@
+import time
+import threading
+
+from pymilvus import Collection, MilvusException, connections, db, utility
+
+from .tracing import register_stats
+
+DEFAULT_DB = "default"
+
+
+class LatencyStat:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float, ok: bool = True):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if not ok:
+            self.errors += 1
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class MilvusConnections:
+    """Process-wide pool of named pymilvus connections, one alias per database.
+
+    Each alias is opened with its own ``db_name``, so callers pass
+    ``using=alias`` instead of switching the global ``db.using_database``
+    and concurrent requests on different databases cannot race. A call
+    that fails with a connection error drops the alias and is retried once
+    on a fresh connection.
+    """
+
+    def __init__(self, uri: str, timeout: float | None = None):
+        self.uri = uri
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._aliases = {}
+        self._connect_stats = LatencyStat()
+        self._call_stats = {}
+
+    @staticmethod
+    def _alias_name(db_name: str) -> str:
+        return f"docslm_{db_name}"
+
+    def alias(self, db_name: str = DEFAULT_DB) -> str:
+        """Connected alias for ``db_name`` (created on first use)."""
+        name = self._aliases.get(db_name)
+        if name and connections.has_connection(name):
+            return name
+        with self._lock:
+            name = self._aliases.get(db_name)
+            if name and connections.has_connection(name):
+                return name
+            name = self._alias_name(db_name)
+            started = time.perf_counter()
+            ok = False
+            try:
+                kwargs = {"alias": name, "uri": self.uri, "db_name": db_name}
+                if self.timeout is not None:
+                    kwargs["timeout"] = self.timeout
+                connections.connect(**kwargs)
+                ok = True
+            finally:
+                self._connect_stats.add(time.perf_counter() - started, ok)
+            self._aliases[db_name] = name
+            return name
+
+    def drop(self, db_name: str):
+        with self._lock:
+            name = self._aliases.pop(db_name, None)
+        if name:
+            try:
+                connections.disconnect(name)
+            except Exception:
+                pass
+
+    def close(self):
+        for db_name in list(self._aliases):
+            self.drop(db_name)
+
+    def call(self, label: str, db_name: str, fn, *args, **kwargs):
+        """Run ``fn(*args, using=alias, **kwargs)``, timing it under ``label``."""
+        for attempt in (0, 1):
+            alias = self.alias(db_name)
+            started = time.perf_counter()
+            try:
+                result = fn(*args, using=alias, **kwargs)
+            except MilvusException as exc:
+                self._record(label, time.perf_counter() - started, False)
+                if attempt == 0 and _is_connection_error(exc):
+                    self.drop(db_name)
+                    continue
+                raise
+            self._record(label, time.perf_counter() - started, True)
+            return result
+
+    def _record(self, label: str, seconds: float, ok: bool):
+        with self._lock:
+            self._call_stats.setdefault(label, LatencyStat()).add(seconds, ok)
+
+    # -- convenience wrappers --------------------------------------------------
+
+    def collection(self, db_name: str, name: str) -> Collection:
+        return self.call("collection", db_name, Collection, name)
+
+    def list_collections(self, db_name: str) -> list:
+        return self.call("list_collections", db_name, utility.list_collections)
+
+    def list_databases(self) -> list:
+        return self.call("list_databases", DEFAULT_DB, db.list_database)
+
+    def ensure_database(self, db_name: str):
+        if db_name not in self.list_databases():
+            self.call("create_database", DEFAULT_DB, db.create_database, db_name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "aliases": sorted(self._aliases),
+                "connect": self._connect_stats.as_dict(),
+                "calls": {label: stat.as_dict() for label, stat in self._call_stats.items()},
+            }
+
+
+def _is_connection_error(exc: MilvusException) -> bool:
+    text = str(exc).lower()
+    return any(word in text for word in ("connect", "unavailable", "channel", "closed", "timeout"))
+
+
+_MILVUS = None
+_MILVUS_LOCK = threading.Lock()
+
+
+def init_milvus(uri: str, timeout: float | None = None) -> MilvusConnections:
+    """Create (or replace, if the URI changed) the process-wide pool."""
+    global _MILVUS
+    with _MILVUS_LOCK:
+        if _MILVUS is None or _MILVUS.uri != uri:
+            if _MILVUS is not None:
+                _MILVUS.close()
+            _MILVUS = MilvusConnections(uri, timeout)
+            register_stats("milvus", _MILVUS.stats)
+    return _MILVUS
+
+
+def get_milvus(uri: str | None = None) -> MilvusConnections:
+    if _MILVUS is None or (uri and _MILVUS.uri != uri):
+        if not uri:
+            raise RuntimeError("Milvus connection pool not initialized")
+        return init_milvus(uri)
+    return _MILVUS
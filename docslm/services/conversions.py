@@ -0,0 +1,210 @@
+import os
+import gzip
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from .manifest import file_hash
+from .tracing import register_stats
+
+# Bump when the stored layout changes
+FORMAT_VERSION = 1
+
+# Metadata values that depend on where the file was found rather than on its
+# content; stored as placeholders and filled in for the requesting path.
+_PATH = "\x00path"
+_NAMESPACE = "\x00namespace"
+_NAME = "\x00name"
+
+
+def converter_version() -> str:
+    """Installed Duckling version, with the commit it was built from when
+    it was installed from git (the package version alone rarely changes)."""
+    from importlib import metadata
+    try:
+        dist = metadata.distribution("duckling")
+    except metadata.PackageNotFoundError:
+        return "duckling-unknown"
+    version = f"duckling-{dist.version}"
+    try:
+        direct = json.loads(dist.read_text("direct_url.json") or "{}")
+        commit = direct.get("vcs_info", {}).get("commit_id")
+        if commit:
+            version += f"+{commit[:12]}"
+    except ValueError:
+        pass
+    return version
+
+
+def _document(text: str, metadata: dict):
+    from langchain_core.documents import Document
+    return Document(page_content=text, metadata=metadata)
+
+
+class ConversionCache:
+    """Content-addressed store of Duckling output.
+
+    Entries are keyed by sha256(converter version, file content), so the
+    same PDF selected into several collections (or commesse) is converted
+    once; a Duckling upgrade changes every key. Each entry is one gzipped
+    JSON file of (page_content, metadata) pairs under ``directory``; an
+    SQLite index shared by all ingestion processes tracks sizes and last
+    use, and the least recently used entries are evicted once the total
+    exceeds ``max_bytes``.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 4 * 1024 ** 3, salt: str = ""):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.version = f"{FORMAT_VERSION}:{converter_version()}:{salt}"
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite3"), timeout=30,
+                                   check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, bytes INTEGER NOT NULL, chunks INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.commit()
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evictions = 0
+
+    def key(self, path: str, digest: str | None = None) -> str:
+        digest = digest or file_hash(path)
+        return hashlib.sha256(f"{self.version}\x00{digest}".encode("utf-8")).hexdigest()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json.gz")
+
+    def get(self, key: str, path: str, namespace: str):
+        """The cached chunks for ``path`` (metadata rewritten for it), or None."""
+        try:
+            with gzip.open(self._file(key), "rt", encoding="utf-8") as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except (OSError, ValueError, EOFError) as exc:
+            print(f"Discarding unreadable conversion cache entry {key}: {exc}")
+            self._remove(key)
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self._db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        name = os.path.basename(path)
+        return [_document(text, _fill(meta, path, namespace, name)) for text, meta in stored]
+
+    def put(self, key: str, path: str, namespace: str, docs: list):
+        name = os.path.basename(path)
+        stored = [
+            [getattr(doc, "page_content", ""), _placeholders(getattr(doc, "metadata", None) or {},
+                                                              path, namespace, name)]
+            for doc in docs
+        ]
+        target = self._file(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(stored, f, separators=(",", ":"), default=str)
+        os.replace(tmp, target)
+        size = os.path.getsize(target)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, bytes, chunks, last_used) VALUES (?, ?, ?, ?)",
+                (key, size, len(stored), time.time()),
+            )
+            self._db.commit()
+            self.stored += 1
+        self._evict()
+
+    def _remove(self, key: str):
+        try:
+            os.remove(self._file(key))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._db.commit()
+
+    def _evict(self):
+        with self._lock:
+            total = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            victims = []
+            for key, size in self._db.execute("SELECT key, bytes FROM entries ORDER BY last_used"):
+                if total <= self.max_bytes * 0.9:
+                    break
+                victims.append(key)
+                total -= size
+        for key in victims:
+            self._remove(key)
+        with self._lock:
+            self.evictions += len(victims)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM entries").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stored": self.stored,
+                "evictions": self.evictions,
+            }
+
+
+def _placeholders(meta: dict, path: str, namespace: str, name: str) -> dict:
+    out = {}
+    for key, value in meta.items():
+        if value == namespace:
+            value = _NAMESPACE
+        elif value == name:
+            value = _NAME
+        elif isinstance(value, str) and path in value:
+            value = value.replace(path, _PATH)
+        out[key] = value
+    return out
+
+
+def _fill(meta: dict, path: str, namespace: str, name: str) -> dict:
+    out = {}
+    for key, value in meta.items():
+        if value == _NAMESPACE:
+            value = namespace
+        elif value == _NAME:
+            value = name
+        elif isinstance(value, str) and _PATH in value:
+            value = value.replace(_PATH, path)
+        out[key] = value
+    return out
+
+
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_conversion_cache(directory: str, max_bytes: int = 4 * 1024 ** 3, salt: str = "") -> ConversionCache:
+    """Shared cache for ``directory`` in this process."""
+    cache = _CACHES.get(directory)
+    if cache is None:
+        with _CACHES_LOCK:
+            cache = _CACHES.get(directory)
+            if cache is None:
+                cache = _CACHES[directory] = ConversionCache(directory, max_bytes, salt)
+                register_stats("conversion_cache", cache.stats)
+    return cache
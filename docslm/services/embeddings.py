@@ -0,0 +1,137 @@
+import os
+import array
+import sqlite3
+import hashlib
+import threading
+
+# Attributes that may hold the Store's embeddings client, in lookup order
+EMBEDDING_ATTRIBUTES = ("embeddings", "embedding", "embedding_function", "embedding_model")
+
+
+def content_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent content-hash -> vector map (SQLite, float32 blobs)."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._db.commit()
+
+    def get_many(self, keys: list) -> dict:
+        found = {}
+        with self._lock:
+            # stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                )
+                for key, blob in rows:
+                    found[key] = array.array("f", blob).tolist()
+        return found
+
+    def put_many(self, items: dict):
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array.array("f", vector).tobytes()) for key, vector in items.items()],
+            )
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class CachedEmbeddings:
+    """Embeddings client wrapper that dedupes and caches ``embed_documents``.
+
+    Identical texts in a call are embedded once, texts already in the
+    cache are not sent at all, and the remaining unique texts go to the
+    wrapped client in requests of ``batch_size``. ``embed_query`` is
+    passed through untouched.
+    """
+
+    def __init__(self, inner, cache: EmbeddingCache, model: str, batch_size: int = 256):
+        self.inner = inner
+        self.cache = cache
+        self.model = model
+        self.batch_size = batch_size
+        self.texts = 0
+        self.unique = 0
+        self.cached = 0
+        self.embedded = 0
+        self.requests = 0
+
+    def embed_documents(self, texts: list) -> list:
+        keys = [content_key(self.model, text) for text in texts]
+        unique = dict(zip(keys, texts))
+        vectors = self.cache.get_many(list(unique))
+        missing = [key for key in unique if key not in vectors]
+        for start in range(0, len(missing), self.batch_size):
+            part = missing[start:start + self.batch_size]
+            embedded = self.inner.embed_documents([unique[key] for key in part])
+            fresh = dict(zip(part, embedded))
+            self.cache.put_many(fresh)
+            vectors.update(fresh)
+            self.requests += 1
+        self.texts += len(texts)
+        self.unique += len(unique)
+        self.cached += len(unique) - len(missing)
+        self.embedded += len(missing)
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> list:
+        return self.inner.embed_query(text)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def stats(self) -> dict:
+        return {
+            "texts": self.texts,
+            "unique": self.unique,
+            "cached": self.cached,
+            "embedded": self.embedded,
+            "requests": self.requests,
+            # share of texts that never reached the embedding API
+            "dedupe_ratio": round(1 - self.embedded / self.texts, 4) if self.texts else 0.0,
+        }
+
+
+def install_cached_embeddings(store, cache: EmbeddingCache, model: str, batch_size: int = 256):
+    """Replace the store's embeddings client (the first of
+    ``EMBEDDING_ATTRIBUTES`` with ``embed_documents``) with a
+    ``CachedEmbeddings`` around it. Returns the wrapper, or None (and says
+    why) if no such attribute can be replaced."""
+    for name in EMBEDDING_ATTRIBUTES:
+        client = getattr(store, name, None)
+        if isinstance(client, CachedEmbeddings):
+            return client
+        if not callable(getattr(client, "embed_documents", None)):
+            continue
+        wrapper = CachedEmbeddings(client, cache, model, batch_size)
+        try:
+            setattr(store, name, wrapper)
+        except AttributeError:
+            pass
+        if getattr(store, name, None) is wrapper:
+            return wrapper
+        print(f"{type(store).__name__}.{name} cannot be replaced, embedding cache disabled")
+        return None
+    print(f"{type(store).__name__} has none of {', '.join(EMBEDDING_ATTRIBUTES)} "
+          f"with embed_documents, embedding cache disabled")
+    return None
@@ -0,0 +1,509 @@
+import json
+import time
+import uuid
+import queue
+import threading
+
+from .pipeline import Checkpoint, IngestCancelled
+
+JOB_TTL_SECONDS = 7 * 24 * 3600
+FINAL_STATES = ("completed", "failed", "cancelled")
+# running jobs refresh a heartbeat this often; one missing for two recovery
+# passes (RECOVER_SECONDS apart) means its worker died and the job is re-queued
+HEARTBEAT_SECONDS = 15
+HEARTBEAT_TTL_SECONDS = 60
+RECOVER_SECONDS = 30
+# a job waiting for another job's collection lock checks it this often
+LOCK_POLL_SECONDS = 5
+
+
+class LocalJobBackend:
+    """In-process job records and queue (single web process, dev setups)."""
+
+    name = "local"
+
+    def __init__(self):
+        self._jobs = {}
+        self._cancel = set()
+        self._locks = {}  # name -> (owner, expires)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+
+    def save(self, job: dict):
+        with self._lock:
+            self._jobs[job["id"]] = json.loads(json.dumps(job))
+
+    def load(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job else None
+
+    def push(self, job_id: str):
+        self._queue.put(job_id)
+
+    def pop(self, timeout: float):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    # jobs die with the process that runs them: nothing to recover
+    def heartbeat(self, job_id: str):
+        pass
+
+    def ack(self, job_id: str):
+        pass
+
+    def orphans(self, suspects: set) -> list:
+        return []
+
+    def requeue(self, job_id: str):
+        self.push(job_id)
+
+    def lock(self, name: str, owner: str, ttl: int) -> bool:
+        with self._lock:
+            if self._owner(name) not in (None, owner):
+                return False
+            self._locks[name] = (owner, time.time() + ttl)
+            return True
+
+    def refresh_lock(self, name: str, owner: str, ttl: int) -> bool:
+        with self._lock:
+            if self._owner(name) != owner:
+                return False
+            self._locks[name] = (owner, time.time() + ttl)
+            return True
+
+    def unlock(self, name: str, owner: str):
+        with self._lock:
+            if self._owner(name) == owner:
+                del self._locks[name]
+
+    def lock_owner(self, name: str):
+        with self._lock:
+            return self._owner(name)
+
+    def _owner(self, name: str):
+        owner, expires = self._locks.get(name, (None, 0))
+        return owner if expires > time.time() else None
+
+    def request_cancel(self, job_id: str):
+        with self._lock:
+            self._cancel.add(job_id)
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            return job_id in self._cancel
+
+
+class RedisJobBackend:
+    """Job records and queue in Redis, shared by web and worker processes.
+
+    A popped job is moved atomically (BLMOVE) to a processing list and
+    removed from it once finished, so a job whose worker crashed is still
+    listed there; with its heartbeat expired it is found by ``orphans``
+    and pushed back on the queue. Collection locks are keys set with NX
+    and a TTL, refreshed and released only by their owner.
+    """
+
+    name = "redis"
+    PREFIX = "docslm:job:"
+    QUEUE = "docslm:jobs:queue"
+    PROCESSING = "docslm:jobs:processing"
+    LOCK_PREFIX = "docslm:jobs:lock:"
+
+    def __init__(self, url: str):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+        self.redis.ping()
+        self._refresh = self.redis.register_script(
+            "if redis.call('get', KEYS[1]) == ARGV[1] then "
+            "return redis.call('expire', KEYS[1], ARGV[2]) else return 0 end")
+        self._unlock = self.redis.register_script(
+            "if redis.call('get', KEYS[1]) == ARGV[1] then "
+            "return redis.call('del', KEYS[1]) else return 0 end")
+
+    def save(self, job: dict):
+        self.redis.set(self.PREFIX + job["id"], json.dumps(job), ex=JOB_TTL_SECONDS)
+
+    def load(self, job_id: str):
+        raw = self.redis.get(self.PREFIX + job_id)
+        return json.loads(raw) if raw else None
+
+    def push(self, job_id: str):
+        self.redis.lpush(self.QUEUE, job_id)
+
+    def pop(self, timeout: float):
+        item = self.redis.blmove(self.QUEUE, self.PROCESSING, max(int(timeout), 1), "RIGHT", "LEFT")
+        if not item:
+            return None
+        job_id = item.decode()
+        self.heartbeat(job_id)
+        return job_id
+
+    def heartbeat(self, job_id: str):
+        self.redis.set(self.PREFIX + job_id + ":heartbeat", 1, ex=HEARTBEAT_TTL_SECONDS)
+
+    def ack(self, job_id: str):
+        pipe = self.redis.pipeline()
+        pipe.lrem(self.PROCESSING, 0, job_id)
+        pipe.delete(self.PREFIX + job_id + ":heartbeat")
+        pipe.execute()
+
+    def orphans(self, suspects: set) -> list:
+        """Processing jobs without a heartbeat that were already in
+        ``suspects`` (found without one on the previous pass); ``suspects``
+        is updated in place."""
+        missing = set()
+        for raw in self.redis.lrange(self.PROCESSING, 0, -1):
+            job_id = raw.decode()
+            if not self.redis.exists(self.PREFIX + job_id + ":heartbeat"):
+                missing.add(job_id)
+        orphans = sorted(missing & suspects)
+        suspects.clear()
+        suspects.update(missing - set(orphans))
+        return orphans
+
+    def requeue(self, job_id: str):
+        # only the caller that removes it from the processing list re-queues it
+        if self.redis.lrem(self.PROCESSING, 0, job_id):
+            self.redis.rpush(self.QUEUE, job_id)
+
+    def lock(self, name: str, owner: str, ttl: int) -> bool:
+        key = self.LOCK_PREFIX + name
+        return bool(self.redis.set(key, owner, nx=True, ex=ttl)) or self.refresh_lock(name, owner, ttl)
+
+    def refresh_lock(self, name: str, owner: str, ttl: int) -> bool:
+        return bool(self._refresh(keys=[self.LOCK_PREFIX + name], args=[owner, ttl]))
+
+    def unlock(self, name: str, owner: str):
+        self._unlock(keys=[self.LOCK_PREFIX + name], args=[owner])
+
+    def lock_owner(self, name: str):
+        raw = self.redis.get(self.LOCK_PREFIX + name)
+        return raw.decode() if raw is not None else None
+
+    def request_cancel(self, job_id: str):
+        self.redis.set(self.PREFIX + job_id + ":cancel", 1, ex=JOB_TTL_SECONDS)
+
+    def cancel_requested(self, job_id: str) -> bool:
+        return bool(self.redis.exists(self.PREFIX + job_id + ":cancel"))
+
+
+class JobQueue:
+    """Collection-build jobs executed by a pool of worker threads.
+
+    The local backend runs its workers inside the web process. With the
+    Redis backend the workers can run in the web processes, in
+    ``manage.py run_jobs`` or both (see ``get_job_queue``). A job holds its
+    collection's lock in the backend while it runs (refreshed with its
+    heartbeat), so two workers never build or sync the same collection at
+    once; a job whose collection is locked waits for it.
+    """
+
+    def __init__(self, backend, workers: int = 1):
+        self.backend = backend
+        self.workers = workers
+        self._threads = []
+        self._stop = threading.Event()
+        self._recover_lock = threading.Lock()
+        self._recovered_at = 0.0
+        self._suspects = set()
+
+    # -- API used by the views -------------------------------------------------
+
+    def submit_create_collection(self, config: str, commessa: str, collection: str, files: list) -> dict:
+        return self._submit("create_collection", config, commessa, collection, files)
+
+    def submit_sync_collection(self, config: str, commessa: str, collection: str, files: list | None) -> dict:
+        # the files to process are only known once the worker has diffed the manifest
+        return self._submit("sync_collection", config, commessa, collection, files)
+
+    def _submit(self, kind: str, config: str, commessa: str, collection: str, files: list | None) -> dict:
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": "queued",
+            "payload": {
+                "config": config,
+                "commessa": commessa,
+                "collection": collection,
+                "files": files,
+            },
+            "files": {path: "pending" for path in (files or []) if kind == "create_collection"},
+            "total": len(files or []) if kind == "create_collection" else 0,
+            "done": 0,
+            "resumed": 0,
+            "chunks": 0,
+            "plan": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+            "skipped": None,
+            "stats": None,
+        }
+        self.backend.save(job)
+        self.backend.push(job["id"])
+        return job
+
+    def get(self, job_id: str):
+        return self.backend.load(job_id)
+
+    def cancel(self, job_id: str):
+        job = self.backend.load(job_id)
+        if job is None:
+            return None
+        if job["status"] not in FINAL_STATES:
+            self.backend.request_cancel(job_id)
+        return job
+
+    @staticmethod
+    def eta(job: dict):
+        """Seconds left, extrapolated from the files processed in this run."""
+        if job["status"] != "running" or not job["started_at"]:
+            return None
+        processed = job["done"] - job["resumed"]
+        if processed <= 0:
+            return None
+        elapsed = time.time() - job["started_at"]
+        return round(elapsed / processed * (job["total"] - job["done"]), 1)
+
+    # -- workers ---------------------------------------------------------------
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"docslm-job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        self._stop.set()
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                self._recover()
+                job_id = self.backend.pop(timeout=1)
+            except Exception as exc:
+                print(f"Job queue unavailable: {exc}")
+                time.sleep(5)
+                continue
+            if job_id:
+                try:
+                    self.run(job_id)
+                finally:
+                    self._ack(job_id)
+
+    def _ack(self, job_id: str):
+        try:
+            self.backend.ack(job_id)
+        except Exception as exc:
+            print(f"Could not acknowledge job {job_id}: {exc}")
+
+    def _recover(self):
+        """Re-queue jobs whose worker died (heartbeat expired), from their checkpoint."""
+        with self._recover_lock:
+            if time.monotonic() - self._recovered_at < RECOVER_SECONDS:
+                return
+            self._recovered_at = time.monotonic()
+            orphans = self.backend.orphans(self._suspects)
+        for job_id in orphans:
+            job = self.backend.load(job_id)
+            if job is not None and self.backend.lock_owner(self._lock_name(job)) == job_id:
+                # still refreshing its collection lock: alive, only its heartbeat write failed
+                continue
+            if job is not None and job["status"] not in FINAL_STATES:
+                print(f"Job {job_id} lost its worker, re-queued")
+                # progress is rebuilt from the checkpoint by the next run
+                job.update(status="queued", started_at=None, done=0, resumed=0, chunks=0,
+                           files={path: "pending" for path in job["files"]})
+                self.backend.save(job)
+            self.backend.requeue(job_id)
+
+    @staticmethod
+    def _lock_name(job: dict) -> str:
+        payload = job["payload"]
+        return f"collection:{payload['commessa']}:{payload['collection']}"
+
+    def run(self, job_id: str):
+        job = self.backend.load(job_id)
+        if job is None or job["status"] != "queued":
+            return
+        if self.backend.cancel_requested(job_id):
+            job.update(status="cancelled", finished_at=time.time())
+            self.backend.save(job)
+            return
+
+        beating, lost = threading.Event(), threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job, beating, lost),
+                         name=f"docslm-job-heartbeat-{job_id[:8]}", daemon=True).start()
+        lock = self._lock_name(job)
+        try:
+            if not self._acquire(job, lock):
+                job.update(status="cancelled", finished_at=time.time())
+                self.backend.save(job)
+                return
+            job.update(status="running", started_at=time.time())
+            self.backend.save(job)
+            # a lost lock (e.g. Redis unreachable past its TTL) stops the run
+            # like a cancellation, so it never overlaps another worker's
+            cancelled = lambda: lost.is_set() or self.backend.cancel_requested(job_id)
+            if job["kind"] == "create_collection":
+                self._create_collection(job, cancelled)
+            elif job["kind"] == "sync_collection":
+                self._sync_collection(job, cancelled)
+            else:
+                raise ValueError(f"Unknown job kind: {job['kind']}")
+            job["status"] = "completed"
+        except IngestCancelled:
+            if lost.is_set():
+                job.update(status="failed", error="Lock della collection perso durante l'elaborazione")
+            else:
+                job["status"] = "cancelled"
+        except Exception as exc:
+            import traceback
+            traceback.print_exc()
+            job.update(status="failed", error=str(exc))
+        finally:
+            beating.set()
+            self._unlock(lock, job_id)
+        job["finished_at"] = time.time()
+        self.backend.save(job)
+
+    def _acquire(self, job: dict, lock: str) -> bool:
+        """Take the collection lock, waiting while another job holds it;
+        False if the job is cancelled meanwhile."""
+        waiting = False
+        while not self.backend.lock(lock, job["id"], HEARTBEAT_TTL_SECONDS):
+            if not waiting:
+                waiting = True
+                print(f"Job {job['id']} waits for {lock} (held by job {self.backend.lock_owner(lock)})")
+            if self.backend.cancel_requested(job["id"]):
+                return False
+            time.sleep(LOCK_POLL_SECONDS)
+        return True
+
+    def _unlock(self, lock: str, job_id: str):
+        try:
+            self.backend.unlock(lock, job_id)
+        except Exception as exc:
+            print(f"Could not release {lock}: {exc}")
+
+    def _heartbeat(self, job: dict, stop: threading.Event, lost: threading.Event):
+        """Refresh the job's heartbeat and, once it runs, its collection lock;
+        sets ``lost`` when the lock was taken over or could not be refreshed
+        before it expired."""
+        lock = self._lock_name(job)
+        refreshed = time.monotonic()
+        while not stop.wait(HEARTBEAT_SECONDS):
+            try:
+                self.backend.heartbeat(job["id"])
+            except Exception as exc:
+                print(f"Job {job['id']} heartbeat failed: {exc}")
+            if job["status"] != "running":
+                refreshed = time.monotonic()
+                continue
+            try:
+                if self.backend.refresh_lock(lock, job["id"], HEARTBEAT_TTL_SECONDS):
+                    refreshed = time.monotonic()
+                    continue
+                print(f"Job {job['id']} lost {lock}, stopping")
+                lost.set()
+            except Exception as exc:
+                print(f"Job {job['id']} could not refresh {lock}: {exc}")
+                if time.monotonic() - refreshed > HEARTBEAT_TTL_SECONDS - HEARTBEAT_SECONDS:
+                    lost.set()
+
+    def _create_collection(self, job: dict, cancelled):
+        from .store import ManageDB
+
+        payload = job["payload"]
+        manager = ManageDB(payload["config"])
+
+        # files finished by an earlier, interrupted run of the same build
+        previous = Checkpoint(manager.checkpoint_path(payload["commessa"], payload["collection"]))
+        for path, chunks in previous.done.items():
+            if path in job["files"]:
+                job["files"][path] = "done"
+                job["done"] += 1
+                job["chunks"] += chunks
+        job["resumed"] = job["done"]
+        self.backend.save(job)
+
+        built = manager.create_collection(
+            payload["commessa"],
+            payload["collection"],
+            files=payload["files"],
+            on_file_done=self._file_done_hook(job),
+            cancelled=cancelled,
+        )
+        if not built:
+            # already built: nothing left to process
+            job.update(skipped="Collection già esistente", done=job["total"],
+                       files={path: "done" for path in job["files"]})
+        job["stats"] = manager.ingest_stats
+
+    def _sync_collection(self, job: dict, cancelled):
+        from .store import ManageDB
+
+        payload = job["payload"]
+        manager = ManageDB(payload["config"])
+
+        def on_plan(plan):
+            to_ingest = plan["new"] + plan["changed"]
+            job["files"] = {path: "pending" for path in to_ingest}
+            job["total"] = len(to_ingest)
+            job["plan"] = {key: len(plan[key]) for key in ("new", "changed", "removed", "unchanged")}
+            self.backend.save(job)
+
+        summary = manager.sync_collection(
+            payload["commessa"],
+            payload["collection"],
+            files=payload["files"],
+            on_plan=on_plan,
+            on_file_done=self._file_done_hook(job),
+            cancelled=cancelled,
+        )
+        job["plan"] = summary
+        job["stats"] = manager.ingest_stats
+
+    def _file_done_hook(self, job: dict):
+        def on_file_done(path, chunks):
+            job["files"][path] = "done"
+            job["done"] += 1
+            job["chunks"] += chunks
+            self.backend.save(job)
+        return on_file_done
+
+
+_JOB_QUEUE = None
+_JOB_QUEUE_LOCK = threading.Lock()
+
+
+def make_backend(redis_url: str | None):
+    if redis_url:
+        try:
+            return RedisJobBackend(redis_url)
+        except Exception as exc:
+            print(f"Redis job backend unavailable ({exc}), using in-process queue")
+    return LocalJobBackend()
+
+
+def get_job_queue(config) -> JobQueue:
+    """Process-wide job queue. Its workers start on first use with the local
+    backend, and with Redis unless ``job_workers_in_web`` is false (jobs are
+    then only run by ``manage.py run_jobs``)."""
+    global _JOB_QUEUE
+    if _JOB_QUEUE is None:
+        with _JOB_QUEUE_LOCK:
+            if _JOB_QUEUE is None:
+                job_queue = JobQueue(make_backend(config.redis_url), workers=config.job_workers)
+                if job_queue.backend.name == "local" or config.get("job_workers_in_web", True):
+                    job_queue.start()
+                else:
+                    print("Jobs are queued in Redis and run by `manage.py run_jobs`")
+                _JOB_QUEUE = job_queue
+    return _JOB_QUEUE
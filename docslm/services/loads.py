@@ -0,0 +1,250 @@
+import time
+import threading
+from contextlib import contextmanager
+
+from pymilvus import utility
+
+from .config import get_config
+from .connections import LatencyStat, get_milvus
+from .sessions import make_kv
+from .tracing import register_stats, span
+
+
+class LoadManager:
+    """Keeps only recently used collections loaded in Milvus.
+
+    ``ensure_loaded`` is called before a collection is queried: it records
+    the access time in the shared KV, loads the collection if needed
+    (timed as a cold load) and then releases the least recently used
+    collections while more than ``max_loaded`` are loaded or their
+    estimated memory exceeds ``memory_budget`` bytes. A background sweep
+    releases collections idle for longer than ``ttl``.
+
+    Loads are global in Milvus, so the budget is enforced against state
+    every worker shares through the KV: the set of loaded collections
+    (with their memory), each one's last access and the number of queries
+    running on it (``in_use``). A collection with running queries is never
+    released. Milvus' own load state is re-checked every
+    ``verify_interval`` seconds, so a release made by another worker is
+    noticed.
+    """
+
+    PREFIX = "docslm:collection-access:"
+    REFS_PREFIX = "docslm:collection-refs:"
+    LOADED_KEY = "docslm:collections-loaded"
+    # a query holding a reference for longer is assumed dead (crashed worker)
+    REF_TTL_SECONDS = 900
+
+    def __init__(self, milvus, kv, ttl: float = 1800, max_loaded: int = 16,
+                 memory_budget: int = 0, verify_interval: float = 5):
+        self.milvus = milvus
+        self.kv = kv
+        self.ttl = ttl
+        self.max_loaded = max_loaded
+        self.memory_budget = memory_budget
+        self.verify_interval = verify_interval
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._loaded = {}  # (db_name, collection) -> {"verified": monotonic, "mem_bytes": int}
+        self._sweeper = None
+        self.cold_loads = LatencyStat()
+        self.hits = 0
+        self.idle_releases = 0
+        self.budget_releases = 0
+
+    @staticmethod
+    def _field(key: tuple) -> str:
+        return f"{key[0]}:{key[1]}"
+
+    def _access_key(self, key: tuple) -> str:
+        return f"{self.PREFIX}{self._field(key)}"
+
+    def last_access(self, key: tuple) -> float:
+        value = self.kv.get(self._access_key(key))
+        return float(value) if value else 0.0
+
+    def references(self, key: tuple) -> int:
+        """Queries currently running on the collection, across workers."""
+        value = self.kv.get(f"{self.REFS_PREFIX}{self._field(key)}")
+        return max(int(value), 0) if value else 0
+
+    def shared_loaded(self) -> dict:
+        """(db_name, collection) -> estimated memory of every collection
+        some worker loaded and nobody released yet."""
+        loaded = {}
+        for field, mem_bytes in self.kv.hgetall(self.LOADED_KEY).items():
+            db_name, collection = field.split(":", 1)
+            loaded[(db_name, collection)] = int(mem_bytes or 0)
+        return loaded
+
+    def touch(self, db_name: str, collection: str, mem_bytes: int | None = None):
+        """Record an access and that the collection is loaded (e.g. after
+        ingestion loaded it)."""
+        key = (db_name, collection)
+        self.kv.set(self._access_key(key), str(time.time()), int(self.ttl * 4) or None)
+        self._start_sweeper()
+        with self._lock:
+            entry = self._loaded.setdefault(key, {"verified": time.monotonic(), "mem_bytes": 0})
+            if mem_bytes is not None:
+                entry["mem_bytes"] = mem_bytes
+            mem_bytes = entry["mem_bytes"]
+        self.kv.hset(self.LOADED_KEY, self._field(key), str(mem_bytes))
+
+    @contextmanager
+    def in_use(self, db_name: str, collection: str):
+        """Load the collection and keep it from being released by any
+        worker while the block (a query) runs."""
+        refs = f"{self.REFS_PREFIX}{self._field((db_name, collection))}"
+        self.kv.incr(refs, 1, self.REF_TTL_SECONDS)
+        try:
+            with span("collection.ensure_loaded"):
+                self.ensure_loaded(db_name, collection)
+            yield
+        finally:
+            if self.kv.incr(refs, -1, self.REF_TTL_SECONDS) <= 0:
+                self.kv.delete(refs)
+
+    def ensure_loaded(self, db_name: str, collection: str) -> bool:
+        """Make sure the collection is loaded; returns True if it had to be."""
+        key = (db_name, collection)
+        self.kv.set(self._access_key(key), str(time.time()), int(self.ttl * 4) or None)
+        self._start_sweeper()
+        with self._lock:
+            entry = self._loaded.get(key)
+            if entry is not None and time.monotonic() - entry["verified"] < self.verify_interval:
+                self.hits += 1
+                return False
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            loaded = self._is_loaded(key)
+            if not loaded:
+                started = time.perf_counter()
+                ok = False
+                try:
+                    self.milvus.collection(db_name, collection).load()
+                    ok = True
+                finally:
+                    self.cold_loads.add(time.perf_counter() - started, ok)
+                print(f"Loaded collection {db_name}.{collection} in {time.perf_counter() - started:.2f}s")
+            mem_bytes = self._memory(key)
+            with self._lock:
+                self._loaded[key] = {"verified": time.monotonic(), "mem_bytes": mem_bytes}
+                if loaded:
+                    self.hits += 1
+            self.kv.hset(self.LOADED_KEY, self._field(key), str(mem_bytes))
+        if not loaded:
+            self._enforce_budget(keep=key)
+        return not loaded
+
+    def release(self, db_name: str, collection: str):
+        key = (db_name, collection)
+        with self._lock:
+            self._loaded.pop(key, None)
+        self.kv.hdel(self.LOADED_KEY, self._field(key))
+        try:
+            self.milvus.collection(db_name, collection).release()
+            print(f"Released collection {db_name}.{collection}")
+        except Exception as exc:
+            print(f"Could not release {db_name}.{collection}: {exc}")
+
+    def _is_loaded(self, key: tuple) -> bool:
+        try:
+            state = self.milvus.call("load_state", key[0], utility.load_state, key[1])
+        except Exception:
+            return False
+        return getattr(state, "name", str(state)).endswith("Loaded")
+
+    def _memory(self, key: tuple) -> int:
+        try:
+            segments = self.milvus.call("segment_info", key[0], utility.get_query_segment_info, key[1])
+        except Exception:
+            return 0
+        return sum(getattr(segment, "mem_size", 0) or 0 for segment in segments)
+
+    def _enforce_budget(self, keep: tuple):
+        loaded = self.shared_loaded()
+        count = len(loaded)
+        memory = sum(loaded.values())
+        # least recently used (across workers) first
+        for key in sorted((k for k in loaded if k != keep), key=self.last_access):
+            over_count = count > self.max_loaded
+            over_memory = bool(self.memory_budget) and memory > self.memory_budget
+            if not (over_count or over_memory):
+                break
+            if self.references(key):
+                continue
+            self.release(*key)
+            count -= 1
+            memory -= loaded[key]
+            with self._lock:
+                self.budget_releases += 1
+
+    def sweep(self):
+        """Release collections nobody has used for ``ttl`` seconds."""
+        cutoff = time.time() - self.ttl
+        for key in self.shared_loaded():
+            if self.last_access(key) < cutoff and not self.references(key):
+                self.release(*key)
+                with self._lock:
+                    self.idle_releases += 1
+
+    def _start_sweeper(self):
+        if self._sweeper is not None or not self.ttl:
+            return
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="docslm-loads", daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self):
+        interval = max(min(self.ttl / 4, 60), 1)
+        while True:
+            time.sleep(interval)
+            try:
+                self.sweep()
+            except Exception as exc:
+                print(f"Collection sweep failed: {exc}")
+
+    def stats(self) -> dict:
+        now = time.time()
+        loaded = {
+            f"{db_name}.{collection}": {
+                "mem_bytes": mem_bytes,
+                "idle_seconds": round(now - self.last_access((db_name, collection)), 1),
+                "in_use": self.references((db_name, collection)),
+            }
+            for (db_name, collection), mem_bytes in self.shared_loaded().items()
+        }
+        with self._lock:
+            return {
+                "loaded": loaded,
+                "memory_bytes": sum(entry["mem_bytes"] for entry in loaded.values()),
+                "memory_budget": self.memory_budget,
+                "max_loaded": self.max_loaded,
+                "hits": self.hits,
+                "cold_loads": self.cold_loads.as_dict(),
+                "idle_releases": self.idle_releases,
+                "budget_releases": self.budget_releases,
+            }
+
+
+_LOAD_MANAGER = None
+_LOAD_MANAGER_LOCK = threading.Lock()
+
+
+def get_load_manager() -> LoadManager:
+    global _LOAD_MANAGER
+    if _LOAD_MANAGER is None:
+        with _LOAD_MANAGER_LOCK:
+            if _LOAD_MANAGER is None:
+                config = get_config()
+                _LOAD_MANAGER = LoadManager(
+                    get_milvus(config.uri),
+                    make_kv(config.redis_url),
+                    ttl=config.get("collection_idle_ttl", 1800),
+                    max_loaded=config.get("max_loaded_collections", 16),
+                    memory_budget=int(config.get("collection_memory_budget_mb", 0)) * 1024 * 1024,
+                )
+                register_stats("collection_loads", _LOAD_MANAGER.stats)
+    return _LOAD_MANAGER
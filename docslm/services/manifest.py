@@ -0,0 +1,78 @@
+import os
+import json
+import hashlib
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class Manifest:
+    """Per-collection record of ingested files: path -> hash, mtime, size, chunks.
+
+    Unchanged mtime and size are trusted without re-hashing, so a sync over
+    a large commessa only reads the files that were actually touched.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("files", {})
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"files": self.entries}, f)
+        os.replace(tmp, self.path)
+
+    def record(self, path: str, chunks: int, digest: str | None = None):
+        st = os.stat(path)
+        self.entries[path] = {
+            "hash": digest or file_hash(path),
+            "mtime": st.st_mtime,
+            "size": st.st_size,
+            "chunks": chunks,
+        }
+
+    def diff(self, files: list) -> dict:
+        """Compare ``files`` (the desired selection) with the recorded state.
+
+        Returns ``new``, ``changed``, ``removed`` and ``unchanged`` path lists
+        plus ``hashes`` (path -> digest) for every file that had to be read.
+        """
+        plan = {"new": [], "changed": [], "removed": [], "unchanged": [], "hashes": {}}
+        wanted = set()
+        for path in files:
+            wanted.add(path)
+            try:
+                st = os.stat(path)
+            except OSError:
+                # sparito dalla cartella commessa: trattato come rimosso
+                wanted.discard(path)
+                continue
+            entry = self.entries.get(path)
+            if entry is None:
+                plan["new"].append(path)
+                continue
+            if entry.get("mtime") == st.st_mtime and entry.get("size") == st.st_size:
+                plan["unchanged"].append(path)
+                continue
+            digest = file_hash(path)
+            plan["hashes"][path] = digest
+            if digest == entry.get("hash"):
+                # touched but identical: refresh mtime only
+                entry["mtime"] = st.st_mtime
+                plan["unchanged"].append(path)
+            else:
+                plan["changed"].append(path)
+        plan["removed"] = [path for path in self.entries if path not in wanted]
+        return plan
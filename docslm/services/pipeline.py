@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .conversions import get_conversion_cache
+from .process import Process
+from .tracing import span
+
+# Un Process (e quindi un DucklingGeneric) per processo worker
+_WORKER_PROCESS = None
+
+
+def _processor(conversions: dict | None) -> Process:
+    return Process(get_conversion_cache(**conversions) if conversions else None)
+
+
+def _init_worker(conversions: dict | None = None):
+    global _WORKER_PROCESS
+    _WORKER_PROCESS = _processor(conversions)
+
+
+def _convert(path: str, digest: str | None = None):
+    hits = _WORKER_PROCESS.cache_hits
+    hashes = {path: digest} if digest else {}
+    docs = _WORKER_PROCESS.process([path], hashes)
+    return path, docs, _WORKER_PROCESS.cache_hits - hits, hashes.get(path)
+
+
+class IngestCancelled(Exception):
+    pass
+
+
+class Checkpoint:
+    """Per-collection ingestion progress, stored as JSON lines.
+
+    The first line holds the full file list of the build, every following
+    line marks one file whose chunks are all inserted. The caller removes
+    the file (``complete``) once the build is searchable (indexes rebuilt,
+    collection loaded), so its presence means an interrupted build.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files = []
+        self.done = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # riga troncata da un'interruzione durante la scrittura
+                        continue
+                    if "files" in entry:
+                        self.files = entry["files"]
+                    elif "path" in entry:
+                        self.done[entry["path"]] = entry.get("chunks", 0)
+
+    @property
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def start(self, files: list):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.files = list(files)
+        self.done = {}
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"files": self.files}) + "\n")
+
+    def mark(self, path: str, chunks: int):
+        self.done[path] = chunks
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"path": path, "chunks": chunks}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def pending(self) -> list:
+        return [p for p in self.files if p not in self.done]
+
+    def complete(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class IngestPipeline:
+    """Convert files in a process pool and insert chunks in bounded batches.
+
+    At most two conversions per worker are queued at a time and each is
+    consumed as it finishes, so memory does not grow with the number of
+    files; chunks are buffered and sent
+    to ``store.add`` every ``batch_size`` chunks, and a file is checkpointed
+    only once all of its chunks are inserted. On resume, files that were
+    started but not checkpointed are cleared through ``delete_file(path)``
+    before being converted again.
+
+    ``on_batch(docs)`` is called after each ``store.add`` (for indexes
+    kept alongside the collection), ``on_file_done(path, chunks, digest)``
+    after each checkpoint (``digest`` is the file's sha256 when it was
+    already known or hashed for the conversion cache, else None), and
+    ``cancelled()`` is polled between conversions; when it returns True the
+    run stops with ``IngestCancelled`` and the checkpoint is kept. The
+    checkpoint is never completed here: the caller does it once the
+    inserted chunks are indexed and loaded.
+
+    ``conversions`` holds the ``get_conversion_cache`` arguments when
+    Duckling output is cached; ``hashes`` (path -> sha256, as computed by
+    the manifest diff) saves hashing those files again for the cache key.
+    Each file is hashed at most once per run.
+    """
+
+    def __init__(
+            self,
+            store,
+            checkpoint: Checkpoint,
+            workers: int | None = None,
+            batch_size: int = 256,
+            delete_file=None,
+            on_batch=None,
+            on_file_done=None,
+            cancelled=None,
+            conversions: dict | None = None,
+            hashes: dict | None = None,
+            ):
+        self.store = store
+        self.checkpoint = checkpoint
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.batch_size = batch_size
+        self.delete_file = delete_file
+        self.on_batch = on_batch
+        self.on_file_done = on_file_done
+        self.cancelled = cancelled
+        self.conversions = conversions
+        self.hashes = hashes or {}
+        self.stats = {}
+
+    def run(self, files: list | None = None) -> dict:
+        if files is not None:
+            self.checkpoint.start(files)
+        pending = self.checkpoint.pending()
+        resumed = len(self.checkpoint.done)
+        if resumed:
+            print(f"Resuming ingestion: {resumed} files already done, {len(pending)} pending")
+            if self.delete_file:
+                for path in pending:
+                    self.delete_file(path)
+
+        started = time.perf_counter()
+        buffer = []
+        # path -> [chunks not yet inserted, total chunks, digest]
+        outstanding = {}
+        files_done = 0
+        files_cached = 0
+        chunks_done = 0
+        # seconds spent waiting for conversions, in store.add and in on_batch
+        stages = {"convert": 0.0, "insert": 0.0, "on_batch": 0.0}
+
+        def flush():
+            nonlocal chunks_done
+            if buffer:
+                batch = list(buffer)
+                with span("ingest.insert") as insert:
+                    self.store.add(batch)
+                stages["insert"] += insert.seconds
+                if self.on_batch:
+                    with span("ingest.on_batch") as extra:
+                        self.on_batch(batch)
+                    stages["on_batch"] += extra.seconds
+                chunks_done += len(buffer)
+                buffer.clear()
+            for path in [p for p, (left, *_) in outstanding.items() if left == 0]:
+                _, chunks, digest = outstanding.pop(path)
+                self.checkpoint.mark(path, chunks)
+                if self.on_file_done:
+                    self.on_file_done(path, chunks, digest)
+
+        def consume(path, docs, digest):
+            nonlocal files_done
+            files_done += 1
+            outstanding[path] = [len(docs), len(docs), digest]
+            for doc in docs:
+                buffer.append(doc)
+                outstanding[path][0] -= 1
+                if len(buffer) >= self.batch_size:
+                    flush()
+            if not docs:
+                flush()
+
+        conversions = self._conversions(pending)
+        while True:
+            try:
+                with span("ingest.convert") as waited:
+                    path, docs, cached, digest = next(conversions)
+            except StopIteration:
+                break
+            stages["convert"] += waited.seconds
+            files_cached += cached
+            consume(path, docs, digest)
+        flush()
+
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.stats = {
+            "files": files_done,
+            "chunks": chunks_done,
+            "resumed_files": resumed,
+            "cached_files": files_cached,
+            "seconds": round(elapsed, 3),
+            "files_per_s": round(files_done / elapsed, 3),
+            "chunks_per_s": round(chunks_done / elapsed, 3),
+            "stages": {stage: round(seconds, 3) for stage, seconds in stages.items()},
+        }
+        print(
+            f"Ingested {files_done} files / {chunks_done} chunks in {elapsed:.1f}s "
+            f"({self.stats['files_per_s']} files/s, {self.stats['chunks_per_s']} chunks/s"
+            f"{f', {files_cached} from the conversion cache' if files_cached else ''})"
+        )
+        return self.stats
+
+    def _conversions(self, paths: list):
+        if not paths:
+            return
+        if self.workers <= 1 or len(paths) == 1:
+            processor = _processor(self.conversions)
+            for path in paths:
+                self._check_cancelled()
+                hits = processor.cache_hits
+                docs = processor.process([path], self.hashes)
+                yield path, docs, processor.cache_hits - hits, self.hashes.get(path)
+            return
+        workers = min(self.workers, len(paths))
+        # spawned, not forked: jobs run in threads of a process with grpc loaded
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(self.conversions,)) as pool:
+            # at most 2 conversions per worker in flight, so finished
+            # results wait in memory only until they are consumed
+            queued = list(reversed(paths))
+            running = set()
+            try:
+                while True:
+                    while queued and len(running) < 2 * workers:
+                        path = queued.pop()
+                        running.add(pool.submit(_convert, path, self.hashes.get(path)))
+                    if not running:
+                        return
+                    finished, running = wait(running, return_when=FIRST_COMPLETED)
+                    while finished:
+                        # drop each future once its result is handed over
+                        result = finished.pop().result()
+                        self._check_cancelled()
+                        yield result
+            finally:
+                for future in running:
+                    future.cancel()
+
+    def _check_cancelled(self):
+        if self.cancelled and self.cancelled():
+            raise IngestCancelled("Ingestion cancelled")
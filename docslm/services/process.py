@@ -1,18 +1,63 @@
+import os
+import sqlite3
+import hashlib
 from pathlib import Path
-from duckling.convert import DucklingGeneric
+
+from .manifest import file_hash
+
+
+def namespace_for(path: str) -> str:
+    """Namespace of the chunks of ``path``: its name plus a hash of the
+    path, so files with the same name in different folders (or with
+    different extensions) never share one."""
+    digest = hashlib.sha1(os.path.normpath(path).encode("utf-8")).hexdigest()[:12]
+    return f"{Path(path).stem}-{digest}"
 
 
 class Process:
-    def __init__(self):
-        self.duckling = DucklingGeneric()
+    """Duckling conversion of files into chunks.
+
+    With a ``ConversionCache`` the output of each file is looked up by
+    content hash first; Duckling is only loaded on the first miss, so a
+    fully cached run never starts the converter.
+    """
 
-    def process(self, paths: list):
+    def __init__(self, cache=None):
+        self.cache = cache
+        self._duckling = None
+        self.cache_hits = 0
+
+    @property
+    def duckling(self):
+        if self._duckling is None:
+            from duckling.convert import DucklingGeneric
+            self._duckling = DucklingGeneric()
+        return self._duckling
+
+    def process(self, paths: list, hashes: dict | None = None):
+        """Chunks of ``paths``. ``hashes`` (path -> sha256) supplies the
+        digests for the cache keys; the ones computed here are added to it."""
+        hashes = {} if hashes is None else hashes
         out = []
         for path in paths:
-            filename = Path(path).stem
-            docs = self.duckling.convert(
-                path,
-                namespace=filename,
-            )
+            namespace = namespace_for(path)
+            if self.cache is not None and not hashes.get(path):
+                hashes[path] = file_hash(path)
+            docs = self.convert(path, namespace, hashes.get(path))
             out.extend(docs)
         return out
+
+    def convert(self, path: str, namespace: str, digest: str | None = None) -> list:
+        if self.cache is None:
+            return self.duckling.convert(path, namespace=namespace)
+        key = self.cache.key(path, digest)
+        docs = self.cache.get(key, path, namespace)
+        if docs is not None:
+            self.cache_hits += 1
+            return docs
+        docs = self.duckling.convert(path, namespace=namespace)
+        try:
+            self.cache.put(key, path, namespace, docs)
+        except (OSError, sqlite3.Error) as exc:
+            print(f"Could not cache conversion of {path}: {exc}")
+        return docs
@@ -0,0 +1,130 @@
+import os
+import threading
+from collections import OrderedDict
+
+from .tracing import register_stats, traced
+
+
+class StorePool:
+    """Process-level, reference-counted ``Store`` instances.
+
+    Sessions on the same commessa/collection share one ``Store`` (and so
+    one embedding model client) keyed by (uri, database, collection,
+    embedding_model, k). When the last session releases a store it is kept
+    in a small idle LRU, so the next session on that collection reuses it
+    instead of loading it again.
+    """
+
+    def __init__(self, factory=None, max_idle: int = 8):
+        self.factory = factory or self._default_factory
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._stores = {}  # key -> [store, refcount]
+        self._keys = {}  # id(store) -> key
+        self._idle = OrderedDict()  # key -> None, released stores oldest first
+        self.created = 0
+        self.reused = 0
+
+    @staticmethod
+    def _default_factory(uri, database, collection, embedding_model, k):
+        from graphrag.store import Store
+        store = Store(
+            uri=uri,
+            database=database,
+            collection=collection,
+            k=k,
+            embedding_model=embedding_model,
+        )
+        _enable_hybrid(store, database, collection)
+        _trace_retrieval(store)
+        return store
+
+    def acquire(self, uri: str, database: str, collection: str, embedding_model: str, k: int):
+        key = (uri, database, collection, embedding_model, k)
+        with self._lock:
+            entry = self._stores.get(key)
+            if entry is not None:
+                entry[1] += 1
+                self._idle.pop(key, None)
+                self.reused += 1
+                return entry[0]
+        # build outside the lock: loading a store can take seconds
+        store = self.factory(*key)
+        with self._lock:
+            entry = self._stores.get(key)
+            if entry is not None:
+                # another thread won the race; use its instance
+                entry[1] += 1
+                self._idle.pop(key, None)
+                self.reused += 1
+                return entry[0]
+            self._stores[key] = [store, 1]
+            self._keys[id(store)] = key
+            self.created += 1
+            return store
+
+    def release(self, store):
+        with self._lock:
+            key = self._keys.get(id(store))
+            if key is None:
+                return
+            entry = self._stores[key]
+            entry[1] = max(entry[1] - 1, 0)
+            if entry[1] == 0:
+                self._idle[key] = None
+                while len(self._idle) > self.max_idle:
+                    old, _ = self._idle.popitem(last=False)
+                    dropped = self._stores.pop(old)
+                    self._keys.pop(id(dropped[0]), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "stores": len(self._stores),
+                "idle": len(self._idle),
+                "references": sum(refs for _, refs in self._stores.values()),
+                "created": self.created,
+                "reused": self.reused,
+            }
+
+
+def _enable_hybrid(store, database: str, collection: str):
+    """Fuse the store's dense results with the collection's BM25 index."""
+    from .config import get_config
+    from .sparse import get_sparse_index, install_hybrid_retrieval, sparse_index_path
+    from .store import get_manage_db
+
+    config = get_config()
+    if not config.get("hybrid_search", True):
+        return
+    path = sparse_index_path(get_manage_db().checkpoint_dir, database, collection)
+    if not os.path.exists(path):
+        # collection ingested before sparse indexes existed
+        return
+    install_hybrid_retrieval(
+        store,
+        get_sparse_index(path),
+        sparse_k=config.get("hybrid_sparse_k", config.k * 2),
+        rrf_k=config.get("hybrid_rrf_k", 60),
+    )
+
+
+def _trace_retrieval(store):
+    """Time the store's retrieval method (dense + sparse, if fused) as
+    the ``retrieval`` stage."""
+    from .sparse import RETRIEVAL_METHOD, retrieval_method
+    setattr(store, RETRIEVAL_METHOD, traced("retrieval", retrieval_method(store)))
+
+
+_STORE_POOL = None
+_STORE_POOL_LOCK = threading.Lock()
+
+
+def get_store_pool() -> StorePool:
+    global _STORE_POOL
+    if _STORE_POOL is None:
+        with _STORE_POOL_LOCK:
+            if _STORE_POOL is None:
+                _STORE_POOL = StorePool()
+                register_stats("store_pool", _STORE_POOL.stats)
+    return _STORE_POOL
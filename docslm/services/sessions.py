@@ -0,0 +1,252 @@
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+SESSION_TTL_SECONDS = 14 * 24 * 3600
+
+
+class LocalKV:
+    """In-process stand-in for Redis (single worker, dev setups)."""
+
+    name = "local"
+
+    def __init__(self):
+        self._data = {}
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires < time.time():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: str, ttl: int | None = None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1, ttl: int | None = None) -> int:
+        """Add ``amount`` to an integer value (0 if missing); returns the new value."""
+        with self._lock:
+            value, expires = self._data.get(key, ("0", None))
+            if expires is not None and expires < time.time():
+                value = "0"
+            value = str(int(value) + amount)
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+            return int(value)
+
+    def hset(self, key: str, field: str, value: str):
+        with self._lock:
+            self._hashes.setdefault(key, {})[field] = value
+
+    def hdel(self, key: str, field: str):
+        with self._lock:
+            self._hashes.get(key, {}).pop(field, None)
+
+    def hgetall(self, key: str) -> dict:
+        with self._lock:
+            return dict(self._hashes.get(key, {}))
+
+
+class RedisKV:
+    name = "redis"
+
+    def __init__(self, url: str):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+        self.redis.ping()
+
+    def get(self, key: str):
+        raw = self.redis.get(key)
+        return raw.decode() if raw is not None else None
+
+    def set(self, key: str, value: str, ttl: int | None = None):
+        self.redis.set(key, value, ex=ttl)
+
+    def delete(self, key: str):
+        self.redis.delete(key)
+
+    def incr(self, key: str, amount: int = 1, ttl: int | None = None) -> int:
+        pipe = self.redis.pipeline()
+        pipe.incrby(key, amount)
+        if ttl:
+            pipe.expire(key, ttl)
+        return int(pipe.execute()[0])
+
+    def hset(self, key: str, field: str, value: str):
+        self.redis.hset(key, field, value)
+
+    def hdel(self, key: str, field: str):
+        self.redis.hdel(key, field)
+
+    def hgetall(self, key: str) -> dict:
+        return {k.decode(): v.decode() for k, v in self.redis.hgetall(key).items()}
+
+
+def make_kv(redis_url: str | None):
+    if redis_url:
+        try:
+            return RedisKV(redis_url)
+        except Exception as exc:
+            print(f"Redis session store unavailable ({exc}), using in-process store")
+    return LocalKV()
+
+
+def session_cache(redis_url: str | None, max_entries: int = 10000) -> dict:
+    """Django CACHES entry for sessions: Redis if reachable, else the
+    local-memory cache (sessions then live only in this worker)."""
+    if redis_url:
+        try:
+            import redis
+            redis.Redis.from_url(redis_url, socket_connect_timeout=1).ping()
+            return {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                'LOCATION': redis_url,
+                'KEY_PREFIX': 'docslm',
+            }
+        except Exception as exc:
+            print(f"Redis session cache unavailable ({exc}), using local memory")
+    return {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'docslm-sessions',
+        # the default (300) would cull live sessions
+        'OPTIONS': {'MAX_ENTRIES': max_entries},
+    }
+
+
+class AgentRegistry:
+    """Session -> agent mapping that survives process boundaries.
+
+    What is persisted (in Redis, or the local stand-in) is only the agent
+    spec (commessa, collection, mode); live ``Agent`` objects are rebuilt
+    from the spec by ``factory`` on whichever worker serves the session,
+    and kept in a bounded per-process LRU with idle-timeout eviction. The
+    conversation memory lives in the GraphRAG instance, so a rebuilt agent
+    starts a new conversation. Every spec carries a version, so a notebook
+    change made on one worker invalidates live instances on the others.
+    ``on_release(agent)`` is called whenever a live instance is dropped.
+    """
+
+    PREFIX = "docslm:session:"
+
+    def __init__(self, kv, factory, max_live: int = 32, idle_timeout: float = 1800, on_release=None):
+        self.kv = kv
+        self.factory = factory
+        self.on_release = on_release
+        self.max_live = max_live
+        self.idle_timeout = idle_timeout
+        self._live = OrderedDict()  # session_key -> (version, agent, last_used)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _load(self, session_key: str):
+        raw = self.kv.get(self.PREFIX + session_key)
+        return json.loads(raw) if raw else None
+
+    def _save(self, session_key: str, record: dict):
+        self.kv.set(self.PREFIX + session_key, json.dumps(record), SESSION_TTL_SECONDS)
+
+    def activate(self, session_key: str, spec: dict):
+        """Store a new agent spec for the session and return its live agent."""
+        agent = self.factory(spec)
+        record = {"spec": spec, "version": uuid.uuid4().hex}
+        self._save(session_key, record)
+        self._remember(session_key, record["version"], agent)
+        return agent
+
+    def get(self, session_key: str):
+        """Live agent for the session, rebuilt from its spec if needed; None if unknown."""
+        record = self._load(session_key)
+        if record is None:
+            with self._lock:
+                entry = self._live.pop(session_key, None)
+            self._release([entry[1]] if entry else [])
+            return None
+        with self._lock:
+            released = self._sweep()
+            entry = self._live.get(session_key)
+            if entry is not None and entry[0] == record["version"]:
+                self._live[session_key] = (entry[0], entry[1], time.monotonic())
+                self._live.move_to_end(session_key)
+                self.hits += 1
+                agent = entry[1]
+            else:
+                self.misses += 1
+                agent = None
+        self._release(released)
+        if agent is not None:
+            return agent
+        agent = self.factory(record["spec"])
+        self._remember(session_key, record["version"], agent)
+        return agent
+
+    def spec(self, session_key: str):
+        record = self._load(session_key)
+        return record["spec"] if record else None
+
+    def drop(self, session_key: str):
+        self.kv.delete(self.PREFIX + session_key)
+        with self._lock:
+            entry = self._live.pop(session_key, None)
+        self._release([entry[1]] if entry else [])
+
+    def _remember(self, session_key: str, version: str, agent):
+        released = []
+        with self._lock:
+            previous = self._live.get(session_key)
+            if previous is not None and previous[1] is not agent:
+                released.append(previous[1])
+            self._live[session_key] = (version, agent, time.monotonic())
+            self._live.move_to_end(session_key)
+            while len(self._live) > self.max_live:
+                _, (_, evicted, _) = self._live.popitem(last=False)
+                released.append(evicted)
+                self.evictions += 1
+        self._release(released)
+
+    def _sweep(self) -> list:
+        """Drop idle live agents (lock held); returns them for release."""
+        released = []
+        if not self.idle_timeout:
+            return released
+        cutoff = time.monotonic() - self.idle_timeout
+        # entries are in LRU order, so the idle ones are at the front
+        while self._live:
+            key, (_, agent, last_used) = next(iter(self._live.items()))
+            if last_used >= cutoff:
+                break
+            del self._live[key]
+            released.append(agent)
+            self.evictions += 1
+        return released
+
+    def _release(self, agents: list):
+        if self.on_release:
+            for agent in agents:
+                self.on_release(agent)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": self.kv.name,
+                "live": len(self._live),
+                "max_live": self.max_live,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,232 @@
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import Counter
+
+from .tracing import span
+
+# Codes such as "EN 13445-3", "DWG-1020-A" or "PT.01/2" stay whole tokens;
+# their alphanumeric parts are indexed too, so partial codes still match.
+_TOKEN_RE = re.compile(r"\w+(?:[-./]\w+)*")
+_PART_RE = re.compile(r"[^\W_]+")
+
+# Italian and English function words: they match most chunks and carry no
+# signal, so they are dropped from queries
+STOPWORDS = frozenset("""
+a ad al alla alle allo agli ai anche c che chi ci con cosa come da dal dalla dalle
+dai degli dei del della delle dello di e ed gli ha i il in io l la le lo ma mi ne
+nei nel nella nelle nello no non o per piu può puo qual quale quali quando quanto
+se si sono su sul sulla sulle sui tra fra un una uno è
+an and are as at be by for from how in is it of on or the to what which with
+""".split())
+
+# Chunk rows plus an FTS5 index of their tokens (rowid = docs.id). FTS5 keeps
+# the tokens produced by ``tokenize`` whole: codes such as "13445-3" stay one
+# term next to their parts.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    text TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS docs_namespace ON docs (namespace);
+CREATE VIRTUAL TABLE IF NOT EXISTS terms USING fts5(tokens, tokenize="unicode61 tokenchars '-./_'");
+"""
+
+
+def tokenize(text: str) -> list:
+    tokens = []
+    for match in _TOKEN_RE.finditer((text or "").lower()):
+        token = match.group()
+        tokens.append(token)
+        parts = _PART_RE.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def doc_key(doc) -> str:
+    """Identity of a chunk across dense and sparse results."""
+    meta = _metadata(doc)
+    text = _text(doc)
+    return f"{meta.get('namespace', '')}:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+
+
+def _text(doc) -> str:
+    return doc.get("page_content", "") if isinstance(doc, dict) else getattr(doc, "page_content", "")
+
+
+def _metadata(doc) -> dict:
+    meta = doc.get("metadata") if isinstance(doc, dict) else getattr(doc, "metadata", None)
+    return meta if isinstance(meta, dict) else {}
+
+
+class SparseIndex:
+    """Per-collection BM25 keyword index stored in SQLite (FTS5).
+
+    Chunks are added in the same batches that are inserted into Milvus and
+    removed by namespace alongside them, so the index always mirrors the
+    collection's chunks. Scoring is FTS5's ``bm25()``, so a query costs a
+    posting-list merge inside SQLite rather than a Python loop per posting.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._migrate()
+        self._db.commit()
+
+    def _migrate(self):
+        """Move an index built with the old postings table to FTS5."""
+        if not self._db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'postings'").fetchone():
+            return
+        print(f"Rebuilding keyword index {self.path} with FTS5")
+        self._db.execute("DELETE FROM terms")
+        self._db.executemany(
+            "INSERT INTO terms (rowid, tokens) VALUES (?, ?)",
+            ((doc, " ".join(tokenize(text))) for doc, text in self._db.execute("SELECT id, text FROM docs")),
+        )
+        self._db.execute("DROP TABLE postings")
+
+    def add(self, docs: list):
+        with self._lock:
+            for doc in docs:
+                meta = _metadata(doc)
+                if meta.get("type") == "placeholder":
+                    continue
+                tokens = tokenize(_text(doc))
+                cursor = self._db.execute(
+                    "INSERT INTO docs (namespace, text, metadata, length) VALUES (?, ?, ?, ?)",
+                    (str(meta.get("namespace", "")), _text(doc), json.dumps(meta, default=str), len(tokens)),
+                )
+                self._db.execute(
+                    "INSERT INTO terms (rowid, tokens) VALUES (?, ?)", (cursor.lastrowid, " ".join(tokens)))
+            self._db.commit()
+
+    def delete_namespace(self, namespace: str, path: str | None = None):
+        """Remove the chunks of ``namespace`` (only those of ``path``, if given)."""
+        where, params = "namespace = ?", (namespace,)
+        if path is not None:
+            where, params = "namespace = ? AND json_extract(metadata, '$.path') = ?", (namespace, path)
+        with self._lock:
+            self._db.execute(f"DELETE FROM terms WHERE rowid IN (SELECT id FROM docs WHERE {where})", params)
+            self._db.execute(f"DELETE FROM docs WHERE {where}", params)
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM terms")
+            self._db.execute("DELETE FROM docs")
+            self._db.commit()
+
+    def search(self, query: str, k: int = 10) -> list:
+        """Top ``k`` chunks as (score, {"page_content", "metadata"}), best first."""
+        terms = [t for t in dict.fromkeys(tokenize(query)) if t not in STOPWORDS]
+        if not terms:
+            return []
+        match = " OR ".join('"%s"' % term.replace('"', '""') for term in terms)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT bm25(terms), d.text, d.metadata FROM terms JOIN docs d ON d.id = terms.rowid "
+                "WHERE terms MATCH ? ORDER BY bm25(terms) LIMIT ?",
+                (match, k),
+            ).fetchall()
+        # bm25() is lower-is-better
+        return [(-score, {"page_content": text, "metadata": json.loads(meta)}) for score, text, meta in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+
+def rrf_fuse(rankings: list, k: int = 60, limit: int | None = None) -> list:
+    """Reciprocal-rank fusion of several ranked lists of chunks; the first
+    occurrence of each chunk (by ``doc_key``) is the one returned."""
+    scores = Counter()
+    first = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            key = doc_key(doc)
+            scores[key] += 1.0 / (k + rank + 1)
+            first.setdefault(key, doc)
+    return [first[key] for key, _ in scores.most_common(limit)]
+
+
+class HybridRetrieval:
+    """Wraps the store's retrieval method so dense results are fused with
+    BM25 hits before GraphRAG reranks them."""
+
+    def __init__(self, method, index: SparseIndex, sparse_k: int = 8, rrf_k: int = 60, to_document=None):
+        self.method = method
+        self.index = index
+        self.sparse_k = sparse_k
+        self.rrf_k = rrf_k
+        self.to_document = to_document or (lambda d: d)
+
+    def __call__(self, query, *args, **kwargs):
+        with span("retrieval.dense"):
+            dense = self.method(query, *args, **kwargs)
+        if not isinstance(query, str) or not isinstance(dense, list):
+            return dense
+        try:
+            with span("retrieval.sparse"):
+                sparse = [self.to_document(doc) for _, doc in self.index.search(query, self.sparse_k)]
+        except Exception as exc:
+            print(f"Sparse retrieval failed, using dense results only: {exc}")
+            return dense
+        # keep every dense candidate; add keyword-only hits for the reranker
+        return rrf_fuse([dense, sparse], k=self.rrf_k, limit=len(dense) + self.sparse_k)
+
+
+# The one Store method GraphRAG retrieves chunks through
+RETRIEVAL_METHOD = "search"
+
+
+def retrieval_method(store):
+    """``store.search``; raises if the installed graphrag Store has none."""
+    method = getattr(store, RETRIEVAL_METHOD, None)
+    if not callable(method):
+        raise RuntimeError(
+            f"{type(store).__name__} has no {RETRIEVAL_METHOD}() method: the installed graphrag "
+            f"is not supported by hybrid search and retrieval tracing")
+    return method
+
+
+def install_hybrid_retrieval(store, index: SparseIndex, sparse_k: int = 8, rrf_k: int = 60):
+    """Wrap the store's retrieval entry point with ``HybridRetrieval``."""
+    try:
+        from langchain_core.documents import Document
+        to_document = lambda d: Document(page_content=d["page_content"], metadata=d["metadata"])
+    except ImportError:
+        to_document = None
+    method = retrieval_method(store)
+    if not isinstance(method, HybridRetrieval):
+        setattr(store, RETRIEVAL_METHOD, HybridRetrieval(method, index, sparse_k, rrf_k, to_document))
+
+
+def sparse_index_path(checkpoint_dir: str, db_name: str, collection: str) -> str:
+    return os.path.join(checkpoint_dir, db_name, f"{collection}.bm25.sqlite3")
+
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_sparse_index(path: str) -> SparseIndex:
+    index = _INDEXES.get(path)
+    if index is None:
+        with _INDEXES_LOCK:
+            index = _INDEXES.get(path)
+            if index is None:
+                index = _INDEXES[path] = SparseIndex(path)
+    return index
@@ -1,66 +1,205 @@
+import os
 import json
-import yaml
-
-from graphrag.store import (
-    Store,
-    list_collections,
-    list_databases,
-    create_database
-)
+from pathlib import Path
+
+from graphrag.store import Store
 from langchain_core.documents import Document
-from pymilvus import Collection, MilvusException, connections, db, utility
-from .process import Process
+from pymilvus import MilvusException
+from .answers import invalidate_collection
+from .bulk import DeferredIndexes
+from .config import DocsConfig, get_config
+from .connections import get_milvus
+from .embeddings import EmbeddingCache, install_cached_embeddings
+from .loads import get_load_manager
+from .manifest import Manifest
+from .pipeline import Checkpoint, IngestPipeline
+from .process import namespace_for
+from .sparse import get_sparse_index, sparse_index_path
+from .tracing import span
 
 class ManageDB:
-    def __init__(self, config: str):
-        with open(config, "r") as f:
-            self.config = yaml.safe_load(f)
+    def __init__(self, config: str | None = None):
+        self.config_path = config
+        self.ingest_stats = None
+
+    @property
+    def config(self) -> DocsConfig:
+        # re-read through the shared loader so edits are picked up
+        return get_config(self.config_path)
+
+    @property
+    def checkpoint_dir(self) -> str:
+        config = self.config
+        return config.checkpoints or os.path.join(os.path.dirname(config.source), ".cache", "ingest")
+
+    @property
+    def milvus(self):
+        return get_milvus(self.config.uri)
     
     def list_databases(self):
-        return list_databases(self.config.get("uri"))
+        return self.milvus.list_databases()
     
     def list_collections(self, database: str):
         db_name = f"comm_{database}"
-        return list_collections(self.config.get("uri"), db_name)
+        return self.milvus.list_collections(db_name)
     
     def create_database(self, database: str):
         db_name = f"comm_{database}"
-        return create_database(self.config.get("uri"), db_name)
+        return self.milvus.ensure_database(db_name)
     
     def create_collection(
             self,
             database: str,
             collection: str,
-            files: list = None
+            files: list = None,
+            on_file_done=None,
+            cancelled=None,
             ):
-        uri = self.config.get("uri")
         db_name = f"comm_{database}"
+        self.milvus.ensure_database(db_name)
 
-        # Connect to Milvus
-        host = uri.split("://")[1].split(":")[0]
-        port = int(uri.split(":")[-1])
-        connections.connect(host=host, port=port)
-
-        # Ensure database exists
-        if db_name not in db.list_database():
-            db.create_database(db_name)
-        db.using_database(db_name)
+        checkpoint = Checkpoint(self.checkpoint_path(database, collection))
 
-        # Skip if collection already exists
-        existing_collections = utility.list_collections()
+        # Skip if collection already exists, unless a previous build was interrupted;
+        # returns False when there was nothing to do
+        existing_collections = self.milvus.list_collections(db_name)
         if collection in existing_collections:
+            if not checkpoint.exists:
+                # a build that died after its checkpoint but before the
+                # deferred indexes were rebuilt
+                return self._restore_indexes(db_name, collection, checkpoint)
+            try:
+                self._ingest(self._store(db_name, collection), db_name, collection, checkpoint,
+                             manifest=Manifest(self.manifest_path(database, collection)),
+                             files=list(checkpoint.files),
+                             bulk=bool(self.config.get("bulk_load", True)),
+                             on_file_done=on_file_done, cancelled=cancelled)
+            except MilvusException as exc:
+                raise RuntimeError(f"Failed to resume collection {collection}: {exc}") from exc
             return True
 
         # Initialize store to leverage existing schema creation
-        store = Store(
-            uri=uri,
-            database=db_name,
-            collection=collection,
-            k=self.config.get("k", 4),
-            embedding_model=self.config.get("embedding_model"),
-        )
+        store = self._store(db_name, collection)
+        sparse = self.sparse_index(db_name, collection)
+        if sparse is not None:
+            # left over from a collection dropped outside the app
+            sparse.clear()
+
+        try:
+            if files and self.config.get("bulk_load", True):
+                # the first batch creates the collection; no placeholder cycle
+                print(f"Bulk loading {len(files)} files...")
+                checkpoint.start(files)
+                self._ingest(store, db_name, collection, checkpoint,
+                             manifest=Manifest(self.manifest_path(database, collection)),
+                             files=files, bulk=True,
+                             on_file_done=on_file_done, cancelled=cancelled)
+                return True
+
+            collection_obj = self._create_empty(store, db_name, collection)
+
+            # Save selected files as collection properties
+            if files:
+                collection_obj.set_properties({"files": json.dumps(files)})
+            collection_obj.release()
+            
+            # Process and add documents if files are provided
+            if files:
+                print(f"Processing {len(files)} files...")
+                checkpoint.start(files)
+                self._ingest(store, db_name, collection, checkpoint,
+                             manifest=Manifest(self.manifest_path(database, collection)),
+                             on_file_done=on_file_done, cancelled=cancelled)
+
+        except MilvusException as exc:
+            raise RuntimeError(f"Failed to create collection {collection}: {exc}") from exc
+
+        return True
+
+    def sync_collection(
+            self,
+            database: str,
+            collection: str,
+            files: list = None,
+            on_plan=None,
+            on_file_done=None,
+            cancelled=None,
+            ) -> dict:
+        """Bring an existing collection in line with ``files`` (default: its
+        current selection), converting only new or changed files and deleting
+        the chunks of removed ones by namespace (see ``namespace_for``)."""
+        db_name = f"comm_{database}"
+        self.milvus.ensure_database(db_name)
+
+        if collection not in self.milvus.list_collections(db_name):
+            if on_plan:
+                on_plan({"new": list(files or []), "changed": [], "removed": [], "unchanged": [], "hashes": {}})
+            self.create_collection(database, collection, files=files,
+                                   on_file_done=on_file_done, cancelled=cancelled)
+            return {"created": True, "new": len(files or []), "changed": 0, "removed": 0, "unchanged": 0}
+
+        collection_obj = self.milvus.collection(db_name, collection)
+        properties = collection_obj.describe().get("properties", {})
+        try:
+            current = json.loads(properties.get("files", "[]"))
+        except ValueError:
+            current = []
+        if files is None:
+            files = current
 
-        # Seed the collection with a placeholder document to trigger creation
+        manifest = Manifest(self.manifest_path(database, collection))
+        plan = manifest.diff(files)
+        if not manifest.entries:
+            # collection built before manifests existed: its files are already
+            # indexed under unknown hashes, so they must be replaced, not added
+            legacy = set(current)
+            present = set(plan["new"])
+            plan["changed"] += [p for p in plan["new"] if p in legacy]
+            plan["new"] = [p for p in plan["new"] if p not in legacy]
+            # deselected, or gone from disk, since the last build
+            plan["removed"] = [p for p in dict.fromkeys(current) if p not in present]
+        if on_plan:
+            on_plan(plan)
+
+        try:
+            stale = plan["removed"] + plan["changed"]
+            if stale:
+                collection_obj.load()
+                sparse = self.sparse_index(db_name, collection)
+                for path in stale:
+                    self._delete_file(collection_obj, sparse, path)
+                    manifest.entries.pop(path, None)
+                collection_obj.flush()
+                invalidate_collection(db_name, collection)
+            manifest.save()
+
+            # selected files still on disk (missing ones are dropped by the diff)
+            kept = set(plan["new"] + plan["changed"] + plan["unchanged"])
+            collection_obj.set_properties({"files": json.dumps([p for p in dict.fromkeys(files) if p in kept])})
+
+            to_ingest = plan["new"] + plan["changed"]
+            if to_ingest:
+                print(f"Sync {collection}: {len(plan['new'])} new, {len(plan['changed'])} changed, "
+                      f"{len(plan['removed'])} removed, {len(plan['unchanged'])} unchanged")
+                checkpoint = Checkpoint(self.checkpoint_path(database, collection))
+                checkpoint.start(to_ingest)
+                self._ingest(self._store(db_name, collection), db_name, collection, checkpoint,
+                             manifest=manifest, hashes=plan["hashes"],
+                             on_file_done=on_file_done, cancelled=cancelled)
+        except MilvusException as exc:
+            raise RuntimeError(f"Failed to sync collection {collection}: {exc}") from exc
+
+        return {
+            "created": False,
+            "new": len(plan["new"]),
+            "changed": len(plan["changed"]),
+            "removed": len(plan["removed"]),
+            "unchanged": len(plan["unchanged"]),
+        }
+
+    def _create_empty(self, store: Store, db_name: str, collection: str):
+        """Create the collection through a placeholder insert/delete, for
+        builds with nothing to load; returns the (loaded) collection."""
         placeholder = Document(
             page_content="__placeholder__",
             metadata={
@@ -72,38 +211,205 @@ class ManageDB:
                 "page_end": "N/A",
             },
         )
+        store.add([placeholder])
+        collection_obj = self.milvus.collection(db_name, collection)
+        collection_obj.flush()
+        collection_obj.load()
+        collection_obj.delete(expr='namespace == "__init__"')
+        collection_obj.flush()
+        return collection_obj
 
+    def _store(self, db_name: str, collection: str) -> Store:
+        return Store(
+            uri=self.config.uri,
+            database=db_name,
+            collection=collection,
+            k=self.config.k,
+            embedding_model=self.config.embedding_model,
+        )
+
+    def sparse_index(self, db_name: str, collection: str):
+        """BM25 index kept alongside the collection, or None if disabled."""
+        if not self.config.get("hybrid_search", True):
+            return None
+        return get_sparse_index(sparse_index_path(self.checkpoint_dir, db_name, collection))
+
+    def checkpoint_path(self, database: str, collection: str) -> str:
+        return os.path.join(self.checkpoint_dir, f"comm_{database}", f"{collection}.jsonl")
+
+    def manifest_path(self, database: str, collection: str) -> str:
+        return os.path.join(self.checkpoint_dir, f"comm_{database}", f"{collection}.manifest.json")
+
+    def _ingest(
+            self,
+            store: Store,
+            db_name: str,
+            collection: str,
+            checkpoint: Checkpoint,
+            manifest: Manifest = None,
+            hashes: dict = None,
+            files: list = None,
+            bulk: bool = False,
+            on_file_done=None,
+            cancelled=None,
+            ) -> dict:
+        """Run the ingestion pipeline into ``collection``.
+
+        With ``bulk`` the collection's indexes are dropped after the first
+        batch and rebuilt once, after the final flush (also when the run
+        fails or is cancelled). ``files``, if given, is stored as the
+        collection's file list once the load completes. The checkpoint is
+        completed only after that, so a crash in between is resumed.
+        """
+        indexes = self._deferred_indexes(db_name, collection, checkpoint)
+        # a bulk load killed before its indexes were rebuilt
+        indexes.restore()
+
+        def file_done(path: str, chunks: int, digest: str | None):
+            if manifest is not None:
+                # hashed once, for the conversion cache key or the manifest diff
+                manifest.record(path, chunks, digest=digest)
+                manifest.save()
+            if on_file_done:
+                on_file_done(path, chunks)
+
+        sparse = self.sparse_index(db_name, collection)
+
+        def delete_file(path: str):
+            collection_obj = self.milvus.collection(db_name, collection)
+            collection_obj.load()
+            self._delete_file(collection_obj, sparse, path)
+
+        def on_batch(docs: list):
+            if sparse is not None:
+                sparse.add(docs)
+            if bulk and not indexes.pending:
+                # the collection (and its index) exists once a batch is in
+                indexes.defer()
+
+        embedder = self._cache_embeddings(store)
+        pipeline = IngestPipeline(
+            store,
+            checkpoint,
+            workers=self.config.ingest_workers,
+            batch_size=self.config.ingest_batch_size,
+            delete_file=delete_file,
+            on_batch=on_batch,
+            on_file_done=file_done,
+            cancelled=cancelled,
+            conversions=self._conversion_cache(),
+            hashes=hashes,
+        )
         try:
-            store.add([placeholder])
-            collection_obj = Collection(collection)
+            stats = pipeline.run()
+        except BaseException:
+            try:
+                indexes.restore()
+            except Exception as exc:
+                print(f"Could not rebuild indexes of {collection}: {exc}")
+            raise
+        if embedder is not None:
+            stats["embeddings"] = embedder.stats()
+            if stats.get("chunks") and not embedder.texts:
+                # the store embedded through another client than the one wrapped
+                print(f"Store did not embed through the cached client, "
+                      f"embedding cache bypassed for {collection}")
+            print(f"Embeddings: {stats['embeddings']['texts']} chunks, "
+                  f"{stats['embeddings']['embedded']} embedded, "
+                  f"dedupe ratio {stats['embeddings']['dedupe_ratio']:.1%}")
+
+        if collection not in self.milvus.list_collections(db_name):
+            # nothing was inserted, so no batch created the collection
+            self._create_empty(store, db_name, collection)
+
+        # Flush, rebuild deferred indexes and load to make documents visible
+        stages = stats.setdefault("stages", {})
+        collection_obj = self.milvus.collection(db_name, collection)
+        with span("ingest.flush") as flush:
             collection_obj.flush()
+        stages["flush"] = round(flush.seconds, 3)
+        indexes.restore()
+        stages.update(indexes.timings)
+        if files is not None:
+            collection_obj.set_properties({"files": json.dumps(files)})
+        with span("ingest.load") as load:
             collection_obj.load()
-            collection_obj.delete(expr='namespace == "__init__"')
-            collection_obj.flush()
-            
-            # Save selected files as collection properties
-            if files:
-                collection_obj.set_properties({"files": json.dumps(files)})
-            collection_obj.release()
-            
-            # Process and add documents if files are provided
-            if files:
-                print(f"Processing {len(files)} files...")
-                processor = Process()
-                docs = processor.process(files)
-                print(f"Processed {len(docs)} documents")
-                
-                # Add processed documents to the store
-                store.add(docs)
-                print(f"Added {len(docs)} documents to collection {collection}")
-                
-                # Flush and load collection to make documents visible
-                collection_obj = Collection(collection)
-                collection_obj.flush()
-                collection_obj.load()
-                print(f"Collection {collection} flushed and loaded")
-            
-        except MilvusException as exc:
-            raise RuntimeError(f"Failed to create collection {collection}: {exc}") from exc
+        stages["load"] = round(load.seconds, 3)
+        # loaded by the build: let the load manager release it once idle
+        get_load_manager().touch(db_name, collection)
+        checkpoint.complete()
+        self.ingest_stats = stats
+        # answers cached against the previous contents are now stale
+        invalidate_collection(db_name, collection)
+        print(f"Collection {collection} flushed and loaded "
+              f"({', '.join(f'{k} {v:.1f}s' for k, v in stages.items())})")
+        return stats
+
+    @staticmethod
+    def _delete_file(collection_obj, sparse, path: str):
+        """Delete the chunks of ``path``: its own namespace, plus the chunks
+        it left under its bare file name before namespaces were per path."""
+        namespace, legacy = namespace_for(path), Path(path).stem
+        collection_obj.delete(
+            expr=f"namespace == {json.dumps(namespace)} or "
+                 f"(namespace == {json.dumps(legacy)} and path == {json.dumps(path)})")
+        if sparse is not None:
+            sparse.delete_namespace(namespace)
+            sparse.delete_namespace(legacy, path=path)
 
+    def _deferred_indexes(self, db_name: str, collection: str, checkpoint: Checkpoint) -> DeferredIndexes:
+        return DeferredIndexes(self.milvus, db_name, collection,
+                               os.path.splitext(checkpoint.path)[0] + ".indexes.json")
+
+    def _restore_indexes(self, db_name: str, collection: str, checkpoint: Checkpoint) -> bool:
+        """Rebuild indexes left dropped by an interrupted bulk load and load
+        the collection; False if there was nothing to restore."""
+        indexes = self._deferred_indexes(db_name, collection, checkpoint)
+        if not indexes.pending:
+            return False
+        print(f"Rebuilding the indexes of {collection} left by an interrupted bulk load")
+        try:
+            indexes.restore()
+            collection_obj = self.milvus.collection(db_name, collection)
+            collection_obj.load()
+        except MilvusException as exc:
+            raise RuntimeError(f"Failed to rebuild indexes of {collection}: {exc}") from exc
+        get_load_manager().touch(db_name, collection)
         return True
+
+    def _cache_embeddings(self, store: Store):
+        """Route the store's document embeddings through the shared cache."""
+        config = self.config
+        if not config.get("embedding_cache", True):
+            return None
+        path = os.path.join(self.checkpoint_dir, "embeddings.sqlite3")
+        cache = _EMBEDDING_CACHES.get(path)
+        if cache is None:
+            cache = _EMBEDDING_CACHES.setdefault(path, EmbeddingCache(path))
+        embedder = install_cached_embeddings(
+            store, cache, config.embedding_model or "", config.get("embedding_batch_size", 256))
+        return embedder
+
+    def _conversion_cache(self) -> dict | None:
+        """Arguments of the Duckling conversion cache (shared by every
+        collection and passed to the ingestion workers), or None."""
+        config = self.config
+        if not config.get("conversion_cache", True):
+            return None
+        return {
+            "directory": os.path.join(self.checkpoint_dir, "conversions"),
+            "max_bytes": int(config.get("conversion_cache_max_mb", 4096)) * 1024 * 1024,
+            "salt": str(config.get("conversion_cache_version", "")),
+        }
+
+
+_EMBEDDING_CACHES = {}
+_MANAGERS = {}
+
+
+def get_manage_db(config: str | None = None) -> ManageDB:
+    """Shared ManageDB for ``config`` (read-only listing paths reuse one instance)."""
+    manager = _MANAGERS.get(config)
+    if manager is None:
+        manager = _MANAGERS.setdefault(config, ManageDB(config))
+    return manager
@@ -0,0 +1,226 @@
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Seconds; chat requests spend most of their time in the LLM, so the upper
+# buckets go well beyond the usual web defaults.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+
+# Spans of the request being served (a list shared with worker threads
+# through copied contexts), or None outside a request.
+_TRACE = contextvars.ContextVar("docslm_trace", default=None)
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram, one series per label tuple."""
+
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, labels: tuple, seconds: float):
+        slot = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[slot] += 1
+            series[-1] += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+
+
+class Metrics:
+    """Process-wide request and stage measurements."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Histogram()  # (method, endpoint, status)
+        self.stages = Histogram()  # (stage,)
+        self.stage_errors = {}  # stage -> count
+        self.in_flight = {}  # endpoint -> count
+        self.providers = {}  # component -> stats() callable
+
+    def request_started(self, endpoint: str):
+        with self._lock:
+            self.in_flight[endpoint] = self.in_flight.get(endpoint, 0) + 1
+
+    def request_finished(self, method: str, endpoint: str, status: int, seconds: float):
+        with self._lock:
+            self.in_flight[endpoint] = max(self.in_flight.get(endpoint, 0) - 1, 0)
+        self.requests.observe((method, endpoint, str(status)), seconds)
+
+    def stage(self, name: str, seconds: float, ok: bool = True):
+        self.stages.observe((name,), seconds)
+        if not ok:
+            with self._lock:
+                self.stage_errors[name] = self.stage_errors.get(name, 0) + 1
+
+
+_METRICS = Metrics()
+
+
+def get_metrics() -> Metrics:
+    return _METRICS
+
+
+def register_stats(component: str, provider):
+    """Expose ``provider()`` (a component's ``stats`` method) on /api/metrics/."""
+    _METRICS.providers[component] = provider
+
+
+class Span:
+    __slots__ = ("name", "started", "seconds", "ok")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+        self.ok = True
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+        _METRICS.stage(self.name, self.seconds, self.ok)
+        trace = _TRACE.get()
+        if trace is not None:
+            trace.append((self.name, self.seconds))
+
+
+@contextmanager
+def span(name: str):
+    """Time a stage: ``with span("retrieval.dense") as s: ...``; the
+    duration is in ``s.seconds`` afterwards."""
+    current = Span(name)
+    try:
+        yield current
+    except BaseException:
+        current.ok = False
+        raise
+    finally:
+        current.finish()
+
+
+def traced(name: str, fn):
+    """``fn`` wrapped in a span named ``name``."""
+    def wrapper(*args, **kwargs):
+        with span(name):
+            return fn(*args, **kwargs)
+    wrapper.__wrapped__ = fn
+    return wrapper
+
+
+def start_trace():
+    """Start collecting the spans of the current request; returns
+    (spans, token) — pass the token to ``end_trace``."""
+    spans = []
+    return spans, _TRACE.set(spans)
+
+
+def end_trace(token):
+    _TRACE.reset(token)
+
+
+def breakdown(spans: list) -> dict:
+    """Total seconds per stage name, in first-seen order."""
+    totals = {}
+    for name, seconds in spans:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return totals
+
+
+# -- Prometheus text format ------------------------------------------------------
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _histogram(lines: list, name: str, help_text: str, label_names: tuple, histogram: Histogram):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for values, series in sorted(histogram.snapshot().items()):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + (float("inf"),), series[:-1]):
+            cumulative += count
+            le = 'le="%s"' % _number(bound)
+            lines.append(f"{name}_bucket{_labels(label_names, values, le)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(label_names, values)} {_number(round(series[-1], 6))}")
+        lines.append(f"{name}_count{_labels(label_names, values)} {cumulative}")
+
+
+def _flatten(prefix: str, value, out: list):
+    if isinstance(value, bool):
+        out.append((prefix, int(value)))
+    elif isinstance(value, (int, float)):
+        out.append((prefix, value))
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(f"{prefix}.{key}" if prefix else str(key), item, out)
+
+
+def render_prometheus(metrics: Metrics | None = None) -> str:
+    metrics = metrics or _METRICS
+    lines = []
+    _histogram(lines, "docslm_http_request_duration_seconds",
+               "Request latency by endpoint (streams: until the last event).",
+               ("method", "endpoint", "status"), metrics.requests)
+    lines.append("# HELP docslm_http_requests_in_flight Requests being served.")
+    lines.append("# TYPE docslm_http_requests_in_flight gauge")
+    with metrics._lock:
+        in_flight = sorted(metrics.in_flight.items())
+        stage_errors = sorted(metrics.stage_errors.items())
+        providers = sorted(metrics.providers.items())
+    for endpoint, count in in_flight:
+        lines.append(f'docslm_http_requests_in_flight{{endpoint="{_escape(endpoint)}"}} {count}')
+
+    _histogram(lines, "docslm_stage_duration_seconds",
+               "Time spent per stage (retrieval, agent run, ingestion steps...).",
+               ("stage",), metrics.stages)
+    lines.append("# HELP docslm_stage_errors_total Stages that raised.")
+    lines.append("# TYPE docslm_stage_errors_total counter")
+    for stage, count in stage_errors:
+        lines.append(f'docslm_stage_errors_total{{stage="{_escape(stage)}"}} {count}')
+
+    hit_ratios, values = [], []
+    for component, provider in providers:
+        try:
+            stats = provider()
+        except Exception as exc:
+            print(f"Metrics: stats of {component} failed: {exc}")
+            continue
+        flat = []
+        _flatten("", stats, flat)
+        values.extend((component, key, value) for key, value in flat)
+        if "hit_rate" in stats:
+            hit_ratios.append((component, stats["hit_rate"]))
+        elif isinstance(stats.get("hits"), int) and isinstance(stats.get("misses"), int):
+            lookups = stats["hits"] + stats["misses"]
+            hit_ratios.append((component, round(stats["hits"] / lookups, 4) if lookups else 0.0))
+
+    lines.append("# HELP docslm_cache_hit_ratio Hits over lookups since start, per cache.")
+    lines.append("# TYPE docslm_cache_hit_ratio gauge")
+    for component, ratio in hit_ratios:
+        lines.append(f'docslm_cache_hit_ratio{{cache="{_escape(component)}"}} {_number(ratio)}')
+    lines.append("# HELP docslm_component_stat Numeric values reported by each component's stats().")
+    lines.append("# TYPE docslm_component_stat gauge")
+    for component, key, value in values:
+        lines.append(f'docslm_component_stat{{component="{_escape(component)}",'
+                     f'key="{_escape(key)}"}} {_number(value)}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,82 @@
+"""Installation of the ingestion embedding cache on the Store's client.
+
+Run from the project directory: ``python -m unittest discover tests``.
+"""
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from services.embeddings import CachedEmbeddings, EmbeddingCache, install_cached_embeddings
+
+
+class _Client:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text))]
+
+
+class _Store:
+    def __init__(self):
+        self.embeddings = _Client()
+
+
+class _ReadOnlyStore:
+    def __init__(self):
+        self._client = _Client()
+
+    @property
+    def embeddings(self):
+        return self._client
+
+
+class InstallCachedEmbeddingsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.cache = EmbeddingCache(os.path.join(self.tmp, "embeddings.sqlite3"))
+        self.addCleanup(self.cache.close)
+
+    def install(self, store):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            wrapper = install_cached_embeddings(store, self.cache, "model")
+        return wrapper, out.getvalue()
+
+    def test_wraps_the_store_client(self):
+        store = _Store()
+        client = store.embeddings
+        wrapper, _ = self.install(store)
+        self.assertIs(store.embeddings, wrapper)
+        self.assertIs(wrapper.inner, client)
+        store.embeddings.embed_documents(["a", "b", "a"])
+        store.embeddings.embed_documents(["b"])
+        self.assertEqual(client.calls, 1)
+        self.assertEqual(wrapper.stats()["embedded"], 2)
+        # installing again keeps the same wrapper
+        self.assertIs(self.install(store)[0], wrapper)
+
+    def test_missing_client_is_reported(self):
+        wrapper, out = self.install(object())
+        self.assertIsNone(wrapper)
+        self.assertIn("embedding cache disabled", out)
+
+    def test_read_only_client_is_reported(self):
+        store = _ReadOnlyStore()
+        wrapper, out = self.install(store)
+        self.assertIsNone(wrapper)
+        self.assertNotIsInstance(store.embeddings, CachedEmbeddings)
+        self.assertIn("_ReadOnlyStore.embeddings cannot be replaced", out)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""Ingestion against the fake Milvus and Duckling backends of the benchmarks.
+
+Run from the project directory: ``python -m unittest discover tests``.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from dataclasses import fields
+from unittest import mock
+
+from benchmarks import fakes
+from benchmarks.fixtures import write_config
+
+
+class SameNameFilesTest(unittest.TestCase):
+    """Files sharing a name (different folders or extensions) keep their chunks
+    apart: syncing or resuming one never deletes the others'."""
+
+    def setUp(self):
+        from services import config
+
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        config_path = os.path.join(self.tmp, "config.yaml")
+        write_config(config_path, os.path.join(self.tmp, "commesse.xlsx"), self.tmp,
+                     os.path.join(self.tmp, "ingest"), "http://fake-milvus:19530")
+        patcher = mock.patch.object(config, "DEFAULT_CONFIG_PATH", config_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        fakes.CLUSTER = fakes.FakeCluster()
+        fakes.install(fakes.Latencies(**{f.name: 0.0 for f in fields(fakes.Latencies)}))
+
+        from services.store import ManageDB
+        self.db = ManageDB(config_path)
+        self.files = []
+        for relative in ("A/spec.pdf", "B/spec.pdf", "spec.txt"):
+            path = os.path.join(self.tmp, relative)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(relative)
+            self.files.append(path)
+
+    def chunks(self) -> dict:
+        data = fakes.CLUSTER.collection("comm_TEST", "docs")
+        counts = {}
+        for doc in data.docs:
+            counts[doc.metadata["path"]] = counts.get(doc.metadata["path"], 0) + 1
+        return counts
+
+    def test_namespaces_are_per_path(self):
+        from services.process import namespace_for
+        self.assertEqual(len({namespace_for(path) for path in self.files}), 3)
+
+    def test_sync_removes_only_the_deselected_file(self):
+        self.db.create_collection("TEST", "docs", files=self.files)
+        per_file = fakes.FakeDucklingGeneric.CHUNKS_PER_FILE
+        self.assertEqual(self.chunks(), {path: per_file for path in self.files})
+
+        kept = [self.files[0], self.files[2]]
+        result = self.db.sync_collection("TEST", "docs", files=kept)
+        self.assertEqual(result["removed"], 1)
+        self.assertEqual(self.chunks(), {path: per_file for path in kept})
+
+        sparse = self.db.sparse_index("comm_TEST", "docs")
+        paths = {doc["metadata"]["path"] for _, doc in sparse.search("spec", k=100)}
+        self.assertEqual(paths, set(kept))
+
+    def test_sync_removes_legacy_chunks_by_path(self):
+        self.db.create_collection("TEST", "docs", files=self.files)
+        # chunks of a build from before namespaces were per path: bare names
+        data = fakes.CLUSTER.collection("comm_TEST", "docs")
+        for doc in data.docs:
+            doc.metadata["namespace"] = os.path.splitext(os.path.basename(doc.metadata["path"]))[0]
+
+        kept = [self.files[0], self.files[2]]
+        self.db.sync_collection("TEST", "docs", files=kept)
+        per_file = fakes.FakeDucklingGeneric.CHUNKS_PER_FILE
+        self.assertEqual(self.chunks(), {path: per_file for path in kept})
+
+    def test_resume_clears_only_the_pending_file(self):
+        from services.pipeline import Checkpoint
+
+        self.db.create_collection("TEST", "docs", files=self.files)
+        # an interrupted rebuild of B/spec.pdf: marked pending in the checkpoint
+        checkpoint = Checkpoint(self.db.checkpoint_path("TEST", "docs"))
+        checkpoint.start(self.files)
+        checkpoint.mark(self.files[0], fakes.FakeDucklingGeneric.CHUNKS_PER_FILE)
+        checkpoint.mark(self.files[2], fakes.FakeDucklingGeneric.CHUNKS_PER_FILE)
+
+        self.assertTrue(self.db.create_collection("TEST", "docs"))
+        per_file = fakes.FakeDucklingGeneric.CHUNKS_PER_FILE
+        self.assertEqual(self.chunks(), {path: per_file for path in self.files})
+
+
+if __name__ == "__main__":
+    unittest.main()